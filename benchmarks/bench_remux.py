@@ -0,0 +1,122 @@
+"""
+Benchmark for the FLV to MP4 conversion.
+
+Usage: python benchmarks/bench_remux.py [minutes]
+
+Builds an H.264/AAC FLV of the given length (4 Mbit/s video at 30 fps
+with a keyframe every 2 seconds, 128 kbit/s audio; the frames are random
+bytes, which a stream copy does not look at) and converts it with
+FlvToMp4Remuxer and, when the binary is installed, with ffmpeg -c copy.
+Wall time, CPU time of the converting process and its peak Python
+allocations (native) are reported.
+"""
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.tiktok_recorder.utils.mp4_remuxer import FlvToMp4Remuxer
+
+FPS = 30
+GOP_SECONDS = 2
+VIDEO_BYTES_PER_SECOND = 4_000_000 // 8
+AUDIO_BYTES_PER_SECOND = 128_000 // 8
+AUDIO_FRAME_MS = 1024 / 44.1
+
+# 1280x720 baseline SPS/PPS and 44.1 kHz stereo AAC-LC
+SPS = bytes.fromhex('6742c01fda014016e806d0a135')
+PPS = bytes.fromhex('68ce3c80')
+AVC_CONFIG = (bytes((1, SPS[1], SPS[2], SPS[3], 0xFF, 0xE1))
+              + struct.pack('>H', len(SPS)) + SPS
+              + b'\x01' + struct.pack('>H', len(PPS)) + PPS)
+AAC_CONFIG = b'\x12\x10'
+
+
+def tag(tag_type, timestamp, body):
+    header = (bytes((tag_type,)) + len(body).to_bytes(3, 'big')
+              + (timestamp & 0xFFFFFF).to_bytes(3, 'big')
+              + bytes(((timestamp >> 24) & 0xFF,)) + bytes(3))
+    return header + body + struct.pack('>I', len(header) + len(body))
+
+
+def write_flv(path, seconds):
+    frame_size = VIDEO_BYTES_PER_SECOND // FPS
+    audio_size = int(AUDIO_BYTES_PER_SECOND * AUDIO_FRAME_MS / 1000)
+    payload = os.urandom(frame_size * 4)
+
+    with open(path, 'wb') as out_file:
+        out_file.write(b'FLV\x01\x05\x00\x00\x00\x09' + bytes(4))
+        out_file.write(tag(9, 0, b'\x17\x00\x00\x00\x00' + AVC_CONFIG))
+        out_file.write(tag(8, 0, b'\xaf\x00' + AAC_CONFIG))
+
+        audio_time = 0.0
+        for frame in range(seconds * FPS):
+            timestamp = frame * 1000 // FPS
+            while audio_time <= timestamp:
+                start = int(audio_time) % frame_size
+                out_file.write(tag(8, int(audio_time),
+                                   b'\xaf\x01' + payload[start:start + audio_size]))
+                audio_time += AUDIO_FRAME_MS
+
+            key = frame % (FPS * GOP_SECONDS) == 0
+            size = frame_size * 3 if key else frame_size
+            start = (frame * 977) % frame_size
+            nalu = struct.pack('>I', size) + payload[start:start + size]
+            out_file.write(tag(9, timestamp,
+                               (b'\x17' if key else b'\x27') + b'\x01\x00\x00\x00' + nalu))
+
+
+def native(source, destination):
+    tracemalloc.start()
+    FlvToMp4Remuxer(source, destination).remux()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure(name, convert, source, destination):
+    cpu, wall = time.process_time(), time.perf_counter()
+    children = os.times()
+    extra = convert(source, destination)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    after = os.times()
+    cpu += (after.children_user - children.children_user) \
+        + (after.children_system - children.children_system)
+
+    mb = os.path.getsize(source) / 1e6
+    line = (f"{name:<7} {wall:6.2f} s wall  {cpu:6.2f} s CPU  "
+            f"({mb / wall:.0f} MB/s, {os.path.getsize(destination) / 1e6:.1f} MB out)")
+    if extra is not None:
+        line += f"  peak Python memory {extra / 1e6:.2f} MB"
+    print(line)
+
+
+def with_ffmpeg(source, destination):
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+                    '-i', source, '-c', 'copy', destination], check=True)
+
+
+def main():
+    minutes = float(sys.argv[1] if len(sys.argv) > 1 else 10)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'in.flv')
+        write_flv(source, int(minutes * 60))
+        print(f"{minutes:g} min FLV, {os.path.getsize(source) / 1e6:.0f} MB")
+
+        measure("native", native, source, os.path.join(tmp, 'native.mp4'))
+        if shutil.which('ffmpeg'):
+            measure("ffmpeg", with_ffmpeg, source, os.path.join(tmp, 'ffmpeg.mp4'))
+        else:
+            print("ffmpeg   not installed, skipped")
+
+
+if __name__ == '__main__':
+    main()
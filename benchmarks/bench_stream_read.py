@@ -0,0 +1,109 @@
+"""
+Benchmark for the live stream read path.
+
+Usage: python benchmarks/bench_stream_read.py [megabytes] [read_size_kb]
+
+A local server (in a child process) sends a chunked FLV-like stream as
+fast as it can. The stream is recorded to a temporary file twice: with
+the previous iter_content(4096) + bytearray path and with
+TikTokAPI.read_live_stream into pooled buffers drained by a StreamWriter.
+The client CPU time is reported per MB and as the CPU share of one
+4 Mbit/s recording.
+"""
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process, Queue
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.tiktok_recorder.core.tiktok_api import TikTokAPI
+from lib.tiktok_recorder.utils.stream_writer import StreamWriter
+
+CHUNK = 16 * 1024
+BITRATE = 4_000_000 / 8  # bytes per second of a 4 Mbit/s live
+
+
+def serve(total, port_queue):
+    payload = os.urandom(CHUNK)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "video/x-flv")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            header = b"%x\r\n" % CHUNK
+            for _ in range(total // CHUNK):
+                self.wfile.write(header + payload + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def record_legacy(url, path):
+    session = requests.Session()
+    buffer = bytearray()
+    with open(path, "wb") as out_file:
+        stream = session.get(url, stream=True)
+        for chunk in stream.iter_content(chunk_size=4096):
+            if chunk:
+                buffer.extend(chunk)
+                if len(buffer) >= 512 * 1024:
+                    out_file.write(buffer)
+                    buffer.clear()
+        out_file.write(buffer)
+
+
+def record_readinto(url, path, read_size):
+    api = TikTokAPI.__new__(TikTokAPI)
+    api._http_client_stream = requests.Session()
+    with open(path, "wb", buffering=0) as out_file:
+        writer = StreamWriter(out_file, read_size)
+        for buffer, n in api.read_live_stream(url, writer):
+            writer.submit(buffer, [buffer[:n]])
+        writer.close()
+
+
+def measure(name, record, total):
+    cpu, wall = time.process_time(), time.perf_counter()
+    record()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+
+    mb = total / 1e6
+    share = cpu / (total / BITRATE) * 100
+    print(f"{name:<10} {cpu / mb * 1000:7.2f} ms CPU/MB   "
+          f"{share:6.3f}% of a core per 4 Mbit/s recording   "
+          f"({mb / wall:.0f} MB/s)")
+
+
+def main():
+    total = int(sys.argv[1] if len(sys.argv) > 1 else 200) * 1024 * 1024
+    read_size = int(sys.argv[2] if len(sys.argv) > 2 else 256) * 1024
+
+    port_queue = Queue()
+    server = Process(target=serve, args=(total, port_queue), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get()}/live.flv"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "out.flv")
+        measure("legacy", lambda: record_legacy(url, path), total)
+        measure("pooled", lambda: record_readinto(url, path, read_size), total)
+
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark for WAFSolver.solve on synthetic challenges.
+
+Usage: python benchmarks/bench_waf_solver.py [challenges] [workers]
+
+Reports the median and p99 solve time of the previous from-scratch
+hexdigest loop, the current single-process solver and the process pool
+solver.
+"""
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from hashlib import sha256
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.tiktok_recorder.core.tiktok_waf_solver import WAFSolver, MAX_NONCE
+
+
+def make_challenge(nonce):
+    prefix = os.urandom(32)
+    digest = sha256(prefix + str(nonce).encode('utf-8')).digest()
+    c = {'v': {
+        'a': base64.b64encode(prefix).decode('utf-8'),
+        'c': base64.b64encode(digest).decode('utf-8'),
+    }}
+    cs = base64.b64encode(json.dumps(c).encode('utf-8')).decode('utf-8')
+    return (
+        '<html><body>'
+        '<p id="wci" class="_wafchallengeid"></p>'
+        f'<p id="cs" class="{cs.rstrip("=")}"></p>'
+        '</body></html>'
+    )
+
+
+def legacy_solve(html_content):
+    _, _, prefix, expect = WAFSolver._parse_challenge(html_content)
+    expect = expect.hex()
+    for i in range(MAX_NONCE):
+        if sha256(prefix + str(i).encode('utf-8')).hexdigest() == expect:
+            return i
+    return None
+
+
+def measure(name, solve, challenges):
+    times = []
+    for html in challenges:
+        start = time.perf_counter()
+        solve(html)
+        times.append(time.perf_counter() - start)
+
+    times.sort()
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print(f"{name:<12} median {statistics.median(times) * 1000:8.1f} ms"
+          f"   p99 {p99 * 1000:8.1f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+
+    rng = random.Random(0)
+    challenges = [make_challenge(rng.randrange(MAX_NONCE)) for _ in range(count)]
+
+    print(f"{count} challenges, nonces uniform in [0, {MAX_NONCE})")
+    measure("legacy", legacy_solve, challenges)
+    measure("solver", WAFSolver.solve, challenges)
+    measure(f"pool x{workers}",
+            lambda html: WAFSolver.solve(html, workers=workers), challenges)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ import discord
 import asyncio
 from discord import app_commands
 from bot.client import tree
-from modules import forwarder, recorder
+from modules import forwarder, recorder, scheduler
 from config import settings
 
 @tree.command(name="live", description="Start recording & notification for TikTok live user.")
@@ -27,19 +27,33 @@ async def live_command(interaction: discord.Interaction, username: str):
     except Exception as e:
         await interaction.followup.send(f"⚠️ Failed to send notification: {str(e)}", ephemeral=True)
     
-    # Start recording if enabled
+    # Watch the user and start recording as soon as they are live
     if settings.RECORDER_ENABLED:
         try:
-            process = recorder.start_new_recording(username)
-            if process:
+            already_recording = username in recorder.get_active_recordings()
+            process = await scheduler.watch_user(username)
+            if process and not already_recording:
                 await interaction.followup.send(
                     f"🎬 Recording started for **{username}**.\n"
                     f"💡 Use `/stop {username}` to stop recording gracefully.", 
                     ephemeral=True
                 )
+            elif process:
+                await interaction.followup.send(
+                    f"⚠️ Recording for **{username}** is already active.",
+                    ephemeral=True
+                )
+            elif username in recorder.queued_recordings:
+                await interaction.followup.send(
+                    f"💽 **{username}** is live, but there is not enough disk space right now. "
+                    f"Recording will start as soon as space frees up.\n"
+                    f"💡 Use `/stop {username}` to cancel.",
+                    ephemeral=True
+                )
             else:
                 await interaction.followup.send(
-                    f"⚠️ Recording for **{username}** is already active or failed to start.", 
+                    f"👀 **{username}** is not live right now. Recording will start automatically when they go live.\n"
+                    f"💡 Use `/stop {username}` to stop watching.", 
                     ephemeral=True
                 )
         except Exception as e:
@@ -67,10 +81,16 @@ async def stop_command(interaction: discord.Interaction, username: str):
     
     await interaction.response.defer(ephemeral=True)  
       
+    # Stop watching first so the scheduler does not restart the recording
+    was_watched = scheduler.unwatch_user(username)
+      
     # Check if recording exists
     active_recordings = recorder.get_active_recordings()
     if username not in active_recordings:
-        await interaction.followup.send(f"ℹ️ No active recording found for **{username}**.", ephemeral=True)
+        if was_watched:
+            await interaction.followup.send(f"🙈 Stopped watching **{username}**.", ephemeral=True)
+        else:
+            await interaction.followup.send(f"ℹ️ No active recording found for **{username}**.", ephemeral=True)
         return
     
     # Send initial feedback
@@ -78,7 +98,9 @@ async def stop_command(interaction: discord.Interaction, username: str):
     await interaction.followup.send(
         f"🛑 Stopping recording for **{username}** (PID: {process.pid})...\n"
         f"⏳ Please wait while the recording finishes gracefully and converts to MP4.\n"
-        f"📝 This may take up to 45 seconds.", 
+        + ("📝 The MP4 is written live, this should only take a few seconds."
+           if settings.LIVE_REMUX else
+           "📝 This may take up to 45 seconds."), 
         ephemeral=True
     )
     
@@ -150,8 +172,9 @@ async def status_command(interaction: discord.Interaction):
     
     try:
         active_recordings = recorder.get_active_recordings()
+        watched_users = scheduler.get_watched_users()
         
-        if not active_recordings:
+        if not active_recordings and not watched_users:
             await interaction.followup.send("ℹ️ No active recordings.", ephemeral=True)
             return
         
@@ -159,6 +182,12 @@ async def status_command(interaction: discord.Interaction):
         for username, process in active_recordings.items():
             status = "🟢 Running" if process.is_alive() else "🔴 Dead"
             status_lines.append(f"• **{username}** (PID: {process.pid}) - {status}")
+        if not active_recordings:
+            status_lines.append("• None")
+        
+        idle_users = [u for u in watched_users if u not in active_recordings]
+        if idle_users:
+            status_lines.append(f"👀 **Watching ({len(idle_users)}):** " + ", ".join(idle_users))
         
         status_message = "\n".join(status_lines)
         await interaction.followup.send(status_message, ephemeral=True)
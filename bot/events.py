@@ -3,7 +3,7 @@
 import re
 import discord
 from bot.client import client, tree # Impor 'tree' dari client
-from modules import forwarder, recorder
+from modules import forwarder, recorder, scheduler
 from config import settings
 
 TIKTOK_URL_PATTERN = re.compile(r'https?://(?:www\.)?tiktok\.com/@([^/]+)/(?:live|video|photo)/?(\d+)?')
@@ -22,6 +22,9 @@ async def on_ready():
         print("Slash commands disinkronkan secara global.")
     # -------------------------------------------------
 
+    if settings.RECORDER_ENABLED:
+        scheduler.start_scheduler()
+
     print('---')
     print(f'Bot {client.user} telah berhasil online! ✨')
     print(f'Memantau {len(settings.MONITORED_CHANNELS)} channel.')
@@ -70,6 +73,7 @@ async def on_message(message):
     
     # Memanggil modul recorder jika URL adalah LIVE
     if "/live" in raw_url and settings.RECORDER_ENABLED:
-        process = recorder.start_new_recording(username)
-        if process:
+        already_recording = username in recorder.get_active_recordings()
+        process = await scheduler.watch_user(username)
+        if process and not already_recording:
              await message.channel.send(f"✅ Perekaman untuk **{username}** telah dimulai.")
\ No newline at end of file
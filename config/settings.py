@@ -48,6 +48,31 @@ def parse_channel_ids(ids_str: Optional[str]) -> List[int]:
                 continue
     return result
 
+def parse_user_values(values_str: Optional[str]) -> Dict[str, str]:
+    """Parse comma-separated user:value pairs from string."""
+    if not values_str:
+        return {}
+
+    result = {}
+    for pair in values_str.split(','):
+        user, sep, value = pair.partition(':')
+        if not sep or not user.strip() or not value.strip():
+            if pair.strip():
+                print(f"⚠️ WARNING: Invalid user:value pair '{pair.strip()}', skipping...")
+            continue
+        result[user.strip()] = value.strip().lower()
+    return result
+
+def parse_user_priorities(values_str: Optional[str]) -> Dict[str, int]:
+    """Parse comma-separated user:priority pairs (integers) from string."""
+    result = {}
+    for user, value in parse_user_values(values_str).items():
+        try:
+            result[user] = int(value)
+        except ValueError:
+            print(f"⚠️ WARNING: Invalid priority '{value}' for '{user}', skipping...")
+    return result
+
 # === Discord & Bot Configuration ===
 TOKEN = get_env_str('DISCORD_TOKEN', required=True)
 SOURCE_BOT_ID = get_env_int('SOURCE_BOT_ID', required=True)
@@ -72,6 +97,80 @@ if not MONITORED_CHANNELS:
 # === Feature Configuration ===
 RECORDER_ENABLED = get_env_str('RECORDER_ENABLED', 'false').lower() == 'true'
 
+# Adaptive live-status polling: users are probed every LIVE_POLL_INTERVAL
+# seconds, every LIVE_POLL_HOT_INTERVAL seconds around the time of day they
+# usually go live, and back off exponentially up to LIVE_POLL_MAX_INTERVAL
+# while offline. LIVE_POLL_BUDGET caps probes per minute across all users.
+LIVE_POLL_INTERVAL = get_env_int('LIVE_POLL_INTERVAL', 60)
+LIVE_POLL_HOT_INTERVAL = get_env_int('LIVE_POLL_HOT_INTERVAL', 30)
+LIVE_POLL_MAX_INTERVAL = get_env_int('LIVE_POLL_MAX_INTERVAL', 1800)
+LIVE_POLL_BUDGET = get_env_int('LIVE_POLL_BUDGET', 120)
+
+# Seconds a username -> room_id or room info lookup is reused (0 disables)
+LOOKUP_CACHE_TTL = get_env_int('LOOKUP_CACHE_TTL', 60)
+
+# === Recorder Tuning ===
+# Recordings hosted (as threads) by one worker process; 1 gives every
+# recording its own process
+RECORDINGS_PER_WORKER = get_env_int('RECORDINGS_PER_WORKER', 4)
+# Seconds a worker without recordings is kept for the next live, and the
+# number of workers kept regardless
+WORKER_IDLE_SECONDS = get_env_int('WORKER_IDLE_SECONDS', 600)
+MIN_WORKERS = get_env_int('MIN_WORKERS', 1)
+# KB read from the live stream per call; larger reads cost less CPU but the
+# stop checks run less often
+STREAM_READ_SIZE_KB = get_env_int('STREAM_READ_SIZE_KB', 256)
+# Read buffers queued for the writer thread of each recording (memory per
+# recording = depth x read size) and the queue length that logs a warning
+WRITE_QUEUE_DEPTH = get_env_int('WRITE_QUEUE_DEPTH', 32)
+WRITE_QUEUE_HIGH_WATER = get_env_int('WRITE_QUEUE_HIGH_WATER', 24)
+# Split recordings into segments of this many minutes and/or MB, cut at
+# keyframes and converted/uploaded as soon as they close (0 = one file)
+SEGMENT_MINUTES = get_env_int('SEGMENT_MINUTES', 0)
+SEGMENT_MB = get_env_int('SEGMENT_MB', 0)
+# Pipe the stream into ffmpeg while recording and write a fragmented MP4
+# directly, instead of converting the FLV after the live ends
+LIVE_REMUX = get_env_str('LIVE_REMUX', 'false').lower() == 'true'
+# 'uncached' preallocates recording files and drops written data from the
+# page cache after an fdatasync every WRITE_SYNC_SECONDS ('default' = plain)
+WRITE_BACKEND = get_env_str('WRITE_BACKEND', 'default').lower()
+WRITE_SYNC_SECONDS = get_env_int('WRITE_SYNC_SECONDS', 5)
+# Highest quality recorded (origin, uhd, hd, sd, ld or a level number; empty
+# = best), globally and per user as "user:quality,user2:quality"
+MAX_QUALITY = get_env_str('MAX_QUALITY', '').lower()
+USER_MAX_QUALITY = parse_user_values(get_env_str('USER_MAX_QUALITY'))
+# Move to a lower quality when a recording can't keep up with the live,
+# and try the higher one again once it is steady
+ADAPTIVE_QUALITY = get_env_str('ADAPTIVE_QUALITY', 'true').lower() == 'true'
+# Record the FLV stream or the HLS playlist (hls: segments fetched in
+# parallel, for CDN edges that throttle long FLV connections)
+STREAM_FORMAT = get_env_str('STREAM_FORMAT', 'flv').lower()
+# Seconds to connect to a stream edge and to wait for each read, and
+# without stream data before the connection is dropped and retried
+# (another edge is tried if it stalls again); 0 = no limit
+STREAM_CONNECT_TIMEOUT = get_env_int('STREAM_CONNECT_TIMEOUT', 5)
+STREAM_READ_TIMEOUT = get_env_int('STREAM_READ_TIMEOUT', 10)
+STREAM_STALL_SECONDS = get_env_int('STREAM_STALL_SECONDS', 15)
+
+# Disk-space admission control: each recording is expected to need its
+# observed bitrate (DISK_DEFAULT_BITRATE_KBPS until measured) for the next
+# DISK_FORECAST_MINUTES, plus room for its MP4 conversion. Recordings that
+# would leave less than DISK_RESERVE_GB free are queued, and the
+# lowest-priority ones are stopped (forecast 0 = off)
+DISK_RESERVE_GB = get_env_int('DISK_RESERVE_GB', 5)
+DISK_FORECAST_MINUTES = get_env_int('DISK_FORECAST_MINUTES', 60)
+DISK_DEFAULT_BITRATE_KBPS = get_env_int('DISK_DEFAULT_BITRATE_KBPS', 4000)
+# Priority of each user's recordings as "user:priority,user2:priority";
+# higher ones are kept when disk space runs out (default 0)
+RECORDING_PRIORITY = parse_user_priorities(get_env_str('RECORDING_PRIORITY'))
+
+# === Metrics ===
+# Recording metrics in Prometheus format on http://METRICS_HOST:METRICS_PORT
+# /metrics (0 = off); recordings report every METRICS_INTERVAL seconds
+METRICS_HOST = get_env_str('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = get_env_int('METRICS_PORT', 9464)
+METRICS_INTERVAL = get_env_int('METRICS_INTERVAL', 10)
+
 # === User Mapping Configuration ===
 USER_MAP: Dict[str, str] = {}
 try:
@@ -94,4 +193,23 @@ print("🔧 [CONFIG] Configuration loaded:")
 print(f"   • Monitored channels: {len(MONITORED_CHANNELS)}")
 print(f"   • User mappings: {len(USER_MAP)}")
 print(f"   • Recorder enabled: {RECORDER_ENABLED}")
+print(f"   • Live poll interval: {LIVE_POLL_HOT_INTERVAL}-{LIVE_POLL_MAX_INTERVAL}s "
+      f"(budget {LIVE_POLL_BUDGET}/min)")
+print(f"   • Recordings per worker: {RECORDINGS_PER_WORKER} "
+      f"(idle workers kept {WORKER_IDLE_SECONDS}s, at least {MIN_WORKERS})")
+print(f"   • Stream read size: {STREAM_READ_SIZE_KB} KB, "
+      f"write queue {WRITE_QUEUE_DEPTH} (high water {WRITE_QUEUE_HIGH_WATER})")
+print(f"   • Segments: {SEGMENT_MINUTES or '-'} min / {SEGMENT_MB or '-'} MB")
+print(f"   • Live remux: {LIVE_REMUX}")
+print(f"   • Write backend: {WRITE_BACKEND} (sync every {WRITE_SYNC_SECONDS}s)")
+print(f"   • Quality: max {MAX_QUALITY or 'best'} ({len(USER_MAX_QUALITY)} per-user caps), "
+      f"adaptive {ADAPTIVE_QUALITY}")
+print(f"   • Stream format: {STREAM_FORMAT}")
+print(f"   • Stream timeouts: connect {STREAM_CONNECT_TIMEOUT}s, read {STREAM_READ_TIMEOUT}s, "
+      f"stall {STREAM_STALL_SECONDS or '-'}s")
+print(f"   • Disk reserve: {DISK_RESERVE_GB} GB, forecast "
+      f"{f'{DISK_FORECAST_MINUTES} min' if DISK_FORECAST_MINUTES else 'off'} "
+      f"({len(RECORDING_PRIORITY)} user priorities)")
+print(f"   • Metrics: {f'{METRICS_HOST}:{METRICS_PORT}/metrics' if METRICS_PORT else 'off'} "
+      f"(every {METRICS_INTERVAL}s)")
 print(f"   • Guild ID: {GUILD_ID or 'Global commands'}")
\ No newline at end of file
@@ -1,5 +1,5 @@
 # lib/tiktok_recorder/__init__.py  
-from .bridge import start_recording  
+from .bridge import start_recording, RecordingWorker  
 from .core.tiktok_recorder import TikTokRecorder  
   
-__all__ = ['start_recording', 'TikTokRecorder']
\ No newline at end of file
+__all__ = ['start_recording', 'RecordingWorker', 'TikTokRecorder']
\ No newline at end of file
@@ -1,7 +1,11 @@
 # File: lib/tiktok_recorder/bridge.py
 # Enhanced with graceful stop support via multiprocessing.Event
 
+import itertools
 import multiprocessing
+import queue
+import threading
+import time
 from multiprocessing.synchronize import Event
 import os
 import re
@@ -15,11 +19,31 @@ def sanitize_foldername(name: str) -> str:
     """Sanitize username for safe folder creation."""
     return re.sub(r'[<>:"/\\|?*]', '_', name).strip()
 
-def _start_recording_process(user: str, output_path: str, cookies: dict, stop_event: Event):
+def load_cookies() -> dict:
+    """Load cookies.json next to this module, or return empty cookies."""
+    cookies = {}
+    try:
+        cookies_path = os.path.join(os.path.dirname(__file__), 'cookies.json')
+        if os.path.exists(cookies_path):
+            with open(cookies_path, 'r') as f:
+                cookies = json.load(f)
+            logger.info("🍪 Cookies loaded successfully")
+        else:
+            logger.warning("⚠️ cookies.json not found, using empty cookies")
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to load cookies.json: {e}")
+    return cookies
+
+def _start_recording_process(user: str, output_path: str, cookies: dict, stop_event: Event, room_id=None, options=None,
+                             report_metrics=None):
     """
     Internal function that runs the actual recording process.
     
     Now properly handles the stop_event for graceful shutdown.
+    When room_id is given the room is already known to be live, so the
+    recorder runs in manual mode and exits when the live ends.
+    options are extra TikTokRecorder keyword arguments (tuning settings).
+    report_metrics receives the metrics snapshots of the recording.
     """
     try:
         logger.info(f"🎬 Starting recording process: {user} -> {output_path}")
@@ -27,16 +51,18 @@ def _start_recording_process(user: str, output_path: str, cookies: dict, stop_ev
         # Create TikTokRecorder with stop_event support
         recorder = TikTokRecorder(
             user=user, 
-            mode=Mode.AUTOMATIC, 
+            mode=Mode.MANUAL if room_id else Mode.AUTOMATIC, 
             output=output_path, 
             cookies=cookies,
             stop_event=stop_event,  # Pass the stop event for graceful shutdown
             url=None, 
-            room_id=None, 
+            room_id=room_id, 
             automatic_interval=5, 
             proxy=None,
             duration=None, 
-            use_telegram=False
+            use_telegram=False,
+            report_metrics=report_metrics,
+            **(options or {})
         )
         
         # Start recording - this will now respect the stop_event
@@ -47,23 +73,8 @@ def _start_recording_process(user: str, output_path: str, cookies: dict, stop_ev
     except Exception as e:
         logger.error(f"❌ Error in recording process for {user}: {e}")
 
-def start_recording(username: str, stop_event: Event):
-    """
-    Main function to start recording with graceful stop support.
-    
-    Args:
-        username: TikTok username to record
-        stop_event: Event object for graceful shutdown signaling
-    
-    Returns:
-        Process object if successful, None otherwise
-    """
-    if not username: 
-        logger.error("Username cannot be empty")
-        return None
-        
-    logger.info(f"🎯 Recording request received for: {username}")
-    
+def prepare_output_dir(username: str):
+    """Create downloads/<username>/ and return it with a trailing separator, or None."""
     # Sanitize username for folder creation
     safe_folder_name = sanitize_foldername(username)
     
@@ -81,25 +92,40 @@ def start_recording(username: str, stop_event: Event):
     # Ensure output path ends with separator
     if not output_path.endswith(os.path.sep):
         output_path += os.path.sep
+    return output_path
+
+def start_recording(username: str, stop_event: Event, room_id=None, options=None):
+    """
+    Main function to start recording with graceful stop support.
+    
+    Args:
+        username: TikTok username to record
+        stop_event: Event object for graceful shutdown signaling
+        room_id: Room already known to be live. When omitted the process
+            polls the user in automatic mode until they go live.
+        options: Extra TikTokRecorder keyword arguments, e.g. read_size
+    
+    Returns:
+        Process object if successful, None otherwise
+    """
+    if not username: 
+        logger.error("Username cannot be empty")
+        return None
+        
+    logger.info(f"🎯 Recording request received for: {username}")
+    
+    output_path = prepare_output_dir(username)
+    if output_path is None:
+        return None
     
     # Load cookies configuration
-    cookies = {}
-    try:
-        cookies_path = os.path.join(os.path.dirname(__file__), 'cookies.json')
-        if os.path.exists(cookies_path):
-            with open(cookies_path, 'r') as f:
-                cookies = json.load(f)
-            logger.info("🍪 Cookies loaded successfully")
-        else:
-            logger.warning("⚠️ cookies.json not found, using empty cookies")
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to load cookies.json: {e}")
+    cookies = load_cookies()
     
     # Create and start the recording process
     try:
         process = multiprocessing.Process(
             target=_start_recording_process,
-            args=(username, output_path, cookies, stop_event),
+            args=(username, output_path, cookies, stop_event, room_id, options),
             name=f"TikTokRecorder-{username}"
         )
         process.start()
@@ -113,4 +139,209 @@ def start_recording(username: str, stop_event: Event):
             
     except Exception as e:
         logger.error(f"❌ Failed to create recording process for {username}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+# === Worker processes ===
+# A worker process hosts several recordings as threads, so the libraries
+# and HTTP sessions are loaded once per worker instead of once per stream.
+# The bot sends commands over a queue and the worker reports finished
+# recordings and their metrics snapshots back over another one.
+
+def _run_worker_recording(recording_id, username, output_path, cookies, stop_event, room_id, options, events):
+    def report_metrics(snapshot):
+        events.put(('metrics', recording_id, snapshot))
+
+    try:
+        _start_recording_process(username, output_path, cookies, stop_event, room_id, options, report_metrics)
+    finally:
+        events.put(('finished', recording_id))
+
+def _worker_main(commands, events):
+    """
+    Command loop of a worker process. Recordings are keyed by the id the
+    bot gave them, as a user's previous recording may still be finishing
+    when the next one starts.
+    """
+    recordings = {}  # recording id -> (thread, stop_event)
+
+    def stop_all():
+        for _, stop_event in recordings.values():
+            stop_event.set()
+        for thread, _ in recordings.values():
+            thread.join()
+
+    try:
+        while True:
+            command = commands.get()
+            action, recording_id = command[0], command[1]
+
+            # Forget recordings whose thread has ended
+            for key, (thread, _) in list(recordings.items()):
+                if not thread.is_alive():
+                    del recordings[key]
+
+            if action == 'start':
+                username, output_path, cookies, room_id, options = command[2:]
+                stop_event = threading.Event()
+                thread = threading.Thread(
+                    target=_run_worker_recording,
+                    args=(recording_id, username, output_path, cookies, stop_event, room_id, options, events),
+                    name=f"TikTokRecorder-{username}"
+                )
+                thread.start()
+                recordings[recording_id] = (thread, stop_event)
+
+            elif action == 'stop':
+                if recording_id in recordings:
+                    recordings[recording_id][1].set()
+
+            elif action == 'shutdown':
+                stop_all()
+                return
+
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group: finish every recording
+        logger.info("🛑 Worker interrupted, stopping its recordings gracefully...")
+        stop_all()
+
+
+class RecordingHandle:
+    """
+    One recording inside a worker. It offers the Process methods the bot
+    uses (pid, is_alive, join, terminate), plus stop() for a graceful stop.
+    """
+
+    def __init__(self, worker, recording_id, username):
+        self.worker = worker
+        self.recording_id = recording_id
+        self.username = username
+        self.finished = False
+
+    @property
+    def pid(self):
+        return self.worker.pid
+
+    @property
+    def name(self):
+        return f"TikTokRecorder-{self.username}"
+
+    def stop(self):
+        self.worker.send(('stop', self.recording_id))
+
+    def is_alive(self) -> bool:
+        self.worker.poll()
+        return not self.finished and self.worker.is_alive()
+
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_alive():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            self.worker.poll(timeout=min(remaining or 1.0, 1.0))
+
+    def terminate(self):
+        """
+        Kills the worker if this is its only recording. A thread cannot be
+        killed, so with other recordings in the worker it is left running.
+        """
+        if self.worker.load() <= 1:
+            self.worker.terminate()
+        else:
+            logger.warning(
+                f"⚠️ {self.username} shares worker {self.pid} with other recordings, not terminating it")
+
+
+class RecordingWorker:
+    """
+    Bot-side handle of a worker process that hosts recordings as threads.
+    """
+
+    def __init__(self, name: str, metrics=None):
+        self.commands = multiprocessing.Queue()
+        self.events = multiprocessing.Queue()
+        self.recordings = {}  # recording id -> RecordingHandle
+        self._recording_ids = itertools.count(1)
+        # username -> latest metrics snapshot, may be shared by workers
+        self.metrics = {} if metrics is None else metrics
+        self._poll_lock = threading.Lock()
+        self.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(self.commands, self.events),
+            name=name
+        )
+        self.process.start()
+        logger.info(f"🧵 Recording worker {name} started (PID: {self.process.pid})")
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def name(self):
+        return self.process.name
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def send(self, command):
+        if self.is_alive():
+            self.commands.put(command)
+
+    def poll(self, timeout=0):
+        """Apply the finished-recording and metrics events sent by the worker."""
+        with self._poll_lock:
+            while True:
+                try:
+                    event, key, *payload = \
+                        self.events.get(timeout=timeout) if timeout else self.events.get_nowait()
+                except queue.Empty:
+                    return
+                timeout = 0
+                if event == 'finished' and key in self.recordings:
+                    self.recordings.pop(key).finished = True
+                elif event == 'metrics':
+                    snapshot = payload[0]
+                    # A previous recording of the user that is still
+                    # finishing must not hide the metrics of the current one
+                    if not any(handle.username == snapshot['user'] and handle.recording_id > key
+                               for handle in self.recordings.values()):
+                        self.metrics[snapshot['user']] = snapshot
+
+    def load(self) -> int:
+        """Number of recordings still running in this worker."""
+        self.poll()
+        return len(self.recordings)
+
+    def start_recording(self, username: str, room_id=None, options=None):
+        """
+        Starts a recording thread in the worker and returns its
+        RecordingHandle, or None if it could not be started.
+        """
+        if not username:
+            logger.error("Username cannot be empty")
+            return None
+
+        logger.info(f"🎯 Recording request received for: {username} (worker {self.pid})")
+
+        output_path = prepare_output_dir(username)
+        if output_path is None or not self.is_alive():
+            return None
+
+        handle = RecordingHandle(self, next(self._recording_ids), username)
+        self.recordings[handle.recording_id] = handle
+        self.send(('start', handle.recording_id, username, output_path, load_cookies(), room_id, options))
+        return handle
+
+    def shutdown(self, timeout=None):
+        """Stops every recording gracefully and waits for the worker to exit."""
+        self.send(('shutdown', None))
+        self.process.join(timeout)
+
+    def terminate(self):
+        self.process.terminate()
+        self.process.join(timeout=10)
+        for handle in self.recordings.values():
+            handle.finished = True
+        self.recordings.clear()
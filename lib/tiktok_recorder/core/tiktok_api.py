@@ -1,22 +1,235 @@
 import json
 import re
+import socket
+
+from requests.exceptions import ReadTimeout
 
 from .tiktok_waf_solver import WAFSolver
 from ..http_utils.http_client import HttpClient
 from ..utils.enums import StatusCode, TikTokError
+from ..utils.hls import HlsCapture
 from ..utils.logger_manager import logger
+from ..utils.lookup_cache import LookupCache, DEFAULT_CACHE_PATH, DEFAULT_TTL
+from ..utils.quality import cap_variants
+from ..utils.rate_limiter import UNLIMITED
+from ..utils.watchdog import STALLED, STOPPED
 from ..utils.custom_exceptions import (
     UserLiveError, TikTokRecorderError, LiveNotFound, IPBlockedByWAF
 )
 
 
-class TikTokAPI:
+CHECK_ALIVE_MAX_BATCH = 100
+ROOM_STATUS_LIVE = 2
+
+
+class BaseTikTokAPI:
+    """
+    Request building and response parsing shared by the blocking
+    TikTokAPI and the asyncio AsyncTikTokAPI.
+    """
 
-    def __init__(self, proxy, cookies):
+    def __init__(self, cache_ttl=DEFAULT_TTL, cache_path=DEFAULT_CACHE_PATH):
         self.BASE_URL = 'https://www.tiktok.com'
         self.WEBCAST_URL = 'https://webcast.tiktok.com'
         self.API_URL = 'https://www.tiktok.com/api-live/user/room/'
 
+        # Largest number of room ids sent in a single check_alive request
+        self.check_alive_batch_size = CHECK_ALIVE_MAX_BATCH
+
+        self.cache = LookupCache(cache_path, ttl=cache_ttl)
+
+    def _check_alive_url(self, batch) -> str:
+        return (
+            f"{self.WEBCAST_URL}/webcast/room/check_alive/"
+            f"?aid=1988&region=CH&room_ids={','.join(batch)}"
+            "&user_is_login=true"
+        )
+
+    def _batch_rejected(self, data, batch) -> bool:
+        """
+        Halves check_alive_batch_size if the endpoint rejected a batch.
+        """
+        if data.get('status_code', 0) == 0 or len(batch) <= 1:
+            return False
+
+        self.check_alive_batch_size = len(batch) // 2
+        logger.warning(
+            f"check_alive rejected a batch of {len(batch)} rooms, "
+            f"retrying with batches of {self.check_alive_batch_size}"
+        )
+        return True
+
+    @staticmethod
+    def _read_alive(data, alive):
+        for entry in data.get('data') or []:
+            room_id = entry.get('room_id_str') or str(entry.get('room_id', ''))
+            if room_id in alive:
+                alive[room_id] = entry.get('alive', False)
+
+    def _room_info_url(self, room_id) -> str:
+        return f"{self.WEBCAST_URL}/webcast/room/info/?aid=1988&room_id={room_id}"
+
+    def _room_info_ttl(self, data) -> int:
+        if (data.get('data') or {}).get('status') == ROOM_STATUS_LIVE:
+            return self.cache.ttl
+        return self.cache.negative_ttl
+
+    @staticmethod
+    def _parse_user_from_room_info(data) -> str:
+        if 'Follow the creator to watch their LIVE' in json.dumps(data):
+            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE_FOLLOW)
+
+        if 'This account is private' in data:
+            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
+
+        display_id = data.get("data", {}).get("owner", {}).get("display_id")
+        if display_id is None:
+            raise TikTokRecorderError(TikTokError.USERNAME_ERROR)
+
+        return display_id
+
+    def _room_id_params(self, user: str) -> dict:
+        return {
+            "uniqueId": user,
+            "sourceType": 54,
+            "aid": 1988
+        }
+
+    @staticmethod
+    def _parse_room_id(response) -> str:
+        if response.status_code != 200:
+            raise UserLiveError(TikTokError.ROOM_ID_ERROR)
+
+        data = response.json()
+
+        if (data.get('data') and
+                data['data'].get('user') and
+                data['data']['user'].get('roomId')):
+            room_id = data['data']['user']['roomId']
+            return room_id
+        else:
+            raise UserLiveError(TikTokError.ROOM_ID_ERROR)
+
+    def _followers_url(self, sec_uid, cursor) -> str:
+        return (
+            f"{self.BASE_URL}/api/user/list/"
+            "?WebIdLastTime=1747672102"
+            "&aid=1988&app_language=it-IT&app_name=tiktok_web"
+            "&browser_language=it-IT&browser_name=Mozilla&browser_online=true"
+            "&browser_platform=Linux%20x86_64"
+            "&browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F136.0.0.0%20Safari%2F537.36"
+            "&channel=tiktok_web&cookie_enabled=true&count=30&data_collection_enabled=true"
+            "&device_id=7506194516308166166&device_platform=web_pc&focus_state=true"
+            "&from_page=user&history_len=2&is_fullscreen=false&is_page_visible=true"
+            f"&maxCursor={cursor}&minCursor={cursor}"
+            "&odinId=7246312836442604570&os=linux&priority_region=IT"
+            "&referer=&region=IT&scene=21&screen_height=1080&screen_width=1920"
+            f"&secUid={sec_uid}&tz_name=Europe%2FRome&user_is_login=true"
+            "&webcast_language=it-IT&msToken=&X-Bogus=&X-Gnarly="
+        )
+
+    @staticmethod
+    def _parse_followers_page(response, known):
+        """
+        Returns (page, next_cursor, done) for one /api/user/list/ response.
+        """
+        if response.status_code != StatusCode.OK:
+            raise TikTokRecorderError("Failed to retrieve followers list.")
+
+        data = response.json()
+        user_list = data.get('userList', [])
+
+        page = []
+        reached_known = False
+        for user in user_list:
+            username = user.get('user', {}).get('uniqueId')
+            if not username:
+                continue
+            if known is not None and username in known:
+                reached_known = True
+                continue
+            page.append(username)
+
+        done = reached_known or not data.get('hasMore', False)
+        return page, data.get('minCursor', 0), done
+
+    @staticmethod
+    def _parse_stream_variants(data) -> list:
+        """
+        Returns the variants of the live, best first, as dicts with
+        sdk_key, level, the flv and hls URLs (either may be None) and
+        flv_urls, the main FLV URL followed by the backup ones.
+        """
+        if 'This account is private' in data:
+            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
+
+        stream_url = data.get('data', {}).get('stream_url', {})
+
+        sdk_data_str = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('stream_data')
+        if not sdk_data_str:
+            logger.warning("No SDK stream data found. Falling back to legacy URLs. Consider contacting the developer to update the code.")
+            flv_urls = stream_url.get('flv_pull_url', {})
+            variants = [
+                {'sdk_key': key.lower(), 'level': level, 'flv': flv_urls[key], 'hls': None,
+                 'flv_urls': [flv_urls[key]]}
+                for key, level in (('FULL_HD1', 4), ('HD1', 3), ('SD2', 2), ('SD1', 1))
+                if flv_urls.get(key)
+            ]
+            if not variants and (stream_url.get('rtmp_pull_url') or stream_url.get('hls_pull_url')):
+                # rtmp can't be read over HTTP, HLS is used instead if offered
+                variants.append({'sdk_key': 'legacy', 'level': 0,
+                                 'flv': stream_url.get('rtmp_pull_url') or None,
+                                 'hls': stream_url.get('hls_pull_url') or None,
+                                 'flv_urls': []})
+            return variants
+
+        # Extract stream options
+        sdk_data = json.loads(sdk_data_str).get('data', {})
+        qualities = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('options', {}).get('qualities', [])
+        if not qualities:
+            logger.warning("No qualities found in the stream data. Returning None.")
+            return []
+        level_map = {q['sdk_key']: q['level'] for q in qualities}
+
+        variants = []
+        for sdk_key, entry in sdk_data.items():
+            stream_main = entry.get('main', {})
+            flv, hls = stream_main.get('flv'), stream_main.get('hls')
+
+            # Backup pull URLs (other CDN edges) sit next to 'main'
+            flv_urls = [flv] if flv else []
+            for name, source in entry.items():
+                if name != 'main' and isinstance(source, dict):
+                    backup = source.get('flv')
+                    if backup and backup not in flv_urls:
+                        flv_urls.append(backup)
+
+            if (flv_urls or hls) and sdk_key != 'ao':  # audio only
+                variants.append({'sdk_key': sdk_key,
+                                 'level': level_map.get(sdk_key, -1),
+                                 'flv': flv_urls[0] if flv_urls else None,
+                                 'hls': hls or None,
+                                 'flv_urls': flv_urls})
+
+        if not variants and data.get('status_code') == 4003110:
+            raise UserLiveError(TikTokError.LIVE_RESTRICTION)
+
+        return sorted(variants, key=lambda v: v['level'], reverse=True)
+
+    @classmethod
+    def _parse_live_url(cls, data, max_quality=None) -> str:
+        variants = cap_variants(cls._parse_stream_variants(data), max_quality)
+        if not variants:
+            return None
+        return variants[0]['flv'] or variants[0]['hls']
+
+
+class TikTokAPI(BaseTikTokAPI):
+
+    def __init__(self, proxy, cookies, cache_ttl=DEFAULT_TTL,
+                 cache_path=DEFAULT_CACHE_PATH):
+        super().__init__(cache_ttl, cache_path)
+
         self.http_client = HttpClient(proxy, cookies).req
         self._http_client_stream = HttpClient(proxy, cookies).req_stream
 
@@ -45,15 +258,32 @@ class TikTokAPI:
         if not room_id:
             raise UserLiveError(TikTokError.USER_NOT_CURRENTLY_LIVE)
 
-        data = self.http_client.get(
-            f"{self.WEBCAST_URL}/webcast/room/check_alive/"
-            f"?aid=1988&region=CH&room_ids={room_id}&user_is_login=true"
-        ).json()
+        return self.check_alive_many([room_id]).get(str(room_id), False)
 
-        if 'data' not in data or len(data['data']) == 0:
-            return False
+    def check_alive_many(self, room_ids) -> dict:
+        """
+        Checks the live status of many rooms with as few requests as
+        possible and returns a {room_id: alive} map.
+
+        The ids are sent to check_alive in batches of check_alive_batch_size.
+        If the endpoint rejects a batch, the batch size is halved and kept
+        for the following calls.
+        """
+        room_ids = list(dict.fromkeys(str(r) for r in room_ids if r))
+        alive = dict.fromkeys(room_ids, False)
+
+        pending = room_ids
+        while pending:
+            batch = pending[:self.check_alive_batch_size]
+            data = self.http_client.get(self._check_alive_url(batch)).json()
+
+            if self._batch_rejected(data, batch):
+                continue
+
+            pending = pending[len(batch):]
+            self._read_alive(data, alive)
 
-        return data['data'][0].get('alive', False)
+        return alive
 
     def get_sec_uid(self):
         """
@@ -69,25 +299,23 @@ class TikTokAPI:
 
         return sec_uid
 
+    def _get_room_info(self, room_id, refresh=False) -> dict:
+        """
+        Returns the webcast room info, cached for a shorter time when the
+        room is not live (fetched again with refresh).
+        """
+        return self.cache.get_or_load(
+            'room_info', room_id,
+            lambda: self.http_client.get(self._room_info_url(room_id)).json(),
+            ttl=self._room_info_ttl,
+            refresh=refresh
+        )
+
     def get_user_from_room_id(self, room_id) -> str:
         """
         Given a room_id, I get the username
         """
-        data = self.http_client.get(
-            f"{self.WEBCAST_URL}/webcast/room/info/?aid=1988&room_id={room_id}"
-        ).json()
-
-        if 'Follow the creator to watch their LIVE' in json.dumps(data):
-            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE_FOLLOW)
-
-        if 'This account is private' in data:
-            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
-
-        display_id = data.get("data", {}).get("owner", {}).get("display_id")
-        if display_id is None:
-            raise TikTokRecorderError(TikTokError.USERNAME_ERROR)
-
-        return display_id
+        return self._parse_user_from_room_info(self._get_room_info(room_id))
 
     def get_room_and_user_from_url(self, live_url: str):
         """
@@ -122,126 +350,140 @@ class TikTokAPI:
         """
         Given a username, I get the room_id
         """
-        response = self.http_client.get(self.API_URL, params={
-            "uniqueId": user,
-            "sourceType": 54,
-            "aid": 1988
-        })
-
-        if response.status_code != 200:
-            raise UserLiveError(TikTokError.ROOM_ID_ERROR)
-
-        data = response.json()
+        return self.cache.get_or_load(
+            'room_id', user,
+            lambda: self._fetch_room_id_from_user(user),
+            negative=(UserLiveError,)
+        )
 
-        if (data.get('data') and
-                data['data'].get('user') and
-                data['data']['user'].get('roomId')):
-            room_id = data['data']['user']['roomId']
-            return room_id
-        else:
-            raise UserLiveError(TikTokError.ROOM_ID_ERROR)
+    def _fetch_room_id_from_user(self, user: str) -> str:
+        response = self.http_client.get(
+            self.API_URL, params=self._room_id_params(user))
+        return self._parse_room_id(response)
 
-    def get_followers_list(self, sec_uid) -> list:
+    def get_followers_list(self, sec_uid, known=None) -> list:
         """
         Returns all followers for the authenticated user by paginating
+
+        When a set of known users is given, pagination stops at the first
+        page that contains one of them: pages are ordered newest first, so
+        only the users followed since the last refresh are returned.
         """
         followers = []
-        cursor = 0
-        has_more = True
-
-        while has_more:
-            url = (
-                f"{self.BASE_URL}/api/user/list/"
-                "?WebIdLastTime=1747672102"
-                "&aid=1988&app_language=it-IT&app_name=tiktok_web"
-                "&browser_language=it-IT&browser_name=Mozilla&browser_online=true"
-                "&browser_platform=Linux%20x86_64"
-                "&browser_version=5.0%20%28X11%3B%20Linux%20x86_64%29%20AppleWebKit%2F537.36%20%28KHTML%2C%20like%20Gecko%29%20Chrome%2F136.0.0.0%20Safari%2F537.36"
-                "&channel=tiktok_web&cookie_enabled=true&count=30&data_collection_enabled=true"
-                "&device_id=7506194516308166166&device_platform=web_pc&focus_state=true"
-                "&from_page=user&history_len=2&is_fullscreen=false&is_page_visible=true"
-                f"&maxCursor={cursor}&minCursor={cursor}"
-                "&odinId=7246312836442604570&os=linux&priority_region=IT"
-                "&referer=&region=IT&scene=21&screen_height=1080&screen_width=1920"
-                f"&secUid={sec_uid}&tz_name=Europe%2FRome&user_is_login=true"
-                "&webcast_language=it-IT&msToken=&X-Bogus=&X-Gnarly="
-            )
-
-            response = self.http_client.get(url)
-
-            if response.status_code != StatusCode.OK:
-                raise TikTokRecorderError("Failed to retrieve followers list.")
-
-            data = response.json()
-            user_list = data.get('userList', [])
-
-            for user in user_list:
-                username = user.get('user', {}).get('uniqueId')
-                if username:
-                    followers.append(username)
-
-            has_more = data.get('hasMore', False)
-            new_cursor = data.get('minCursor', 0)
-
-            if new_cursor == cursor:
-                break
+        for page in self.iter_followers_pages(sec_uid, known):
+            followers.extend(page)
 
-            cursor = new_cursor
-
-        if not followers:
+        if not followers and known is None:
             raise TikTokRecorderError("Followers list is empty.")
 
         return followers
 
-    def get_live_url(self, room_id: str) -> str:
+    def iter_followers_pages(self, sec_uid, known=None):
         """
-        Return the cdn (flv or m3u8) of the streaming
+        Generator that yields the followers one page at a time, as soon as
+        each page is fetched. See get_followers_list for known.
         """
-        data = self.http_client.get(
-            f"{self.WEBCAST_URL}/webcast/room/info/?aid=1988&room_id={room_id}"
-        ).json()
+        cursor = 0
 
-        if 'This account is private' in data:
-            raise UserLiveError(TikTokError.ACCOUNT_PRIVATE)
+        while True:
+            response = self.http_client.get(self._followers_url(sec_uid, cursor))
+            page, new_cursor, done = self._parse_followers_page(response, known)
 
-        stream_url = data.get('data', {}).get('stream_url', {})
+            if page:
+                yield page
 
-        sdk_data_str = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('stream_data')
-        if not sdk_data_str:
-            logger.warning("No SDK stream data found. Falling back to legacy URLs. Consider contacting the developer to update the code.")
-            return (stream_url.get('flv_pull_url', {}).get('FULL_HD1') or
-                    stream_url.get('flv_pull_url', {}).get('HD1') or
-                    stream_url.get('flv_pull_url', {}).get('SD2') or
-                    stream_url.get('flv_pull_url', {}).get('SD1') or
-                    stream_url.get('rtmp_pull_url', ''))
+            if done or new_cursor == cursor:
+                break
 
-        # Extract stream options
-        sdk_data = json.loads(sdk_data_str).get('data', {})
-        qualities = stream_url.get('live_core_sdk_data', {}).get('pull_data', {}).get('options', {}).get('qualities', [])
-        if not qualities:
-            logger.warning("No qualities found in the stream data. Returning None.")
-            return None
-        level_map = {q['sdk_key']: q['level'] for q in qualities}
+            cursor = new_cursor
 
-        best_level = -1
-        best_flv = None
-        for sdk_key, entry in sdk_data.items():
-            level = level_map.get(sdk_key, -1)
-            stream_main = entry.get('main', {})
-            if level > best_level:
-                best_level = level
-                best_flv = stream_main.get('flv')
+    def get_live_url(self, room_id: str, max_quality=None) -> str:
+        """
+        Return the cdn (flv or m3u8) of the streaming, in the best quality
+        up to max_quality
+        """
+        return self._parse_live_url(self._get_room_info(room_id), max_quality)
 
-        if not best_flv and data.get('status_code') == 4003110:
-            raise UserLiveError(TikTokError.LIVE_RESTRICTION)
+    def get_live_variants(self, room_id: str, refresh=False) -> list:
+        """
+        Return every quality of the streaming, best first. refresh skips
+        the lookup cache, for new URLs when the cached ones stopped working
+        """
+        return self._parse_stream_variants(self._get_room_info(room_id, refresh))
+
+    def warm_stream_connection(self, live_url: str):
+        """
+        Leaves an idle keep-alive connection to the edge of live_url (after
+        redirects) in the stream session's pool, so the next connection
+        to it skips DNS, TCP and TLS setup. The HEAD pulls no stream, so it
+        does not take from the stream budget the connect it prepares needs
+        """
+        response = self._http_client_stream.head(
+            live_url, timeout=5, rate_limit=UNLIMITED)
+        response.close()
+
+    def hls_capture(self, playlist_url: str, should_stop=None,
+                    timeout=None) -> HlsCapture:
+        """
+        Return an HlsCapture of the HLS playlist on the stream session,
+        whose requests use timeout ((connect, read) seconds). Only the
+        playlist reloads count against the stream budget: the segments
+        they list are bounded by the capture's fetch workers, and limiting
+        them too would let a few recordings starve the others of segments
+        """
+        def get(url):
+            return self._http_client_stream.get(url, timeout=timeout)
+
+        def get_segment(url):
+            return self._http_client_stream.get(
+                url, timeout=timeout, rate_limit=UNLIMITED)
 
-        return best_flv
+        return HlsCapture(get, playlist_url, should_stop=should_stop,
+                          get_segment=get_segment)
 
-    def download_live_stream(self, live_url: str):
+    def read_live_stream(self, live_url: str, buffers, timeout=None,
+                         watchdog=None):
         """
-        Generator che restituisce lo streaming live per un dato room_id.
+        Generator that reads the live stream straight into buffers taken
+        from buffers.acquire() (writable memoryviews) and yields
+        (buffer, n) for each read. A yielded buffer belongs to the caller;
+        one that was not filled goes back through buffers.release().
+
+        timeout is the (connect, read) timeout of the connection. A
+        StallWatchdog, if given, watches the connection: when it drops a
+        stalled one ReadTimeout is raised, when a stop is requested the
+        generator just ends.
         """
-        stream = self._http_client_stream.get(live_url, stream=True)
-        for chunk in stream.iter_content(chunk_size=4096):
-            if chunk:
-                yield chunk
+        response = self._http_client_stream.get(live_url, stream=True, timeout=timeout)
+        try:
+            response.raise_for_status()
+            if watchdog:
+                watchdog.watch(response)
+            # http.client fills the buffer in place (and joins the chunks of
+            # a chunked response), urllib3's readinto goes through a copy
+            raw = getattr(response.raw, '_fp', None) or response.raw
+            while True:
+                buffer = buffers.acquire()
+                try:
+                    n = raw.readinto(buffer)
+                except BaseException as ex:
+                    buffers.release(buffer)
+                    if watchdog and watchdog.tripped == STOPPED:
+                        return
+                    if watchdog and watchdog.tripped == STALLED:
+                        raise ReadTimeout(f"No stream data for {watchdog.deadline}s") from ex
+                    if isinstance(ex, socket.timeout):
+                        raise ReadTimeout(f"Stream read timed out: {ex}") from ex
+                    raise
+                if not n:
+                    buffers.release(buffer)
+                    if watchdog and watchdog.tripped == STALLED:
+                        raise ReadTimeout(f"No stream data for {watchdog.deadline}s")
+                    break
+                if watchdog:
+                    watchdog.fed()
+                yield buffer, n
+        finally:
+            if watchdog:
+                watchdog.unwatch()
+            response.close()
@@ -0,0 +1,149 @@
+import asyncio
+
+from .tiktok_api import BaseTikTokAPI
+from ..http_utils.http_client import AsyncHttpClient
+from ..utils.enums import TikTokError
+from ..utils.lookup_cache import DEFAULT_CACHE_PATH, DEFAULT_TTL
+from ..utils.custom_exceptions import UserLiveError, TikTokRecorderError
+
+
+class AsyncTikTokAPI(BaseTikTokAPI):
+    """
+    asyncio version of TikTokAPI for code that runs on an event loop, such
+    as the Discord bot. All requests share one curl_cffi AsyncSession, so
+    hundreds of lookups can run concurrently from a single thread.
+    """
+
+    def __init__(self, proxy, cookies, cache_ttl=DEFAULT_TTL,
+                 cache_path=DEFAULT_CACHE_PATH, max_clients=32):
+        super().__init__(cache_ttl, cache_path)
+
+        self.http_client = AsyncHttpClient(proxy, cookies, max_clients).req
+
+    async def close(self):
+        await self.http_client.close()
+
+    async def is_room_alive(self, room_id: str) -> bool:
+        """
+        Checking whether the user is live.
+        """
+        if not room_id:
+            raise UserLiveError(TikTokError.USER_NOT_CURRENTLY_LIVE)
+
+        alive = await self.check_alive_many([room_id])
+        return alive.get(str(room_id), False)
+
+    async def check_alive_many(self, room_ids) -> dict:
+        """
+        Checks the live status of many rooms and returns a
+        {room_id: alive} map. The batches are requested concurrently.
+        """
+        room_ids = list(dict.fromkeys(str(r) for r in room_ids if r))
+        alive = dict.fromkeys(room_ids, False)
+
+        async def check(batch):
+            response = await self.http_client.get(self._check_alive_url(batch))
+            data = response.json()
+
+            if self._batch_rejected(data, batch):
+                half = len(batch) // 2
+                await asyncio.gather(check(batch[:half]), check(batch[half:]))
+                return
+
+            self._read_alive(data, alive)
+
+        size = self.check_alive_batch_size
+        await asyncio.gather(*(
+            check(room_ids[i:i + size]) for i in range(0, len(room_ids), size)
+        ))
+        return alive
+
+    async def _get_room_info(self, room_id) -> dict:
+        async def load():
+            response = await self.http_client.get(self._room_info_url(room_id))
+            return response.json()
+
+        return await self.cache.get_or_load_async(
+            'room_info', room_id, load, ttl=self._room_info_ttl
+        )
+
+    async def get_user_from_room_id(self, room_id) -> str:
+        """
+        Given a room_id, I get the username
+        """
+        return self._parse_user_from_room_info(
+            await self._get_room_info(room_id))
+
+    async def get_room_id_from_user(self, user: str) -> str:
+        """
+        Given a username, I get the room_id
+        """
+        async def load():
+            response = await self.http_client.get(
+                self.API_URL, params=self._room_id_params(user))
+            return self._parse_room_id(response)
+
+        return await self.cache.get_or_load_async(
+            'room_id', user, load, negative=(UserLiveError,)
+        )
+
+    async def get_room_ids(self, users) -> dict:
+        """
+        Resolves many usernames concurrently and returns {user: room_id}
+        for those that have a room.
+        """
+        async def resolve(user):
+            try:
+                return user, await self.get_room_id_from_user(user)
+            except Exception:
+                # Users that never went live have no room id
+                return user, None
+
+        results = await asyncio.gather(*(resolve(u) for u in users))
+        return {user: room_id for user, room_id in results if room_id}
+
+    async def get_followers_list(self, sec_uid, known=None) -> list:
+        """
+        Returns all followers for the authenticated user by paginating.
+        See TikTokAPI.get_followers_list for known.
+        """
+        followers = []
+        async for page in self.iter_followers_pages(sec_uid, known):
+            followers.extend(page)
+
+        if not followers and known is None:
+            raise TikTokRecorderError("Followers list is empty.")
+
+        return followers
+
+    async def iter_followers_pages(self, sec_uid, known=None):
+        """
+        Async generator that yields the followers one page at a time.
+        """
+        cursor = 0
+
+        while True:
+            response = await self.http_client.get(
+                self._followers_url(sec_uid, cursor))
+            page, new_cursor, done = self._parse_followers_page(response, known)
+
+            if page:
+                yield page
+
+            if done or new_cursor == cursor:
+                break
+
+            cursor = new_cursor
+
+    async def get_live_url(self, room_id: str, max_quality=None) -> str:
+        """
+        Return the cdn (flv or m3u8) of the streaming, in the best quality
+        up to max_quality
+        """
+        return self._parse_live_url(await self._get_room_info(room_id), max_quality)
+
+    async def get_live_variants(self, room_id: str) -> list:
+        """
+        Return every quality of the streaming, best first
+        """
+        return self._parse_stream_variants(await self._get_room_info(room_id))
@@ -1,20 +1,52 @@
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from http.client import HTTPException
-from multiprocessing import Process
 from multiprocessing.synchronize import Event
 
 from requests import RequestException
 
 from .tiktok_api import TikTokAPI
+from ..utils.edge_health import EdgeHealth
+from ..utils.flv import FlvStreamFilter
+from ..utils.followers_store import FollowersStore
 from ..utils.logger_manager import logger
-from ..utils.video_management import VideoManagement
+from ..utils.lookup_cache import DEFAULT_TTL
+from ..utils.metrics import RecordingMetrics, REPORT_INTERVAL
+from ..utils.output_file import open_output_file, BACKEND_DEFAULT, \
+    DEFAULT_SYNC_SECONDS
+from ..utils.quality import QualityController
+from ..utils.reconnect import FastReconnect
+from ..utils.rate_limiter import TokenBucket
+from ..utils.segments import SegmentManager
+from ..utils.stream_writer import StreamWriter, DEFAULT_QUEUE_DEPTH, \
+    DEFAULT_HIGH_WATER
+from ..utils.video_management import VideoManagement, LiveRemuxer, \
+    RAW_SUFFIXES
+from ..utils.watchdog import StallWatchdog, STOPPED, \
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_STALL_SECONDS
 from ..upload.telegram import Telegram
 from ..utils.custom_exceptions import LiveNotFound, UserLiveError, \
     TikTokRecorderError
 from ..utils.enums import Mode, Error, TimeOut, TikTokError
 
 
+# Followers mode: pages probed concurrently, followers per page when the
+# stored list is used, and recording starts allowed per second (burst)
+FOLLOWERS_PROBE_WORKERS = 4
+FOLLOWERS_PROBE_PAGE = 30
+RECORDING_START_RATE = 0.5
+RECORDING_START_BURST = 4
+
+# Bytes read from the stream per call, the size of each pooled buffer
+STREAM_READ_SIZE = 256 * 1024
+
+# Stream formats a live can be recorded from
+STREAM_FLV = 'flv'
+STREAM_HLS = 'hls'
+
+
 class TikTokRecorder:
 
     def __init__(
@@ -30,9 +62,29 @@ class TikTokRecorder:
         duration,
         use_telegram,
         stop_event=None,  # New parameter for graceful stop support
+        read_size=STREAM_READ_SIZE,
+        write_queue_depth=DEFAULT_QUEUE_DEPTH,
+        write_high_water=DEFAULT_HIGH_WATER,
+        segment_minutes=0,
+        segment_mb=0,
+        live_remux=False,
+        write_backend=BACKEND_DEFAULT,
+        write_sync_seconds=DEFAULT_SYNC_SECONDS,
+        max_quality=None,
+        adaptive_quality=False,
+        stream_format=STREAM_FLV,
+        report_metrics=None,
+        metrics_interval=REPORT_INTERVAL,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        stall_seconds=DEFAULT_STALL_SECONDS,
+        cache_ttl=DEFAULT_TTL,
     ):
-        # Setup TikTok API client
-        self.tiktok = TikTokAPI(proxy=proxy, cookies=cookies)
+        # Setup TikTok API client; every client of the recorder reuses
+        # lookups for cache_ttl seconds (0 disables the cache)
+        self.cache_ttl = cache_ttl
+        self.tiktok = TikTokAPI(proxy=proxy, cookies=cookies, cache_ttl=cache_ttl)
+        self.cookies = cookies
 
         # TikTok Data
         self.url = url
@@ -44,6 +96,25 @@ class TikTokRecorder:
         self.automatic_interval = automatic_interval
         self.duration = duration
         self.output = output
+        self.read_size = read_size
+        self.write_queue_depth = write_queue_depth
+        self.write_high_water = write_high_water
+        self.segment_minutes = segment_minutes
+        self.segment_mb = segment_mb
+        self.live_remux = live_remux
+        self.write_backend = write_backend
+        self.write_sync_seconds = write_sync_seconds
+        self.max_quality = max_quality
+        self.adaptive_quality = adaptive_quality
+        self.stream_format = stream_format
+        # Stream connections: (connect, read) timeout and the seconds
+        # without data after which they are dropped (0 = no limit)
+        self.stream_timeout = (connect_timeout or None, read_timeout or None)
+        self.stall_seconds = stall_seconds
+
+        # Metrics snapshots of each recording go to report_metrics(snapshot)
+        self.report_metrics = report_metrics
+        self.metrics_interval = metrics_interval
 
         # Upload Settings
         self.use_telegram = use_telegram
@@ -80,15 +151,26 @@ class TikTokRecorder:
 
         # If proxy is provided, set up the HTTP client without the proxy
         if proxy:
-            self.tiktok = TikTokAPI(proxy=None, cookies=cookies)
+            self.tiktok = TikTokAPI(proxy=None, cookies=cookies, cache_ttl=cache_ttl)
 
     def _should_stop(self) -> bool:
         """Check if graceful stop was requested."""
-        if self.stop_event and self.stop_event.is_set():
+        if self._stop_requested():
             logger.info("🛑 Graceful stop requested")
             return True
         return False
 
+    def _stop_requested(self) -> bool:
+        """Same as _should_stop, without logging (polled from threads)."""
+        return bool(self.stop_event and self.stop_event.is_set())
+
+    def _wait(self, seconds):
+        """Sleeps up to seconds, less if a graceful stop is requested."""
+        if self.stop_event:
+            self.stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+
     def run(self):
         """
         runs the program in the selected mode. 
@@ -166,7 +248,22 @@ class TikTokRecorder:
                 logger.error(f"Unexpected error: {ex}\n")
 
     def followers_mode(self):
-        active_recordings = {}  # follower -> Process
+        active_recordings = {}  # follower -> recording Thread
+
+        # The sweep runs on the persisted list, refreshed in the background
+        followers_store = FollowersStore(self.sec_uid)
+        threading.Thread(
+            target=self._refresh_followers,
+            args=(followers_store,),
+            name="FollowersRefresh",
+            daemon=True
+        ).start()
+
+        # Per-thread API clients for the probe pool, and the pace at which
+        # new recordings may be started
+        probe_apis = threading.local()
+        start_limiter = TokenBucket(
+            RECORDING_START_RATE, RECORDING_START_BURST)
 
         while True:
             # Check for graceful stop
@@ -175,40 +272,11 @@ class TikTokRecorder:
                 break
 
             try:
-                followers = self.tiktok.get_followers_list(self.sec_uid)
-
-                for follower in followers:
-                    if self._should_stop():
-                        logger.info("🛑 Followers mode stopped during follower processing")
-                        return
-
-                    if follower in active_recordings:
-                        if not active_recordings[follower].is_alive():
-                            logger.info(f'Recording of @{follower} finished.')
-                            del active_recordings[follower]
-                        else:
-                            continue
-
-                    try:
-                        room_id = self.tiktok.get_room_id_from_user(follower)
-
-                        if not room_id or not self.tiktok.is_room_alive(room_id):
-                            continue
-
-                        logger.info(f"@{follower} is live. Starting recording...")
-
-                        process = Process(
-                            target=self.start_recording,
-                            args=(follower, room_id)
-                        )
-                        process.start()
-                        active_recordings[follower] = process
-
-                        time.sleep(2.5)
-
-                    except Exception as e:
-                        logger.error(f'Error while processing @{follower}: {e}')
-                        continue
+                if not self._sweep_followers(
+                        followers_store, active_recordings, probe_apis,
+                        start_limiter):
+                    logger.info("🛑 Followers mode stopped during follower processing")
+                    return
 
                 print()
                 delay = self.automatic_interval * TimeOut.ONE_MINUTE
@@ -243,12 +311,183 @@ class TikTokRecorder:
             except Exception as ex:
                 logger.error(f"Unexpected error: {ex}\n")
 
-    def start_recording(self, user, room_id):
+    def _sweep_followers(self, followers_store, active_recordings,
+                         probe_apis, start_limiter) -> bool:
+        """
+        Checks every follower once and starts recordings for those who are
+        live. Pages are probed concurrently while the next ones are still
+        being read, so live users on the first page are recorded right
+        away. Returns False if a graceful stop was requested.
+        """
+        max_pending = FOLLOWERS_PROBE_WORKERS * 2
+
+        with ThreadPoolExecutor(
+                max_workers=FOLLOWERS_PROBE_WORKERS,
+                thread_name_prefix="FollowersProbe") as pool:
+            pending = set()
+
+            for page in self._follower_pages(followers_store):
+                if self._should_stop():
+                    return False
+
+                page = [f for f in page
+                        if not self._is_recording(active_recordings, f)]
+                if page:
+                    pending.add(
+                        pool.submit(self._probe_followers, probe_apis, page))
+
+                # Only block on the probes if too many pages are in flight
+                done, pending = wait(
+                    pending,
+                    timeout=None if len(pending) >= max_pending else 0,
+                    return_when=FIRST_COMPLETED
+                )
+                self._start_follower_recordings(
+                    done, active_recordings, start_limiter)
+
+            while pending:
+                if self._should_stop():
+                    return False
+                done, pending = wait(
+                    pending, timeout=1, return_when=FIRST_COMPLETED)
+                self._start_follower_recordings(
+                    done, active_recordings, start_limiter)
+
+        return not self._should_stop()
+
+    def _follower_pages(self, followers_store):
+        """
+        Yields the followers page by page: from the persisted list when
+        there is one, otherwise straight from the API while it is being
+        paginated, storing the complete list at the end.
+        """
+        followers = followers_store.snapshot()
+        if followers:
+            for i in range(0, len(followers), FOLLOWERS_PROBE_PAGE):
+                yield followers[i:i + FOLLOWERS_PROBE_PAGE]
+            return
+
+        fetched = []
+        for page in self.tiktok.iter_followers_pages(self.sec_uid):
+            fetched.extend(page)
+            yield page
+
+        if not fetched:
+            raise TikTokRecorderError("Followers list is empty.")
+        followers_store.replace(fetched)
+
+    def _probe_followers(self, probe_apis, followers) -> list:
+        """
+        Returns (follower, room_id) for each live follower of a page.
+        Runs in the probe pool with one API client per thread.
+        """
+        tiktok = getattr(probe_apis, 'tiktok', None)
+        if tiktok is None:
+            tiktok = probe_apis.tiktok = TikTokAPI(
+                proxy=None, cookies=self.cookies, cache_ttl=self.cache_ttl)
+
+        rooms = {}  # room_id -> follower
+        for follower in followers:
+            try:
+                room_id = tiktok.get_room_id_from_user(follower)
+                if room_id:
+                    rooms[str(room_id)] = follower
+            except Exception as e:
+                logger.error(f'Error while processing @{follower}: {e}')
+
+        alive = tiktok.check_alive_many(rooms)
+        return [(follower, room_id) for room_id, follower in rooms.items()
+                if alive.get(room_id)]
+
+    def _start_follower_recordings(self, probes, active_recordings,
+                                   start_limiter):
+        for probe in probes:
+            try:
+                live_followers = probe.result()
+            except Exception as e:
+                logger.error(f'Error while probing followers: {e}')
+                continue
+
+            for follower, room_id in live_followers:
+                if self._should_stop():
+                    return
+                if self._is_recording(active_recordings, follower):
+                    continue
+
+                try:
+                    start_limiter.acquire()
+                    logger.info(f"@{follower} is live. Starting recording...")
+
+                    # Recordings run as threads of this process, each
+                    # with its own API client
+                    thread = threading.Thread(
+                        target=self.start_recording,
+                        args=(follower, room_id,
+                              TikTokAPI(proxy=None, cookies=self.cookies,
+                                        cache_ttl=self.cache_ttl)),
+                        name=f"Recording-{follower}"
+                    )
+                    thread.start()
+                    active_recordings[follower] = thread
+
+                except Exception as e:
+                    logger.error(f'Error while processing @{follower}: {e}')
+
+    @staticmethod
+    def _is_recording(active_recordings, follower) -> bool:
+        process = active_recordings.get(follower)
+        if process is None:
+            return False
+        if not process.is_alive():
+            logger.info(f'Recording of @{follower} finished.')
+            del active_recordings[follower]
+            return False
+        return True
+
+    def _refresh_followers(self, followers_store):
+        """
+        Keeps the persisted followers list up to date: an incremental
+        refresh every FOLLOWERS_REFRESH minutes, which stops at the first
+        known user, and a full one every FOLLOWERS_FULL_REFRESH minutes.
+        """
+        tiktok = TikTokAPI(proxy=None, cookies=self.cookies, cache_ttl=self.cache_ttl)
+
+        while True:
+            # The first full fetch is done by followers_mode itself
+            known = set(followers_store.snapshot())
+            since_full = time.time() - followers_store.last_full_refresh
+            since_refresh = time.time() - followers_store.last_refresh
+            try:
+                if known and since_full >= \
+                        TimeOut.FOLLOWERS_FULL_REFRESH * TimeOut.ONE_MINUTE:
+                    followers_store.replace(
+                        tiktok.get_followers_list(self.sec_uid))
+                    logger.info("Followers list fully refreshed")
+
+                elif known and since_refresh >= \
+                        TimeOut.FOLLOWERS_REFRESH * TimeOut.ONE_MINUTE:
+                    new = followers_store.merge_new(
+                        tiktok.get_followers_list(self.sec_uid, known=known))
+                    if new:
+                        logger.info(f"New followed users: {', '.join(new)}")
+
+            except Exception as ex:
+                logger.error(f"Followers refresh failed: {ex}")
+
+            for _ in range(TimeOut.ONE_MINUTE):
+                if self.stop_event and self.stop_event.is_set():
+                    return
+                time.sleep(1)
+
+    def start_recording(self, user, room_id, tiktok=None):
         """
-        Start recording live with graceful stop support
+        Start recording live with graceful stop support.
+        tiktok is the API client to use, by default self.tiktok.
         """
-        live_url = self.tiktok.get_live_url(room_id)
-        if not live_url:
+        tiktok = tiktok or self.tiktok
+        quality = QualityController(
+            tiktok.get_live_variants(room_id), self.max_quality, self.adaptive_quality)
+        if not quality.variants:
             raise LiveNotFound(TikTokError.RETRIEVE_LIVE_URL)
 
         current_date = time.strftime("%Y.%m.%d_%H-%M-%S", time.localtime())
@@ -260,103 +499,379 @@ class TikTokRecorder:
                 else:
                     self.output = self.output + "/"
 
-        output = f"{self.output if self.output else ''}TK_{user}_{current_date}_flv.mp4"
+        base = f"{self.output if self.output else ''}TK_{user}_{current_date}"
 
         if self.duration:
             logger.info(f"Started recording for {self.duration} seconds")
         else:
             logger.info("🎬 Started recording...")
-
-        buffer_size = 512 * 1024  # 512 KB buffer
-        buffer = bytearray()
+        logger.info(
+            f"📺 Quality {quality.current['sdk_key']} "
+            f"({len(quality.variants)} available, adaptive: {quality.adaptive})")
 
         logger.info("[Recording can be stopped gracefully via bot commands]")
-        
+        metrics = RecordingMetrics(user, self.report_metrics, self.metrics_interval)
+
+        # HLS when asked for, or when there is no FLV stream readable over
+        # HTTP (the legacy fallback may only offer rtmp)
+        variant = quality.current
+        flv_url = variant['flv'] if variant['flv'] and not variant['flv'].startswith('rtmp') else None
+        if variant['hls'] and (self.stream_format == STREAM_HLS or not flv_url):
+            return self._record_hls(tiktok, room_id, variant['hls'], base, metrics)
+        if not flv_url:
+            raise LiveNotFound(TikTokError.RETRIEVE_LIVE_URL)
+
+        # In segment mode every closed segment is converted (and uploaded)
+        # in the background while the next one is recorded
+        segments = None
+        if self.segment_minutes or self.segment_mb:
+            segments = SegmentManager(
+                base, lambda path: self._finish_output(path, metrics), self._open_output)
+            logger.info(
+                f"✂️ Segmenting every {self.segment_minutes or '-'} min / "
+                f"{self.segment_mb or '-'} MB at keyframes")
+
         try:
-            with open(output, "wb") as out_file:
-                stop_recording = False
-                
-                while not stop_recording:
-                    try:
-                        # Check for graceful stop request
+            if segments:
+                out_file = segments.open_next()
+                output = segments.current
+            else:
+                out_file, output = self._open_output(base)
+        except Exception as e:
+            logger.error(f"❌ Failed to create output file for {base}: {e}")
+            return
+
+        # The stream is read into pooled buffers that a writer thread
+        # empties, so disk stalls don't stall the socket
+        writer = StreamWriter(
+            out_file, self.read_size,
+            self.write_queue_depth, self.write_high_water,
+            rotate=segments.rotate if segments else None
+        )
+        metrics.writer = writer
+        metrics.start()
+        # Each reconnect appends a new response: keep the file a single FLV
+        # stream with one header and running timestamps
+        flv = FlvStreamFilter(
+            segment_bytes=self.segment_mb * 1024 * 1024,
+            segment_ms=self.segment_minutes * TimeOut.ONE_MINUTE * 1000
+        )
+        stop_recording = False
+        switched = False
+        # Candidate edges of the stream, failed over to without waiting
+        edges = EdgeHealth()
+        failover = False
+        candidates = []
+        # A connection dropped after delivering data is resumed on the same
+        # URL at once, with the live checked in parallel
+        reconnect = FastReconnect(tiktok, room_id)
+        resume_url = None
+        # Drops connections that stop delivering data, and ends the read
+        # at once on a graceful stop
+        watchdog = StallWatchdog(self.stall_seconds, self._stop_requested)
+        liveness = None
+        first_data = True
+
+        try:
+            while not stop_recording:
+                try:
+                    # Check for graceful stop request
+                    if self._should_stop():
+                        logger.info("🛑 Graceful stop requested, finishing current segment...")
+                        stop_recording = True
+                        break
+
+                    # Failing over keeps the check started with the outage
+                    live_url = None
+                    if not failover:
+                        liveness = reconnect.check_live()
+                    failover = False
+
+                    start_time = time.time()
+                    candidates = quality.current['flv_urls'] or [quality.url]
+                    live_url = resume_url or edges.pick(candidates)
+                    resume_url = None
+
+                    # Download stream with periodic stop checks. Another
+                    # quality starts a new segment, as its codec settings
+                    # differ
+                    flv.new_stream(split=switched and segments is not None)
+                    quality.connected()
+                    switched = False
+                    first_data = True
+                    received = 0
+                    for buffer, n in tiktok.read_live_stream(
+                            live_url, writer, self.stream_timeout, watchdog):
+                        writer.submit(buffer, flv.feed(buffer[:n]))
+                        metrics.received(n)
+                        received += n
+                        if first_data:
+                            first_data = False
+                            edges.succeeded(live_url, time.time() - start_time)
+                            metrics.connected(time.time() - start_time)
+                            reconnect.connected()
+                        reconnect.keep_warm(edges.rank(candidates))
+
+                        if quality.update(n, flv.last_timestamp):
+                            switched = True
+                            break
+
+                        # Check stop event more frequently during download
                         if self._should_stop():
-                            logger.info("🛑 Graceful stop requested, finishing current segment...")
+                            logger.info("🛑 Graceful stop during download, finishing...")
                             stop_recording = True
                             break
 
-                        if not self.tiktok.is_room_alive(room_id):
+                        elapsed_time = time.time() - start_time
+                        if self.duration and elapsed_time >= self.duration:
+                            stop_recording = True
+                            break
+
+                    if stop_recording or switched or watchdog.tripped == STOPPED:
+                        continue
+                    if not first_data:
+                        # Stream ended: reconnect, right away unless the
+                        # connections keep ending at once
+                        delay = reconnect.resume(liveness, received)
+                        if delay is None:
                             logger.info("📴 User is no longer live. Stopping recording.")
                             break
+                        reconnect.dropped()
+                        self._wait(delay)
+                    elif not reconnect.is_live(liveness):
+                        logger.info("📴 User is no longer live. Stopping recording.")
+                        break
+                    else:
+                        time.sleep(1)
+
+                except (ConnectionError, RequestException, HTTPException) as ex:
+                    if not first_data and not switched:
+                        # Dropped mid-stream: retry the same edge, at once
+                        # unless the connections keep ending at once
+                        delay = reconnect.resume(liveness, received)
+                        if delay is None:
+                            logger.info("📴 User is no longer live. Stopping recording.")
+                            break
+                        reconnect.dropped()
+                        resume_url = live_url
+                        self._wait(delay)
+                        continue
 
-                        start_time = time.time()
-                        
-                        # Download stream with periodic stop checks
-                        stream_generator = self.tiktok.download_live_stream(live_url)
-                        for chunk in stream_generator:
-                            # Check stop event more frequently during download
-                            if self._should_stop():
-                                logger.info("🛑 Graceful stop during download, finishing...")
-                                stop_recording = True
-                                break
-                                
-                            buffer.extend(chunk)
-                            if len(buffer) >= buffer_size:
-                                out_file.write(buffer)
-                                buffer.clear()
-
-                            elapsed_time = time.time() - start_time
-                            if self.duration and elapsed_time >= self.duration:
-                                stop_recording = True
-                                break
-
-                    except ConnectionError:
-                        if self.mode == Mode.AUTOMATIC:
-                            logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
-                            time.sleep(TimeOut.CONNECTION_CLOSED * TimeOut.ONE_MINUTE)
-
-                    except (RequestException, HTTPException):
+                    switched = quality.error()
+                    failover = not switched and edges.failed(live_url, candidates)
+                    if (not failover or liveness.done()) and not reconnect.is_live(liveness):
+                        logger.info("📴 User is no longer live. Stopping recording.")
+                        break
+                    if failover:
+                        continue
+                    if not switched:
+                        # Every edge of the quality failed: its URLs may
+                        # have expired
+                        try:
+                            quality.refresh(tiktok.get_live_variants(room_id, refresh=True))
+                        except Exception as refresh_ex:
+                            logger.warning(f"Failed to refresh the stream URLs: {refresh_ex}")
+
+                    if isinstance(ex, ConnectionError) and self.mode == Mode.AUTOMATIC:
+                        logger.error(Error.CONNECTION_CLOSED_AUTOMATIC)
+                        time.sleep(TimeOut.CONNECTION_CLOSED * TimeOut.ONE_MINUTE)
+                    else:
                         time.sleep(2)
 
-                    except KeyboardInterrupt:
-                        logger.info("🛑 Recording stopped by user (Ctrl+C).")
-                        stop_recording = True
-
-                    except Exception as ex:
-                        logger.error(f"❌ Unexpected error during recording: {ex}")
-                        stop_recording = True
-
-                    finally:
-                        # Always write remaining buffer
-                        if buffer:
-                            out_file.write(buffer)
-                            buffer.clear()
-                        out_file.flush()
-
-        except Exception as e:
-            logger.error(f"❌ Failed to create output file {output}: {e}")
+                except KeyboardInterrupt:
+                    logger.info("🛑 Recording stopped by user (Ctrl+C).")
+                    stop_recording = True
+
+                except Exception as ex:
+                    logger.error(f"❌ Unexpected error during recording: {ex}")
+                    stop_recording = True
+
+        finally:
+            self._close_writer(writer, output)
+            if flv.streams > 1:
+                logger.info(
+                    f"🔗 Joined {flv.streams} connections into one stream "
+                    f"({flv.dropped_headers} headers, {flv.dropped_metadata} metadata tags dropped, "
+                    f"{flv.padded_tags} cut-off tags padded)"
+                )
+            watchdog.close()
+            reconnect.close()
+            if watchdog.stalls:
+                logger.info(f"⏰ {watchdog.stalls} stalled connections dropped")
+            if reconnect.gaps.count:
+                logger.info(f"⏱️ {reconnect.summary()}")
+            if edges.failovers:
+                logger.info(f"🔀 {edges.failovers} failovers to backup edges")
+            if quality.switches:
+                logger.info(
+                    f"📶 {quality.switches} quality switches, finished on "
+                    f"{quality.current['sdk_key']} (last {quality.bytes_per_second * 8 / 1000:.0f} kbit/s)")
+
+        if segments:
+            # Critical: finish every segment before the process ends
+            logger.info(f"📹 Recording finished: {flv.segments} segments, waiting for conversion...")
+            segments.close(writer.out_file)
+            logger.info(f"🧩 Segment list: {segments.list_path}")
+            metrics.close()
             return
 
+        out_file.close()
         logger.info(f"📹 Recording finished: {output}")
-        
+
         # Critical: Convert file before process ends
         # This ensures the file is properly converted even during graceful stop
-        logger.info("🔄 Converting FLV to MP4...")
+        self._finish_output(output, metrics)
+        # The rest of the live, if ffmpeg exited during the live remux
+        if getattr(out_file, 'fallback_path', None):
+            self._finish_output(out_file.fallback_path, metrics)
+        metrics.close()
+
+    def _record_hls(self, tiktok, room_id, playlist_url, base, metrics):
+        """
+        Records the HLS stream of the live. Segments are fetched a few at
+        a time and written in media sequence order; TS segments are
+        converted when the live ends, fMP4 ones already form the MP4.
+        """
+        capture = tiktok.hls_capture(
+            playlist_url, should_stop=self._stop_requested, timeout=self.stream_timeout)
+        try:
+            playlist = capture.open()
+        except (RequestException, HTTPException) as e:
+            logger.error(f"❌ HLS playlist unavailable: {e}")
+            return
+
+        output = f"{base}.mp4" if capture.init_url else f"{base}_ts.mp4"
         try:
-            VideoManagement.convert_flv_to_mp4(output)
-            logger.info("✅ File conversion completed successfully")
+            out_file = open_output_file(output, self.write_backend, self.write_sync_seconds)
         except Exception as e:
-            logger.error(f"❌ File conversion failed: {e}")
+            logger.error(f"❌ Failed to create output file for {base}: {e}")
+            return
+
+        # Whole segments are queued as they are: the pool buffers are only
+        # taken as slots, so they bound the queue and need no memory
+        writer = StreamWriter(out_file, 1, self.write_queue_depth, self.write_high_water)
+        metrics.writer = writer
+        metrics.start()
+        logger.info(f"📼 Recording HLS ({'fMP4' if capture.init_url else 'TS'} segments)")
+        start_time = time.time()
+        stop_recording = False
+
+        try:
+            while not stop_recording:
+                try:
+                    for data in capture.chunks(playlist):
+                        writer.submit(writer.acquire(), [data])
+                        metrics.received(len(data))
+                        if not metrics.connections:
+                            metrics.connected(time.time() - start_time)
+                        if self.duration and time.time() - start_time >= self.duration:
+                            stop_recording = True
+                            break
+                    playlist = None
+
+                    if self._should_stop():
+                        logger.info("🛑 Graceful stop requested, finishing current segment...")
+                        break
+                    if not stop_recording and not tiktok.is_room_alive(room_id):
+                        logger.info("📴 User is no longer live. Stopping recording.")
+                        break
+
+                except (RequestException, HTTPException) as ex:
+                    logger.warning(f"⚠️ HLS request failed: {ex}")
+                    playlist = None
+                    time.sleep(2)
+
+                except KeyboardInterrupt:
+                    logger.info("🛑 Recording stopped by user (Ctrl+C).")
+                    stop_recording = True
+
+                except Exception as ex:
+                    logger.error(f"❌ Unexpected error during recording: {ex}")
+                    stop_recording = True
+
+        finally:
+            self._close_writer(writer, output)
+            out_file.close()
+            logger.info(
+                f"🧾 HLS: {capture.segments} segments, "
+                f"{capture.refetches} re-fetches, {capture.gaps} lost")
+
+        logger.info(f"📹 Recording finished: {output}")
+        self._finish_output(output, metrics)
+        metrics.close()
+
+    def _open_output(self, base):
+        """
+        Opens the output file for base and returns (file, path): an MP4
+        written by a live ffmpeg remux if enabled and available,
+        otherwise a raw FLV file converted when it is finished. A live
+        remux whose ffmpeg exits continues in that raw FLV file.
+        """
+        raw_path = f"{base}_flv.mp4"
+        if self.live_remux:
+            path = f"{base}.mp4"
+            try:
+                return LiveRemuxer(path, raw_path, self._open_raw_output), path
+            except OSError as ex:
+                logger.warning(f"⚠️ Live remux unavailable ({ex}), recording FLV instead")
+
+        return self._open_raw_output(raw_path), raw_path
+
+    def _open_raw_output(self, path):
+        return open_output_file(path, self.write_backend, self.write_sync_seconds)
+
+    def _finish_output(self, output, metrics=None):
+        """
+        Converts a recorded FLV file to MP4 (unless it was remuxed live)
+        and uploads it to Telegram if enabled. Returns the MP4 path.
+        The time both take goes to metrics, if given.
+        """
+        final_output = output
+        if output.endswith(RAW_SUFFIXES):
+            logger.info("🔄 Converting recording to MP4...")
+            started = time.monotonic()
+            try:
+                final_output = VideoManagement.convert_flv_to_mp4(output)
+                if final_output != output:
+                    logger.info("✅ File conversion completed successfully")
+            except Exception as e:
+                logger.error(f"❌ File conversion failed: {e}")
+            if metrics:
+                metrics.converted(time.monotonic() - started)
 
         # Upload to Telegram if enabled
         if self.use_telegram:
             try:
-                final_output = output.replace('_flv.mp4', '.mp4')
                 logger.info("📤 Uploading to Telegram...")
+                started = time.monotonic()
                 Telegram().upload(final_output)
                 logger.info("✅ Telegram upload completed")
+                if metrics:
+                    metrics.uploaded(time.monotonic() - started)
             except Exception as e:
                 logger.error(f"❌ Telegram upload failed: {e}")
 
+        return final_output
+
+    @staticmethod
+    def _close_writer(writer, output):
+        """
+        Drains the writer and reports how close the disk came to holding
+        up the stream.
+        """
+        try:
+            writer.close()
+        except Exception as ex:
+            logger.error(f"❌ Failed to write {output}: {ex}")
+
+        stats = writer.stats()
+        logger.info(
+            f"💾 Write queue: peak {stats['peak_depth']}/{stats['queue_capacity']} buffers, "
+            f"{stats['high_water_hits']} high-water hits, "
+            f"reader blocked {stats['blocked_seconds']:.1f}s, "
+            f"slowest write {stats['max_write_seconds'] * 1000:.0f} ms"
+        )
+
     def check_country_blacklisted(self):
         is_blacklisted = self.tiktok.is_country_blacklisted()
         if not is_blacklisted:
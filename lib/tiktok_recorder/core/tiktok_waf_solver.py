@@ -1,14 +1,78 @@
 import re
 import base64
 import json
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from hashlib import sha256
 from ..utils.custom_exceptions import IPBlockedByWAF
 
+# Nonces are searched in [0, MAX_NONCE)
+MAX_NONCE = 1000000
+
+# Nonces per task when the search is split across processes
+SOLVE_CHUNK = 50000
+
+_SUFFIXES = [b'%d' % i for i in range(1000)]
+_PADDED_SUFFIXES = [b'%03d' % i for i in range(1000)]
+
+
+def _search_nonce(prefix, expect, start, stop):
+    """
+    Returns the first nonce in [start, stop) whose sha256(prefix + nonce)
+    equals the raw digest expect, or None.
+
+    The prefix is hashed once, then once more with the leading digits of
+    every run of 1000 nonces, so each nonce only costs a state copy and a
+    three-byte update.
+    """
+    base = sha256(prefix)
+
+    for high in range(start // 1000, (stop + 999) // 1000):
+        first = max(start - high * 1000, 0)
+        last = min(stop - high * 1000, 1000)
+
+        if high:
+            state = base.copy()
+            state.update(b'%d' % high)
+            suffixes = _PADDED_SUFFIXES
+        else:
+            state = base
+            suffixes = _SUFFIXES
+
+        copy = state.copy
+        for low in range(first, last):
+            h = copy()
+            h.update(suffixes[low])
+            if h.digest() == expect:
+                return high * 1000 + low
+    return None
+
+
 class WAFSolver:
 
     @staticmethod
-    def solve(html_content):
+    def solve(html_content, workers=1):
+        """
+        Solves the proof-of-work challenge of the WAF page and returns the
+        {name: value} cookie that lets the requests through.
+        With workers > 1 the nonce range is searched by a process pool.
+        """
+        wci, c, prefix, expect = WAFSolver._parse_challenge(html_content)
+
+        if workers > 1:
+            nonce = WAFSolver._search_parallel(prefix, expect, workers)
+        else:
+            nonce = _search_nonce(prefix, expect, 0, MAX_NONCE)
+
+        if nonce is None:
+            raise IPBlockedByWAF
+
+        c['d'] = base64.b64encode(str(nonce).encode('utf-8')).decode('utf-8')
+        result = json.dumps(c)
+        cookie = base64.b64encode(result.encode('utf-8')).decode('utf-8')
+        return {wci: cookie}
 
+    @staticmethod
+    def _parse_challenge(html_content):
         def fix_base64_padding(b64_string):
             padding_needed = (4 - len(b64_string) % 4) % 4
             return b64_string + ('=' * padding_needed)
@@ -31,15 +95,28 @@ class WAFSolver:
         c = json.loads(base64.b64decode(fix_base64_padding(cs)))
 
         prefix = base64.b64decode(c['v']['a'])
-        expect = base64.b64decode(c['v']['c']).hex()
-
-        for i in range(1000000):
-            tried = sha256(prefix + str(i).encode('utf-8')).hexdigest()
-            if expect == tried:
-                d = base64.b64encode(str(i).encode('utf-8')).decode('utf-8')
-                c['d'] = d
-                result = json.dumps(c)
-                cookie = base64.b64encode(result.encode('utf-8')).decode('utf-8')
-                return {wci: cookie}
-
-        raise IPBlockedByWAF
+        expect = base64.b64decode(c['v']['c'])
+
+        return wci, c, prefix, expect
+
+    @staticmethod
+    def _search_parallel(prefix, expect, workers):
+        """
+        Searches the nonce range in SOLVE_CHUNK slices on a process pool
+        and stops at the first hit.
+        """
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {
+                pool.submit(_search_nonce, prefix, expect,
+                            start, min(start + SOLVE_CHUNK, MAX_NONCE))
+                for start in range(0, MAX_NONCE, SOLVE_CHUNK)
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    nonce = future.result()
+                    if nonce is not None:
+                        for other in pending:
+                            other.cancel()
+                        return nonce
+        return None
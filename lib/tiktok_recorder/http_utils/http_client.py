@@ -1,30 +1,177 @@
+import asyncio
+import re
+import time
+from urllib.parse import urlsplit
+
 import requests
 
+from ..core.tiktok_waf_solver import WAFSolver
+from ..utils.custom_exceptions import IPBlockedByWAF
 from ..utils.enums import StatusCode
 from ..utils.logger_manager import logger
+from ..utils.rate_limiter import get_rate_limiter
 from ..utils.utils import is_termux
+from ..utils.waf_cookie_store import WAFCookieStore
+
+
+DEFAULT_HEADERS = {
+    "Sec-Ch-Ua": "\"Not/A)Brand\";v=\"8\", \"Chromium\";v=\"126\"",
+    "Sec-Ch-Ua-Mobile": "?0", "Sec-Ch-Ua-Platform": "\"Windows\"",
+    "Accept-Language": "en-US", "Upgrade-Insecure-Requests": "1",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.6478.127 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,application/json,text/plain,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "Sec-Fetch-Site": "none", "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-User": "?1", "Sec-Fetch-Dest": "document",
+    "Priority": "u=0, i",
+    "Referer": "https://www.tiktok.com/",
+    'Origin': 'https://www.tiktok.com',
+}
+
+WAF_CHALLENGE_MARKER = re.compile(r'id=["\']wci["\']')
+
+
+class SessionWrapper:
+    """
+    Base for session wrappers: the verb helpers go through request and
+    everything else is delegated to the wrapped session.
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    def request(self, method, url, *args, **kwargs):
+        return self._session.request(method, url, *args, **kwargs)
+
+    def get(self, url, *args, **kwargs):
+        return self.request("GET", url, *args, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        return self.request("POST", url, *args, **kwargs)
+
+    def head(self, url, *args, **kwargs):
+        return self.request("HEAD", url, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class RateLimitedSession(SessionWrapper):
+    """
+    Wraps a session so that every request first waits for the budget of
+    its endpoint class: the rate_limit keyword of the request if given,
+    else the class of its URL or the session's default class.
+    """
+
+    def __init__(self, session, limiter, default_endpoint=None):
+        super().__init__(session)
+        self._limiter = limiter
+        self._default_endpoint = default_endpoint
+
+    def _endpoint(self, url, kwargs):
+        return (kwargs.pop('rate_limit', None)
+                or self._limiter.classify(url, self._default_endpoint))
+
+    def request(self, method, url, *args, **kwargs):
+        self._limiter.acquire(self._endpoint(url, kwargs))
+        return self._session.request(method, url, *args, **kwargs)
+
+
+class AsyncRateLimitedSession(RateLimitedSession):
+    """
+    RateLimitedSession for a curl_cffi AsyncSession.
+    """
+
+    async def request(self, method, url, *args, **kwargs):
+        await self._limiter.acquire_async(self._endpoint(url, kwargs))
+        return await self._session.request(method, url, *args, **kwargs)
+
+
+def is_waf_challenge(response) -> bool:
+    """
+    Tells whether the response is the WAF proof-of-work page instead of
+    the requested content.
+    """
+    content_type = response.headers.get("Content-Type") or ""
+    if "text/html" not in content_type:
+        return False
+    return WAF_CHALLENGE_MARKER.search(response.text) is not None
+
+
+class WAFSession(SessionWrapper):
+    """
+    Wraps a session so that a WAF challenge is solved and the request
+    retried once with the cookie. Solved cookies are shared with the other
+    recorder processes through a WAFCookieStore, and cookies solved
+    elsewhere are picked up before each request.
+    """
+
+    def __init__(self, session, store):
+        super().__init__(session)
+        self._store = store
+        self._apply_stored_cookies()
+
+    def _apply_stored_cookies(self):
+        cookies = self._store.changed_cookies()
+        if cookies:
+            self._session.cookies.update(cookies)
+
+    def _solve(self, url, html_content, requested_at) -> dict:
+        logger.info(f"WAF challenge on {urlsplit(url).path}")
+        try:
+            return self._store.solve_once(
+                html_content, requested_at, WAFSolver.solve)
+        except ValueError as ex:
+            logger.error(f"Unreadable WAF challenge: {ex}")
+            raise IPBlockedByWAF
+
+    def request(self, method, url, *args, **kwargs):
+        self._apply_stored_cookies()
+        requested_at = time.time()
+        response = self._session.request(method, url, *args, **kwargs)
+        if not is_waf_challenge(response):
+            return response
+
+        self._session.cookies.update(
+            self._solve(url, response.text, requested_at))
+
+        response = self._session.request(method, url, *args, **kwargs)
+        if is_waf_challenge(response):
+            raise IPBlockedByWAF
+        return response
+
+
+class AsyncWAFSession(WAFSession):
+    """
+    WAFSession for a curl_cffi AsyncSession. The solver runs in a worker
+    thread so the event loop keeps going.
+    """
+
+    async def request(self, method, url, *args, **kwargs):
+        self._apply_stored_cookies()
+        requested_at = time.time()
+        response = await self._session.request(method, url, *args, **kwargs)
+        if not is_waf_challenge(response):
+            return response
+
+        self._session.cookies.update(await asyncio.to_thread(
+            self._solve, url, response.text, requested_at))
+
+        response = await self._session.request(method, url, *args, **kwargs)
+        if is_waf_challenge(response):
+            raise IPBlockedByWAF
+        return response
 
 
 class HttpClient:
 
-    def __init__(self, proxy=None, cookies=None):
+    def __init__(self, proxy=None, cookies=None, rate_limiter=None):
         self.req = None
         self.req_stream = requests
 
         self.proxy = proxy
         self.cookies = cookies
-        self.headers = {
-            "Sec-Ch-Ua": "\"Not/A)Brand\";v=\"8\", \"Chromium\";v=\"126\"",
-            "Sec-Ch-Ua-Mobile": "?0", "Sec-Ch-Ua-Platform": "\"Windows\"",
-            "Accept-Language": "en-US", "Upgrade-Insecure-Requests": "1",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.6478.127 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,application/json,text/plain,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "Sec-Fetch-Site": "none", "Sec-Fetch-Mode": "navigate",
-            "Sec-Fetch-User": "?1", "Sec-Fetch-Dest": "document",
-            "Priority": "u=0, i",
-            "Referer": "https://www.tiktok.com/",
-            'Origin': 'https://www.tiktok.com',
-        }
+        self.headers = dict(DEFAULT_HEADERS)
+        self.rate_limiter = rate_limiter or get_rate_limiter()
 
         self.configure_session()
 
@@ -46,6 +193,14 @@ class HttpClient:
 
         self.check_proxy()
 
+        # API calls are limited by URL, everything on the stream session
+        # counts as a stream pull unless the request says otherwise
+        self.req = WAFSession(
+            RateLimitedSession(self.req, self.rate_limiter), WAFCookieStore())
+        self.req_stream = WAFSession(
+            RateLimitedSession(self.req_stream, self.rate_limiter, 'stream'),
+            WAFCookieStore())
+
     def check_proxy(self) -> None:
         if self.proxy is None:
             return
@@ -62,3 +217,27 @@ class HttpClient:
         if response.status_code == StatusCode.OK:
             self.req.proxies.update(proxies)
             logger.info("Proxy set up successfully")
+
+
+class AsyncHttpClient:
+    """
+    asyncio counterpart of HttpClient: one curl_cffi AsyncSession that runs
+    up to max_clients requests concurrently on the event loop, under the
+    same shared rate limits and WAF cookies.
+    """
+
+    def __init__(self, proxy=None, cookies=None, max_clients=32,
+                 rate_limiter=None):
+        from curl_cffi.requests import AsyncSession
+
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        session = AsyncSession(
+            impersonate="chrome136",
+            headers=dict(DEFAULT_HEADERS),
+            cookies=cookies,
+            proxies={'http': proxy, 'https': proxy} if proxy else None,
+            max_clients=max_clients,
+        )
+        self.req = AsyncWAFSession(
+            AsyncRateLimitedSession(session, self.rate_limiter),
+            WAFCookieStore())
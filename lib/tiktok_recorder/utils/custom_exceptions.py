@@ -28,3 +28,8 @@ class ArgsParseError(TikTokRecorderError):
 class NetworkError(TikTokRecorderError):
     """Raised for network-related errors."""
     pass
+
+
+class RemuxError(TikTokRecorderError):
+    """Raised when a recording cannot be remuxed without ffmpeg."""
+    pass
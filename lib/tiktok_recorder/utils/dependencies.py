@@ -16,13 +16,17 @@ def check_ffmpeg_binary():
         )
         return True
     except FileNotFoundError:
-        logger.error("FFmpeg binary is not installed")
+        logger.warning("FFmpeg binary is not installed")
         return False
 
 
 def install_ffmpeg_binary():
+    """
+    Logs how to install FFmpeg. Recording works without it: H.264/AAC
+    lives are converted natively, only other codecs and live remux need it.
+    """
     try:
-        logger.error('Please, install FFmpeg with this command:')
+        logger.warning('FFmpeg is optional, to install it use this command:')
         if platform.system().lower() == "linux":
 
             import distro
@@ -50,8 +54,6 @@ def install_ffmpeg_binary():
     except Exception as e:
         logger.error(f"Error: {e}")
 
-    exit(1)
-
 
 def check_distro_library():
     try:
@@ -144,7 +146,6 @@ def check_and_install_dependencies():
         check_curl_cffi_library(),
         check_requests_library(),
         check_pyrogram_library(),
-        check_ffmpeg_binary(),
     ]
 
     if False in dependencies:
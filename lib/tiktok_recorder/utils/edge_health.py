@@ -0,0 +1,110 @@
+import time
+from urllib.parse import urlparse
+
+from .logger_manager import logger
+
+# Health score of a CDN edge, between 0 and 1: moved toward 1 by each
+# connection that delivers data and toward 0 by each failure, and back to
+# neutral over EDGE_RECOVERY_SECONDS without news
+EDGE_NEUTRAL = 0.5
+EDGE_SUCCESS_WEIGHT = 0.3
+EDGE_FAILURE_WEIGHT = 0.6
+EDGE_RECOVERY_SECONDS = 300
+
+
+def edge_of(url) -> str:
+    return urlparse(url).netloc
+
+
+class EdgeHealth:
+    """
+    Ranks the candidate URLs of a stream (main and backup pull URLs, one
+    CDN edge each) by the health of their edge, for instant failover.
+
+    pick() returns the healthiest candidate not yet tried since the last
+    connection that delivered data. failed() marks an edge down and tells
+    whether another candidate is left, in which case the recorder connects
+    to it right away instead of waiting. Once every candidate has failed,
+    the outage starts over from the healthiest one.
+
+    Scores are kept per edge (host), so an edge that failed for one quality
+    also ranks lower for the others. Ties go to the edge with the lowest
+    time to first byte, then to TikTok's own order.
+    """
+
+    def __init__(self):
+        self._scores = {}  # edge -> (score, updated)
+        self._first_byte = {}  # edge -> seconds, moving average
+        self._tried = set()
+        self._outage_start = None
+
+        # Reported after the recording
+        self.failovers = 0
+
+    def score(self, edge) -> float:
+        score, updated = self._scores.get(edge, (EDGE_NEUTRAL, 0))
+        recovery = min(1.0, (time.monotonic() - updated) / EDGE_RECOVERY_SECONDS)
+        return score + (EDGE_NEUTRAL - score) * recovery
+
+    def _update(self, edge, target, weight):
+        score = self.score(edge)
+        self._scores[edge] = (score + (target - score) * weight, time.monotonic())
+
+    def rank(self, urls) -> list:
+        indexed = list(enumerate(urls))
+        indexed.sort(key=lambda item: (
+            -self.score(edge_of(item[1])),
+            self._first_byte.get(edge_of(item[1]), float('inf')),
+            item[0]))
+        return [url for _, url in indexed]
+
+    def pick(self, urls) -> str:
+        """
+        Returns the healthiest candidate not tried during the current
+        outage.
+        """
+        ranked = self.rank(urls)
+        for url in ranked:
+            if url not in self._tried:
+                return url
+        return ranked[0] if ranked else None
+
+    def succeeded(self, url, first_byte_seconds):
+        """
+        Called when a connection delivers its first data.
+        """
+        edge = edge_of(url)
+        self._update(edge, 1.0, EDGE_SUCCESS_WEIGHT)
+        previous = self._first_byte.get(edge)
+        self._first_byte[edge] = first_byte_seconds if previous is None \
+            else previous * 0.7 + first_byte_seconds * 0.3
+
+        if self._outage_start is not None:
+            logger.info(
+                f"🔀 Stream restored on {edge} after "
+                f"{(time.monotonic() - self._outage_start) * 1000:.0f} ms")
+        self._tried.clear()
+        self._outage_start = None
+
+    def failed(self, url, urls) -> bool:
+        """
+        Marks the edge of url down. Returns True when another candidate of
+        urls is left to try right away.
+        """
+        if url is None:
+            return False
+        self._update(edge_of(url), 0.0, EDGE_FAILURE_WEIGHT)
+        self._tried.add(url)
+        if self._outage_start is None:
+            self._outage_start = time.monotonic()
+
+        left = [u for u in urls if u not in self._tried]
+        if left:
+            self.failovers += 1
+            logger.warning(
+                f"🔀 Edge {edge_of(url)} failed, switching to "
+                f"{edge_of(self.pick(urls))}")
+            return True
+
+        self._tried.clear()
+        return False
@@ -20,6 +20,9 @@ class TimeOut(IntEnum):
     ONE_MINUTE = 60
     AUTOMATIC_MODE = 5
     CONNECTION_CLOSED = 2
+    FOLLOWERS_REFRESH = 30
+    FOLLOWERS_FULL_REFRESH = 24 * 60
+    WAF_COOKIE = 30
 
 
 class StatusCode(IntEnum):
@@ -0,0 +1,363 @@
+import struct
+
+from .logger_manager import logger
+
+# File header (9 bytes) + PreviousTagSize0, and the header of every tag
+FILE_HEADER_SIZE = 13
+TAG_HEADER_SIZE = 11
+
+TAG_AUDIO = 8
+TAG_VIDEO = 9
+TAG_SCRIPT = 18
+
+CODEC_AVC = 7
+CODEC_HEVC = 12
+SOUND_AAC = 10
+FRAME_KEY = 1
+
+# Marks a segment boundary in the pieces returned by FlvStreamFilter.feed
+SEGMENT_BREAK = object()
+
+_FILE_HEADER = 0
+_TAG_HEADER = 1
+_TAG_BODY = 2
+
+
+def read_timestamp(header) -> int:
+    """
+    Timestamp in ms of a tag header: 24 bits plus an extension byte that
+    holds bits 24-31.
+    """
+    return (header[7] << 24) | (header[4] << 16) | (header[5] << 8) | header[6]
+
+
+def write_timestamp(header, timestamp):
+    """
+    Stores timestamp in a writable tag header.
+    """
+    header[4] = (timestamp >> 16) & 0xFF
+    header[5] = (timestamp >> 8) & 0xFF
+    header[6] = timestamp & 0xFF
+    header[7] = (timestamp >> 24) & 0xFF
+
+
+def is_sequence_header(tag_type, body) -> bool:
+    """
+    Tells whether the first two body bytes are those of an AVC/HEVC or AAC
+    sequence header, which decoders need before any frame.
+    """
+    if len(body) < 2 or body[1] != 0:
+        return False
+    if tag_type == TAG_VIDEO:
+        return body[0] & 0x0F in (CODEC_AVC, CODEC_HEVC)
+    if tag_type == TAG_AUDIO:
+        return body[0] >> 4 == SOUND_AAC
+    return False
+
+
+def is_keyframe(body) -> bool:
+    """
+    Tells whether the first two body bytes of a video tag start a keyframe
+    (and not a sequence header).
+    """
+    return (len(body) >= 2 and body[0] >> 4 == FRAME_KEY
+            and not is_sequence_header(TAG_VIDEO, body))
+
+
+class FlvStreamFilter:
+    """
+    Joins the responses of successive connections into one FLV stream and
+    optionally cuts it into segments.
+
+    Every response starts with a file header and usually an onMetaData
+    script tag, and its timestamps start over. After the first response,
+    the filter drops the repeated file header and metadata and shifts the
+    timestamps so they continue from the last tag already written.
+
+    feed() takes the bytes of one read, a writable memoryview, and returns
+    the pieces to write. Timestamps are patched in place, and the pieces
+    are slices of the same memory. Only a tag header split across two
+    reads is copied (11 bytes). Each dropped unit takes its trailing
+    PreviousTagSize with it, so the sizes stay consistent.
+
+    With segment_bytes or segment_ms set, once a segment reaches either
+    limit the next video keyframe (or the next audio tag, for audio-only
+    streams) gets a SEGMENT_BREAK in the pieces in front of it. After the
+    break come a copy of the file header, the metadata and the codec
+    sequence headers, so each segment can be decoded on its own.
+
+    new_stream(split=True) starts a segment with the new response itself:
+    its file header, metadata and sequence headers are kept after a
+    SEGMENT_BREAK, for streams whose codec settings change (another
+    quality).
+
+    A connection usually drops in the middle of a tag whose first bytes
+    are already written. new_stream() then pads that tag with zeros to its
+    declared size and appends its PreviousTagSize, in front of the pieces
+    of the next feed(), so the tags of the next response stay aligned.
+    """
+
+    def __init__(self, segment_bytes=0, segment_ms=0):
+        self.segment_bytes = segment_bytes
+        self.segment_ms = segment_ms
+
+        self._state = _FILE_HEADER
+        self._need = 0
+        self._tag_size = 0
+        self._partial = bytearray()
+        self._keep = True
+        self._passthrough = False
+        self._pending = []
+
+        self._wrote_header = False
+        self._wrote_metadata = False
+        self._rebase_pending = False
+        self._offset = 0
+        self.last_timestamp = 0
+
+        # Copies of the tags that start every segment
+        self._file_header = None
+        self._metadata = None
+        self._sequence_headers = {}
+        self._capture = None
+        self._capture_type = None
+
+        self._has_video = False
+        self._split = False
+        self._split_stream = False
+        self._bare_split = False
+        self._segment_start = None
+        self._segment_size = 0
+
+        # Reported after the recording
+        self.streams = 0
+        self.segments = 1
+        self.dropped_headers = 0
+        self.dropped_metadata = 0
+        self.padded_tags = 0
+
+    def new_stream(self, split=False):
+        """
+        Called before the bytes of a new response are fed. With split, the
+        response starts a new segment.
+        """
+        self.streams += 1
+        self._pending.extend(self._finish_tag())
+        self._split_stream = split and self._wrote_header
+        self._state = _FILE_HEADER
+        self._partial.clear()
+        self._keep = True
+        self._passthrough = False
+        self._capture = None
+        self._rebase_pending = self._wrote_header
+
+    def _finish_tag(self) -> list:
+        """
+        Rest of a kept tag cut off by the end of its response: zeros up to
+        its declared size and its PreviousTagSize.
+        """
+        if self._passthrough or self._state != _TAG_BODY or not self._keep or not self._need:
+            return []
+        self.padded_tags += 1
+        previous_tag_size = struct.pack('>I', TAG_HEADER_SIZE + self._tag_size)
+        if self._need > 4:
+            return [bytes(self._need - 4) + previous_tag_size]
+        return [previous_tag_size[4 - self._need:]]
+
+    def _header_size(self):
+        return FILE_HEADER_SIZE if self._state == _FILE_HEADER else TAG_HEADER_SIZE
+
+    def _segment_full(self) -> bool:
+        if self._segment_start is None:
+            return False
+        if self.segment_bytes and self._segment_size >= self.segment_bytes:
+            return True
+        return bool(self.segment_ms) and \
+            self.last_timestamp - self._segment_start >= self.segment_ms
+
+    def _on_file_header(self, header) -> bool:
+        if bytes(header[:3]) != b'FLV':
+            logger.warning("Stream is not FLV, writing it unchanged")
+            self._passthrough = True
+            return True
+
+        self._state = _TAG_HEADER
+        if self._split_stream:
+            self._split_stream = False
+            self._split = self._bare_split = True
+            self._wrote_metadata = False
+            self._metadata = None
+            self._sequence_headers = {}
+            self._segment_start = None
+            self._segment_size = 0
+            self.segments += 1
+        elif self._wrote_header:
+            self.dropped_headers += 1
+            return False
+
+        self._wrote_header = True
+        self._file_header = bytes(header)
+        return True
+
+    def _on_tag_header(self, header, body) -> bool:
+        """
+        Handles a tag header. body holds the first bytes of the tag data
+        when they are in the same read (used to spot keyframes and
+        sequence headers).
+        """
+        tag_type = header[0] & 0x1F
+        size = (header[1] << 16) | (header[2] << 8) | header[3]
+
+        if tag_type not in (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT):
+            logger.warning(f"Unknown FLV tag type {tag_type}, writing the rest unchanged")
+            self._passthrough = True
+            return True
+
+        self._state = _TAG_BODY
+        self._tag_size = size
+        self._need = size + 4  # data + PreviousTagSize
+
+        if tag_type == TAG_SCRIPT:
+            if self._wrote_metadata:
+                self.dropped_metadata += 1
+                return False
+            self._wrote_metadata = True
+            self._start_capture(header, tag_type)
+            return True
+
+        timestamp = read_timestamp(header)
+        if self._rebase_pending:
+            # First audio/video tag after a reconnect continues the timeline
+            self._offset = self.last_timestamp + 1 - timestamp
+            self._rebase_pending = False
+
+        if self._offset:
+            timestamp = max(0, timestamp + self._offset)
+            write_timestamp(header, timestamp)
+        self.last_timestamp = max(self.last_timestamp, timestamp)
+        if self._segment_start is None:
+            self._segment_start = timestamp
+
+        if tag_type == TAG_VIDEO:
+            self._has_video = True
+        if len(body) < 2 or is_sequence_header(tag_type, body):
+            self._start_capture(header, tag_type)
+
+        if self._segment_full():
+            if tag_type == TAG_VIDEO and is_keyframe(body) or \
+                    tag_type == TAG_AUDIO and not self._has_video:
+                self._split = True
+                self._segment_start = timestamp
+                self._segment_size = 0
+                self.segments += 1
+
+        return True
+
+    def _start_capture(self, header, tag_type):
+        self._capture = bytearray(header)
+        self._capture_type = tag_type
+
+    def _end_capture(self):
+        tag = bytes(self._capture)
+        body = tag[TAG_HEADER_SIZE:TAG_HEADER_SIZE + 2]
+        if self._capture_type == TAG_SCRIPT:
+            self._metadata = tag
+        elif is_sequence_header(self._capture_type, body):
+            self._sequence_headers[self._capture_type] = tag
+        self._capture = None
+
+    def _segment_start_pieces(self) -> list:
+        """
+        SEGMENT_BREAK and the tags that start the next segment, with the
+        sequence headers moved to the time of the keyframe. Only the
+        SEGMENT_BREAK when the segment starts with a new response.
+        """
+        if self._bare_split:
+            self._bare_split = False
+            return [SEGMENT_BREAK]
+        pieces = [SEGMENT_BREAK, self._file_header]
+        if self._metadata:
+            pieces.append(self._metadata)
+        for tag_type in (TAG_VIDEO, TAG_AUDIO):
+            tag = self._sequence_headers.get(tag_type)
+            if tag:
+                tag = bytearray(tag)
+                write_timestamp(tag, self._segment_start)
+                pieces.append(tag)
+        return pieces
+
+    def _on_header(self, header, body) -> bool:
+        if self._state == _FILE_HEADER:
+            return self._on_file_header(header)
+        return self._on_tag_header(header, body)
+
+    def feed(self, view) -> list:
+        """
+        Filters one read and returns the pieces to write, in order.
+        """
+        pieces, self._pending = self._pending, []
+        self._segment_size += len(view) + sum(len(piece) for piece in pieces)
+        if self._passthrough:
+            return pieces + [view]
+
+        run_start = 0  # start of the bytes of view kept since the last cut
+        pos = 0
+        end = len(view)
+
+        while pos < end:
+            if self._passthrough:
+                break
+
+            if self._state == _TAG_BODY:
+                take = min(self._need, end - pos)
+                if not self._keep:
+                    if pos > run_start:
+                        pieces.append(view[run_start:pos])
+                    run_start = pos + take
+                elif self._capture is not None:
+                    self._capture += view[pos:pos + take]
+                pos += take
+                self._need -= take
+                if not self._need:
+                    if self._capture is not None:
+                        self._end_capture()
+                    self._state = _TAG_HEADER
+                continue
+
+            size = self._header_size()
+            if not self._partial and end - pos >= size:
+                # Whole header in this read: patched in place
+                self._keep = self._on_header(
+                    view[pos:pos + size], view[pos + size:pos + size + 2])
+                if not self._keep or self._split:
+                    if pos > run_start:
+                        pieces.append(view[run_start:pos])
+                    run_start = pos + size if not self._keep else pos
+                if self._split:
+                    self._split = False
+                    pieces.extend(self._segment_start_pieces())
+                pos += size
+                continue
+
+            # Header split across reads: collect it before deciding
+            if pos > run_start:
+                pieces.append(view[run_start:pos])
+            take = min(size - len(self._partial), end - pos)
+            self._partial += view[pos:pos + take]
+            pos += take
+            run_start = pos
+
+            if len(self._partial) == size:
+                header = self._partial
+                self._partial = bytearray()
+                self._keep = self._on_header(
+                    memoryview(header), view[pos:pos + 2])
+                if self._split:
+                    self._split = False
+                    pieces.extend(self._segment_start_pieces())
+                if self._keep:
+                    pieces.append(header)
+
+        if end > run_start:
+            pieces.append(view[run_start:end])
+        return pieces
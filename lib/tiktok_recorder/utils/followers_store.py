@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+import time
+
+from .logger_manager import logger
+
+DEFAULT_STORE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache"
+)
+
+
+class FollowersStore:
+    """
+    Followed users of one account, persisted between runs.
+
+    The list is ordered newest first, like the /api/user/list/ pages, so
+    an incremental refresh only needs the pages until a known user shows
+    up. A full refresh is still needed from time to time to notice users
+    that were unfollowed.
+    """
+
+    def __init__(self, sec_uid, store_dir=DEFAULT_STORE_DIR):
+        self.path = os.path.join(store_dir, f"followers_{sec_uid}.json")
+        self.followers = []
+        self.last_refresh = 0.0
+        self.last_full_refresh = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                self.followers = data.get("followers", [])
+                self.last_refresh = data.get("last_refresh", 0.0)
+                self.last_full_refresh = data.get("last_full_refresh", 0.0)
+        except (OSError, ValueError) as ex:
+            logger.error(f"Failed to read followers cache {self.path}: {ex}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "followers": self.followers,
+                    "last_refresh": self.last_refresh,
+                    "last_full_refresh": self.last_full_refresh,
+                }, f)
+            os.replace(tmp_path, self.path)
+        except OSError as ex:
+            logger.error(f"Failed to write followers cache {self.path}: {ex}")
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return list(self.followers)
+
+    def replace(self, followers):
+        """
+        Stores the result of a full refresh.
+        """
+        with self._lock:
+            self.followers = list(dict.fromkeys(followers))
+            self.last_refresh = self.last_full_refresh = time.time()
+            self._save()
+
+    def merge_new(self, followers) -> list:
+        """
+        Stores the first pages of an incremental refresh and returns the
+        users that were not known yet.
+        """
+        with self._lock:
+            known = set(self.followers)
+            new = [u for u in dict.fromkeys(followers) if u not in known]
+            self.followers = new + self.followers
+            self.last_refresh = time.time()
+            self._save()
+        return new
@@ -0,0 +1,196 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urljoin
+
+from requests import RequestException
+
+from .logger_manager import logger
+
+# Segments downloaded at once, attempts per segment, and playlist reloads
+# without a new segment after which the live is considered over
+HLS_FETCH_WORKERS = 3
+HLS_SEGMENT_RETRIES = 3
+HLS_IDLE_RELOADS = 10
+
+_ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_playlist(text, url) -> dict:
+    """
+    Parses an m3u8 playlist. Returns the variants of a master playlist
+    (bandwidth, url), or the segments of a media playlist
+    (media sequence, url), with its target duration, the init segment
+    (EXT-X-MAP) and whether the live has ended.
+    """
+    playlist = {'variants': [], 'segments': [], 'target': 2.0,
+                'init': None, 'ended': False}
+    sequence = 0
+    bandwidth = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            playlist['target'] = float(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-ENDLIST'):
+            playlist['ended'] = True
+        elif line.startswith('#EXT-X-MAP:'):
+            attributes = dict(_ATTRIBUTE.findall(line.split(':', 1)[1]))
+            if 'URI' in attributes:
+                playlist['init'] = urljoin(url, attributes['URI'].strip('"'))
+        elif line.startswith('#EXT-X-STREAM-INF:'):
+            attributes = dict(_ATTRIBUTE.findall(line.split(':', 1)[1]))
+            bandwidth = int(attributes.get('BANDWIDTH', 0) or 0)
+        elif not line.startswith('#'):
+            if bandwidth is not None:
+                playlist['variants'].append((bandwidth, urljoin(url, line)))
+                bandwidth = None
+            else:
+                playlist['segments'].append((sequence, urljoin(url, line)))
+                sequence += 1
+
+    return playlist
+
+
+class HlsCapture:
+    """
+    Follows the playlist of a live HLS stream and returns its segments in
+    order.
+
+    The playlist is reloaded about once per target duration. New segments
+    are downloaded by a few threads at once, so a slow segment does not
+    hold back the next ones, and are keyed by media sequence, so a segment
+    listed by several reloads is fetched once. They are handed back
+    strictly in sequence order. A failed segment is fetched again up to
+    HLS_SEGMENT_RETRIES times before it is counted as a gap, as are
+    segments that left the playlist before they could be fetched.
+
+    get is a requests-style get(url) (the stream session of TikTokAPI)
+    for the playlist, get_segment the one for the segments (get if None).
+    """
+
+    def __init__(self, get, playlist_url, workers=HLS_FETCH_WORKERS, should_stop=None,
+                 get_segment=None):
+        self.get = get
+        self.get_segment = get_segment or get
+        self.playlist_url = playlist_url
+        self.workers = workers
+        self.should_stop = should_stop or (lambda: False)
+        self.init_url = None
+        self._init_written = False
+        self._next_sequence = None
+
+        # Reported after the recording
+        self.segments = 0
+        self.refetches = 0
+        self.gaps = 0
+
+    def _load(self, url) -> dict:
+        response = self.get(url)
+        response.raise_for_status()
+        return parse_playlist(response.text, url)
+
+    def open(self) -> dict:
+        """
+        Resolves a master playlist to its best variant and returns the
+        first media playlist.
+        """
+        playlist = self._load(self.playlist_url)
+        if playlist['variants']:
+            self.playlist_url = max(playlist['variants'])[1]
+            playlist = self._load(self.playlist_url)
+        self.init_url = playlist['init']
+        return playlist
+
+    def _fetch(self, url):
+        for attempt in range(HLS_SEGMENT_RETRIES):
+            if attempt:
+                self.refetches += 1
+                time.sleep(0.5 * attempt)
+            try:
+                response = self.get_segment(url)
+                response.raise_for_status()
+                return response.content
+            except RequestException as ex:
+                logger.warning(f"HLS segment failed ({ex}), attempt {attempt + 1}")
+        return None
+
+    def _wait(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self.should_stop():
+            time.sleep(min(0.25, seconds))
+
+    def chunks(self, playlist=None):
+        """
+        Generator of the stream bytes: the init segment, if any, then every
+        segment in media sequence order, until the playlist ends or stops
+        getting new segments. Called again (after an error), it continues
+        after the last segment returned.
+        """
+        playlist = playlist or self.open()
+        if self.init_url and not self._init_written:
+            data = self._fetch(self.init_url)
+            if data is None:
+                raise RequestException(f"HLS init segment unavailable: {self.init_url}")
+            self._init_written = True
+            yield data
+
+        pending = {}
+        next_sequence = self._next_sequence
+        idle = 0
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="HlsFetch") as executor:
+            try:
+                while not self.should_stop():
+                    segments = playlist['segments']
+                    if segments:
+                        first = segments[0][0]
+                        if next_sequence is None:
+                            next_sequence = first
+                        elif first > next_sequence and next_sequence not in pending:
+                            lost = first - next_sequence
+                            logger.warning(f"HLS playlist moved past {lost} segment(s)")
+                            self.gaps += lost
+                            next_sequence = first
+
+                    new = 0
+                    for sequence, url in segments:
+                        if sequence >= next_sequence and sequence not in pending:
+                            pending[sequence] = executor.submit(self._fetch, url)
+                            new += 1
+                    idle = 0 if new else idle + 1
+
+                    stalled = False
+                    while next_sequence in pending:
+                        future = pending[next_sequence]
+                        if not future.done():
+                            # A slow segment must not stop the playlist
+                            # reloads, or the next ones leave it meanwhile
+                            wait([future], timeout=playlist['target'] / 2)
+                            if not future.done():
+                                stalled = True
+                                break
+                        data = pending.pop(next_sequence).result()
+                        next_sequence += 1
+                        self._next_sequence = next_sequence
+                        if data is None:
+                            self.gaps += 1
+                            continue
+                        self.segments += 1
+                        yield data
+                        if self.should_stop():
+                            return
+
+                    if not pending and (playlist['ended'] or idle >= HLS_IDLE_RELOADS):
+                        return
+
+                    if not stalled:
+                        self._wait(playlist['target'] / 2 if not new else playlist['target'])
+                    playlist = self._load(self.playlist_url)
+            finally:
+                for future in pending.values():
+                    future.cancel()
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import custom_exceptions
+from .logger_manager import logger
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "cache", "lookups.sqlite3"
+)
+DEFAULT_TTL = 60
+DEFAULT_NEGATIVE_TTL = 30
+MAX_MEMORY_ENTRIES = 4096
+
+
+class _Flight:
+    """
+    A lookup in progress that other threads can wait for.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LookupCache:
+    """
+    TTL cache for TikTok lookups shared by all recorder processes.
+
+    Entries are kept in memory and in a small SQLite file, so other
+    processes (and restarts) reuse a lookup instead of repeating it.
+    Lookups that fail with a cacheable error are stored too (negative
+    caching) with their own TTL and raise the same error again on a hit.
+    Concurrent identical lookups inside a process share one request,
+    both between threads and between asyncio tasks.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._memory = {}  # (namespace, key) -> (expires, value, error)
+        self._inflight = {}  # (namespace, key) -> _Flight
+        self._async_inflight = {}  # (namespace, key) -> asyncio.Future
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_or_load(self, namespace, key, loader, negative=(), ttl=None,
+                    negative_ttl=None, refresh=False):
+        """
+        Returns the cached value for (namespace, key) or calls loader().
+
+        Exceptions of the types listed in negative are cached for
+        negative_ttl seconds; any other exception is not cached. ttl may
+        also be a function of the loaded value, e.g. to keep "not live"
+        answers for a shorter time. With refresh, the cached value is
+        ignored and replaced by a new one.
+        """
+        if not self.enabled:
+            return loader()
+
+        cache_key = (namespace, str(key))
+
+        with self._lock:
+            entry = self._memory.get(cache_key)
+            if entry and entry[0] > time.time() and not refresh:
+                return self._unpack(entry)
+
+            flight = self._inflight.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[cache_key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            entry = None if refresh else self._read_disk(cache_key)
+            if entry is None:
+                try:
+                    entry = self._entry(loader(), ttl)
+                except negative as ex:
+                    entry = self._negative_entry(ex, negative_ttl)
+                self._write_disk(cache_key, entry)
+
+            self._remember(cache_key, entry)
+            flight.value = self._unpack(entry)
+            return flight.value
+
+        except Exception as ex:
+            flight.error = ex
+            raise
+
+        finally:
+            with self._lock:
+                del self._inflight[cache_key]
+            flight.done.set()
+
+    async def get_or_load_async(self, namespace, key, loader, negative=(),
+                                ttl=None, negative_ttl=None):
+        """
+        asyncio version of get_or_load, where loader is a coroutine
+        function. Concurrent identical lookups on the event loop share one
+        request. The SQLite file is read and written from a worker thread,
+        so a locked file does not block the event loop.
+        """
+        if not self.enabled:
+            return await loader()
+
+        cache_key = (namespace, str(key))
+
+        entry = self._memory.get(cache_key)
+        if entry and entry[0] > time.time():
+            return self._unpack(entry)
+
+        flight = self._async_inflight.get(cache_key)
+        if flight is not None:
+            return self._unpack(await asyncio.shield(flight))
+
+        flight = asyncio.get_running_loop().create_future()
+        self._async_inflight[cache_key] = flight
+        try:
+            entry = await asyncio.to_thread(self._read_disk, cache_key)
+            if entry is None:
+                try:
+                    entry = self._entry(await loader(), ttl)
+                except negative as ex:
+                    entry = self._negative_entry(ex, negative_ttl)
+                await asyncio.to_thread(self._write_disk, cache_key, entry)
+
+            self._remember(cache_key, entry)
+            flight.set_result(entry)
+            return self._unpack(entry)
+
+        except BaseException as ex:
+            flight.set_exception(ex)
+            flight.exception()  # waiters re-raise it, nobody else has to
+            raise
+
+        finally:
+            del self._async_inflight[cache_key]
+
+    def _entry(self, value, ttl):
+        lifetime = ttl(value) if callable(ttl) else ttl
+        return time.time() + (lifetime or self.ttl), value, None
+
+    def _negative_entry(self, ex, negative_ttl):
+        return (
+            time.time() + (negative_ttl or self.negative_ttl),
+            None, (type(ex).__name__, str(ex))
+        )
+
+    def _remember(self, cache_key, entry):
+        with self._lock:
+            if len(self._memory) >= MAX_MEMORY_ENTRIES:
+                now = time.time()
+                self._memory = {
+                    k: v for k, v in self._memory.items() if v[0] > now
+                }
+            self._memory[cache_key] = entry
+
+    @staticmethod
+    def _unpack(entry):
+        _, value, error = entry
+        if error is not None:
+            name, message = error
+            error_type = getattr(
+                custom_exceptions, name, custom_exceptions.TikTokRecorderError
+            )
+            raise error_type(message)
+        return value
+
+    def _connect(self):
+        # A connection must not cross a fork, so reopen it in child processes
+        if self._db is not None and self._db_pid == os.getpid():
+            return self._db
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS lookups ("
+                "namespace TEXT, key TEXT, expires REAL, value TEXT, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            db.commit()
+        except (sqlite3.Error, OSError) as ex:
+            logger.error(f"Lookup cache unavailable, using memory only: {ex}")
+            self.path = None
+            return None
+
+        self._db, self._db_pid = db, os.getpid()
+        return db
+
+    def _read_disk(self, cache_key):
+        if self.path is None:
+            return None
+
+        db = self._connect()
+        if db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = db.execute(
+                    "SELECT expires, value FROM lookups "
+                    "WHERE namespace = ? AND key = ? AND expires > ?",
+                    (*cache_key, time.time())
+                ).fetchone()
+        except sqlite3.Error as ex:
+            logger.error(f"Lookup cache read failed: {ex}")
+            return None
+
+        if row is None:
+            return None
+
+        data = json.loads(row[1])
+        error = tuple(data['error']) if data.get('error') else None
+        return row[0], data.get('value'), error
+
+    def _write_disk(self, cache_key, entry):
+        if self.path is None:
+            return
+
+        db = self._connect()
+        if db is None:
+            return
+
+        expires, value, error = entry
+        try:
+            payload = json.dumps({'value': value, 'error': error})
+            with self._db_lock, db:
+                db.execute(
+                    "INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?)",
+                    (*cache_key, expires, payload)
+                )
+        except (sqlite3.Error, TypeError, ValueError) as ex:
+            logger.error(f"Lookup cache write failed: {ex}")
@@ -0,0 +1,192 @@
+import bisect
+import os
+import threading
+import time
+
+from .logger_manager import logger
+from .rate_limiter import get_rate_limiter
+
+# Seconds between the snapshots a recording reports, and the gap between
+# two reads of the stream beyond which it counts as stalled
+REPORT_INTERVAL = 10
+STALL_THRESHOLD = 1.0
+
+# Buckets (seconds) of the time to first byte, write latency, and
+# conversion and upload duration histograms
+FIRST_BYTE_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10)
+WRITE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+FINISH_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900)
+
+
+class Histogram:
+    """
+    Counts observations into buckets by upper bound, plus one bucket for
+    everything above the last bound, like a Prometheus histogram.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q) -> float:
+        """
+        Upper bound of the bucket holding the q quantile (the maximum for
+        the last bucket).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'bounds': list(self.bounds),
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+        }
+
+
+class RecordingMetrics:
+    """
+    Counters and gauges of one recording: bytes received, current bitrate,
+    reconnects, seconds stalled without data, time to first byte, and the
+    duration of the conversions and uploads of its files.
+
+    Between start() and close(), a thread sends a snapshot to
+    report(snapshot) every interval seconds, whether data flows or not,
+    and close() sends the final one. The worker processes forward them to
+    the bot, which serves them on /metrics. A snapshot also carries the
+    stats of the recording's StreamWriter and of the rate limiter of its
+    process.
+    """
+
+    def __init__(self, user, report=None, interval=REPORT_INTERVAL):
+        self.user = user
+        self.report = report
+        self.interval = interval
+        self.writer = None
+
+        self.bytes_received = 0
+        self.connections = 0
+        self.stall_seconds = 0.0
+        self.first_byte = Histogram(FIRST_BYTE_BUCKETS)
+        self.conversion_seconds = Histogram(FINISH_BUCKETS)
+        self.upload_seconds = Histogram(FINISH_BUCKETS)
+
+        self._lock = threading.Lock()
+        self._last_data = None
+        self._rate_at = time.monotonic()
+        self._rate_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def reconnects(self) -> int:
+        return max(0, self.connections - 1)
+
+    def _stalled_for(self, now) -> float:
+        if self._last_data is None or now - self._last_data <= STALL_THRESHOLD:
+            return 0.0
+        return now - self._last_data
+
+    def received(self, nbytes):
+        """
+        Called for every read of the stream. The time since the previous
+        read counts as stalled when it is over STALL_THRESHOLD, including
+        the gap across a reconnect.
+        """
+        now = time.monotonic()
+        self.stall_seconds += self._stalled_for(now)
+        self._last_data = now
+        self.bytes_received += nbytes
+
+    def connected(self, first_byte_seconds):
+        """
+        Called on the first data of each connection.
+        """
+        self.connections += 1
+        self.first_byte.observe(first_byte_seconds)
+
+    def converted(self, seconds):
+        with self._lock:
+            self.conversion_seconds.observe(seconds)
+
+    def uploaded(self, seconds):
+        with self._lock:
+            self.upload_seconds.observe(seconds)
+
+    def snapshot(self, final=False) -> dict:
+        """
+        Current values; the bitrate is the average since the previous
+        snapshot.
+        """
+        now = time.monotonic()
+        with self._lock:
+            received = self.bytes_received
+            elapsed = now - self._rate_at
+            bitrate = (received - self._rate_bytes) * 8 / elapsed if elapsed > 0 else 0.0
+            self._rate_at = now
+            self._rate_bytes = received
+
+            return {
+                'user': self.user,
+                'pid': os.getpid(),
+                'final': final,
+                'reported_at': time.time(),
+                'bytes_received': received,
+                'bitrate': 0.0 if final else bitrate,
+                'reconnects': self.reconnects,
+                'stall_seconds': self.stall_seconds + self._stalled_for(now),
+                'first_byte': self.first_byte.to_dict(),
+                'conversion_seconds': self.conversion_seconds.to_dict(),
+                'upload_seconds': self.upload_seconds.to_dict(),
+                'writer': self.writer.stats() if self.writer else None,
+                'rate_limiter': get_rate_limiter().stats(),
+            }
+
+    def publish(self, final=False):
+        """
+        Sends a snapshot to report, if any.
+        """
+        if self.report is None:
+            return
+        try:
+            self.report(self.snapshot(final))
+        except Exception as ex:
+            logger.debug(f"Metrics report failed: {ex}")
+
+    def start(self):
+        if self.report is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name=f"Metrics-{self.user}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.publish()
+
+    def close(self):
+        """
+        Stops the periodic reports and sends the final snapshot.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.publish(final=True)
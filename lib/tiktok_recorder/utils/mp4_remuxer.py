@@ -0,0 +1,499 @@
+import mmap
+import os
+import struct
+
+from .custom_exceptions import RemuxError
+from .flv import (
+    CODEC_AVC, FILE_HEADER_SIZE, SOUND_AAC, TAG_AUDIO, TAG_HEADER_SIZE,
+    TAG_SCRIPT, TAG_VIDEO, read_timestamp,
+)
+
+# Both tracks use the millisecond clock of the FLV timestamps
+TIMESCALE = 1000
+
+# Tags looked at for the codec configuration before giving up
+PROBE_TAGS = 500
+
+# Longest fragment when there are no keyframes to cut at (audio-only)
+MAX_FRAGMENT_MS = 2000
+
+# Sample durations used for the last sample, when nothing follows it
+DEFAULT_VIDEO_DURATION = 33
+DEFAULT_AUDIO_DURATION = 23
+
+_AAC_SAMPLE_RATES = (
+    96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050,
+    16000, 12000, 11025, 8000, 7350,
+)
+
+_MATRIX = struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+# trun flags: data offset, then per sample duration, size, flags, cts
+_TRUN_FLAGS = 0x000001 | 0x000100 | 0x000200 | 0x000400
+_TRUN_CTS = 0x000800
+# tfhd: offsets are relative to the moof
+_TFHD_DEFAULT_BASE_IS_MOOF = 0x020000
+
+_SYNC_SAMPLE = 0x02000000
+_NON_SYNC_SAMPLE = 0x01010000
+
+
+def _box(kind, *payload) -> bytes:
+    data = b''.join(payload)
+    return struct.pack('>I4s', 8 + len(data), kind) + data
+
+
+def _full_box(kind, version, flags, *payload) -> bytes:
+    return _box(kind, struct.pack('>I', (version << 24) | flags), *payload)
+
+
+def _descriptor(tag, payload) -> bytes:
+    """
+    MPEG-4 descriptor with its size in the 4-byte expandable form.
+    """
+    size = len(payload)
+    return bytes((tag,
+                  0x80 | (size >> 21) & 0x7F, 0x80 | (size >> 14) & 0x7F,
+                  0x80 | (size >> 7) & 0x7F, size & 0x7F)) + payload
+
+
+class _BitReader:
+
+    def __init__(self, data):
+        # Drop the emulation prevention bytes (00 00 03)
+        self.data = bytes(data).replace(b'\x00\x00\x03', b'\x00\x00')
+        self.pos = 0
+
+    def bit(self) -> int:
+        byte = self.data[self.pos >> 3]
+        value = (byte >> (7 - (self.pos & 7))) & 1
+        self.pos += 1
+        return value
+
+    def bits(self, count) -> int:
+        value = 0
+        for _ in range(count):
+            value = (value << 1) | self.bit()
+        return value
+
+    def ue(self) -> int:
+        zeros = 0
+        while not self.bit():
+            zeros += 1
+        return (1 << zeros) - 1 + self.bits(zeros)
+
+    def se(self) -> int:
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def parse_sps_dimensions(sps) -> tuple:
+    """
+    Width and height in pixels of an H.264 sequence parameter set (NAL
+    unit including its header byte), after cropping.
+    """
+    reader = _BitReader(sps[1:])
+    profile = reader.bits(8)
+    reader.bits(16)  # constraint flags, level
+    reader.ue()  # seq_parameter_set_id
+
+    chroma_format = 1
+    if profile in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+        chroma_format = reader.ue()
+        if chroma_format == 3:
+            reader.bit()  # separate_colour_plane_flag
+        reader.ue()  # bit_depth_luma
+        reader.ue()  # bit_depth_chroma
+        reader.bit()  # qpprime_y_zero_transform_bypass_flag
+        if reader.bit():  # seq_scaling_matrix_present_flag
+            for index in range(8 if chroma_format != 3 else 12):
+                if reader.bit():
+                    last = next_scale = 8
+                    for _ in range(16 if index < 6 else 64):
+                        if next_scale:
+                            next_scale = (last + reader.se()) % 256
+                        last = next_scale or last
+
+    reader.ue()  # log2_max_frame_num
+    poc_type = reader.ue()
+    if poc_type == 0:
+        reader.ue()
+    elif poc_type == 1:
+        reader.bit()
+        reader.se()
+        reader.se()
+        for _ in range(reader.ue()):
+            reader.se()
+    reader.ue()  # max_num_ref_frames
+    reader.bit()  # gaps_in_frame_num_allowed_flag
+
+    width_mbs = reader.ue() + 1
+    height_units = reader.ue() + 1
+    frame_mbs_only = reader.bit()
+    if not frame_mbs_only:
+        reader.bit()  # mb_adaptive_frame_field_flag
+    reader.bit()  # direct_8x8_inference_flag
+
+    crop = (0, 0, 0, 0)
+    if reader.bit():
+        crop = (reader.ue(), reader.ue(), reader.ue(), reader.ue())
+
+    crop_x = 1 if chroma_format in (0, 3) else 2
+    crop_y = (2 - frame_mbs_only) * (2 if chroma_format == 1 else 1)
+    width = width_mbs * 16 - (crop[0] + crop[1]) * crop_x
+    height = (2 - frame_mbs_only) * height_units * 16 - (crop[2] + crop[3]) * crop_y
+    return width, height
+
+
+class _Track:
+
+    def __init__(self, track_id, kind, config):
+        self.track_id = track_id
+        self.kind = kind
+        self.config = config
+        self.pending = []  # (offset, size, dts, cts, key)
+        self.last_duration = (DEFAULT_VIDEO_DURATION if kind == TAG_VIDEO
+                              else DEFAULT_AUDIO_DURATION)
+
+
+class FlvToMp4Remuxer:
+    """
+    Copies the H.264/AAC streams of an FLV file into a fragmented MP4,
+    without re-encoding and without ffmpeg.
+
+    The FLV is mapped with mmap and read once, front to back. The moov only
+    describes the codecs, and the samples follow in moof/mdat fragments,
+    one per video GOP. So the remuxer keeps nothing but the sample table of
+    the current fragment in memory, whatever the size of the recording,
+    and the sample data goes from the mapping to the output file as is.
+
+    Raises RemuxError for streams it cannot copy (other codecs, codec
+    changes mid-stream, files that are not FLV or are corrupt before
+    their end), so the caller can fall back to ffmpeg.
+    """
+
+    def __init__(self, source, destination):
+        self.source = source
+        self.destination = destination
+        self._base_dts = None
+        self.fragments = 0
+        self.samples = 0
+
+    @staticmethod
+    def _tags(data):
+        """
+        Yields (type, timestamp, body offset, body size) for every complete
+        tag. A truncated last tag (recording cut off) is ignored; an
+        unknown tag type or a PreviousTagSize that does not match its tag
+        before the end of the file raises RemuxError.
+        """
+        if len(data) < FILE_HEADER_SIZE or data[:3] != b'FLV':
+            raise RemuxError("Not an FLV file")
+
+        pos = struct.unpack_from('>I', data, 5)[0] + 4
+        end = len(data)
+        while pos + TAG_HEADER_SIZE <= end:
+            header = bytes(data[pos:pos + TAG_HEADER_SIZE])
+            tag_type = header[0] & 0x1F
+            if tag_type not in (TAG_AUDIO, TAG_VIDEO, TAG_SCRIPT):
+                raise RemuxError(f"Corrupt FLV: tag type {tag_type} at byte {pos}")
+            size = (header[1] << 16) | (header[2] << 8) | header[3]
+            body = pos + TAG_HEADER_SIZE
+            if body + size > end:
+                return
+            if body + size + 4 <= end:
+                previous_tag_size = struct.unpack_from('>I', data, body + size)[0]
+                if previous_tag_size != TAG_HEADER_SIZE + size:
+                    raise RemuxError(
+                        f"Corrupt FLV: PreviousTagSize {previous_tag_size} "
+                        f"after a {TAG_HEADER_SIZE + size} byte tag at byte {pos}")
+            yield tag_type, read_timestamp(header), body, size
+            pos = body + size + 4
+
+    def _probe(self, data) -> dict:
+        """
+        Finds the codec configuration of each track in the first tags.
+        """
+        configs = {}
+        seen = set()
+        for count, (tag_type, _, offset, size) in enumerate(self._tags(data)):
+            if count >= PROBE_TAGS:
+                break
+            if tag_type not in (TAG_VIDEO, TAG_AUDIO) or size < 2:
+                continue
+            seen.add(tag_type)
+
+            if tag_type == TAG_VIDEO:
+                if data[offset] & 0x0F != CODEC_AVC:
+                    raise RemuxError(f"Unsupported video codec {data[offset] & 0x0F}")
+                if data[offset + 1] == 0 and TAG_VIDEO not in configs:
+                    configs[TAG_VIDEO] = bytes(data[offset + 5:offset + size])
+            else:
+                if data[offset] >> 4 != SOUND_AAC:
+                    raise RemuxError(f"Unsupported audio codec {data[offset] >> 4}")
+                if data[offset + 1] == 0 and TAG_AUDIO not in configs:
+                    configs[TAG_AUDIO] = bytes(data[offset + 2:offset + size])
+
+            if seen and seen <= configs.keys() and len(seen) == 2:
+                break
+
+        if not configs:
+            raise RemuxError("No H.264 or AAC sequence header found")
+        return configs
+
+    # Boxes of the moov
+
+    def _video_entry(self, config) -> bytes:
+        width = height = 0
+        try:
+            sps_size = struct.unpack_from('>H', config, 6)[0]
+            width, height = parse_sps_dimensions(config[8:8 + sps_size])
+        except (IndexError, struct.error) as ex:
+            raise RemuxError(f"Unreadable H.264 configuration: {ex}")
+        self._dimensions = (width, height)
+
+        return _box(
+            b'avc1',
+            bytes(6), struct.pack('>H', 1),  # data_reference_index
+            bytes(16),
+            struct.pack('>HHIIIH', width, height, 0x480000, 0x480000, 0, 1),
+            bytes(32),  # compressorname
+            struct.pack('>Hh', 0x18, -1),
+            _box(b'avcC', config),
+        )
+
+    @staticmethod
+    def _audio_params(config) -> tuple:
+        if len(config) < 2:
+            raise RemuxError("Unreadable AAC configuration")
+        index = ((config[0] & 0x07) << 1) | (config[1] >> 7)
+        channels = (config[1] >> 3) & 0x0F
+        rate = _AAC_SAMPLE_RATES[index] if index < len(_AAC_SAMPLE_RATES) else 44100
+        return rate, channels or 2
+
+    def _audio_entry(self, config) -> bytes:
+        rate, channels = self._audio_params(config)
+        decoder_config = _descriptor(
+            0x04,
+            struct.pack('>BB3sII', 0x40, 0x15, bytes(3), 0, 0)
+            + _descriptor(0x05, config),
+        )
+        es = _descriptor(
+            0x03,
+            struct.pack('>HB', 0, 0) + decoder_config + _descriptor(0x06, b'\x02'),
+        )
+        return _box(
+            b'mp4a',
+            bytes(6), struct.pack('>H', 1),
+            bytes(8),
+            struct.pack('>HHHHI', channels, 16, 0, 0, min(rate, 0xFFFF) << 16),
+            _full_box(b'esds', 0, 0, es),
+        )
+
+    def _trak(self, track) -> bytes:
+        video = track.kind == TAG_VIDEO
+        entry = self._video_entry(track.config) if video else self._audio_entry(track.config)
+        width, height = self._dimensions if video else (0, 0)
+
+        tkhd = _full_box(
+            b'tkhd', 0, 3,
+            struct.pack('>IIIII', 0, 0, track.track_id, 0, 0),
+            bytes(8),
+            struct.pack('>hhhH', 0, 0, 0 if video else 0x0100, 0),
+            _MATRIX,
+            struct.pack('>II', width << 16, height << 16),
+        )
+        mdhd = _full_box(b'mdhd', 0, 0, struct.pack('>IIIIHH', 0, 0, TIMESCALE, 0, 0x55C4, 0))
+        hdlr = _full_box(
+            b'hdlr', 0, 0,
+            struct.pack('>I4s12s', 0, b'vide' if video else b'soun', bytes(12)),
+            b'VideoHandler\x00' if video else b'SoundHandler\x00',
+        )
+        media_header = (_full_box(b'vmhd', 0, 1, bytes(8)) if video
+                        else _full_box(b'smhd', 0, 0, bytes(4)))
+        dinf = _box(b'dinf', _full_box(b'dref', 0, 0, struct.pack('>I', 1),
+                                       _full_box(b'url ', 0, 1)))
+        stbl = _box(
+            b'stbl',
+            _full_box(b'stsd', 0, 0, struct.pack('>I', 1), entry),
+            _full_box(b'stts', 0, 0, struct.pack('>I', 0)),
+            _full_box(b'stsc', 0, 0, struct.pack('>I', 0)),
+            _full_box(b'stsz', 0, 0, struct.pack('>II', 0, 0)),
+            _full_box(b'stco', 0, 0, struct.pack('>I', 0)),
+        )
+        return _box(b'trak', tkhd, _box(b'mdia', mdhd, hdlr,
+                                         _box(b'minf', media_header, dinf, stbl)))
+
+    def _init_segment(self, tracks) -> bytes:
+        ftyp = _box(b'ftyp', b'isom', struct.pack('>I', 0x200),
+                    b'isom', b'iso6', b'iso2', b'avc1', b'mp41')
+        mvhd = _full_box(
+            b'mvhd', 0, 0,
+            struct.pack('>IIIIIH', 0, 0, TIMESCALE, 0, 0x10000, 0x0100),
+            bytes(10), _MATRIX, bytes(24),
+            struct.pack('>I', len(tracks) + 1),
+        )
+        traks = [self._trak(track) for track in tracks]
+        mvex = _box(b'mvex', *[
+            _full_box(b'trex', 0, 0, struct.pack('>5I', track.track_id, 1, 0, 0, 0))
+            for track in tracks
+        ])
+        return ftyp + _box(b'moov', mvhd, *traks, mvex)
+
+    # Fragments
+
+    @staticmethod
+    def _durations(samples, next_dts, last_duration) -> list:
+        durations = [b[2] - a[2] for a, b in zip(samples, samples[1:])]
+        durations.append(next_dts - samples[-1][2] if next_dts is not None else last_duration)
+        return [max(0, duration) for duration in durations]
+
+    def _flush(self, out_file, data, tracks, next_video_dts=None, final=False):
+        """
+        Writes the pending samples as one moof + mdat. Outside the last
+        fragment, the last audio sample waits for the next one, which gives
+        its duration.
+        """
+        runs = []
+        for track in tracks:
+            if track.kind == TAG_AUDIO and not final:
+                samples, track.pending = track.pending[:-1], track.pending[-1:]
+                next_dts = track.pending[0][2] if track.pending else None
+            else:
+                samples, track.pending = track.pending, []
+                next_dts = next_video_dts
+            if not samples:
+                continue
+            durations = self._durations(samples, next_dts, track.last_duration)
+            track.last_duration = durations[-1] or track.last_duration
+            runs.append((track, samples, durations))
+        if not runs:
+            return
+
+        def build(offsets):
+            trafs = []
+            for (track, samples, durations), data_offset in zip(runs, offsets):
+                video = track.kind == TAG_VIDEO
+                flags = _TRUN_FLAGS | (_TRUN_CTS if video else 0)
+                entries = bytearray()
+                for (_, size, _, cts, key), duration in zip(samples, durations):
+                    sample_flags = _SYNC_SAMPLE if key else _NON_SYNC_SAMPLE
+                    if video:
+                        entries += struct.pack('>IIIi', duration, size, sample_flags, cts)
+                    else:
+                        entries += struct.pack('>III', duration, size, sample_flags)
+                trafs.append(_box(
+                    b'traf',
+                    _full_box(b'tfhd', 0, _TFHD_DEFAULT_BASE_IS_MOOF,
+                              struct.pack('>I', track.track_id)),
+                    _full_box(b'tfdt', 1, 0, struct.pack('>Q', samples[0][2])),
+                    _full_box(b'trun', 1, flags,
+                              struct.pack('>Ii', len(samples), data_offset), entries),
+                ))
+            return _box(b'moof', _full_box(b'mfhd', 0, 0, struct.pack('>I', self.fragments + 1)),
+                        *trafs)
+
+        # The moof size does not depend on the offsets, so build it twice
+        sizes = [sum(sample[1] for sample in samples) for _, samples, _ in runs]
+        moof_size = len(build([0] * len(runs)))
+        offsets, position = [], moof_size + 8
+        for size in sizes:
+            offsets.append(position)
+            position += size
+
+        out_file.write(build(offsets))
+        out_file.write(struct.pack('>I4s', 8 + sum(sizes), b'mdat'))
+        for _, samples, _ in runs:
+            for offset, size, _, _, _ in samples:
+                out_file.write(data[offset:offset + size])
+            self.samples += len(samples)
+        self.fragments += 1
+
+    def _dts(self, timestamp) -> int:
+        if self._base_dts is None:
+            self._base_dts = timestamp
+        return max(0, timestamp - self._base_dts)
+
+    def remux(self):
+        """
+        Writes the MP4. On RemuxError no destination file is left behind.
+        """
+        try:
+            self._remux()
+        except (IndexError, struct.error) as ex:
+            self._remove_destination()
+            raise RemuxError(f"Corrupt FLV: {ex}")
+        except RemuxError:
+            self._remove_destination()
+            raise
+
+    def _remove_destination(self):
+        if os.path.exists(self.destination):
+            os.remove(self.destination)
+
+    def _remux(self):
+        with open(self.source, 'rb') as in_file:
+            try:
+                mapping = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise RemuxError("Empty file")
+
+        with mapping, memoryview(mapping) as data:
+            configs = self._probe(data)
+            tracks, by_type = [], {}
+            for kind in (TAG_VIDEO, TAG_AUDIO):
+                if kind in configs:
+                    track = _Track(len(tracks) + 1, kind, configs[kind])
+                    tracks.append(track)
+                    by_type[kind] = track
+            video = by_type.get(TAG_VIDEO)
+            audio = by_type.get(TAG_AUDIO)
+
+            with open(self.destination, 'wb') as out_file:
+                out_file.write(self._init_segment(tracks))
+                fragment_start = None
+
+                for tag_type, timestamp, offset, size in self._tags(data):
+                    track = by_type.get(tag_type)
+                    if track is None or size < 2:
+                        continue
+
+                    flags, packet_type = data[offset], data[offset + 1]
+                    if tag_type == TAG_VIDEO:
+                        if flags & 0x0F != CODEC_AVC:
+                            raise RemuxError("Video codec changed mid-stream")
+                        if packet_type == 0:
+                            if bytes(data[offset + 5:offset + size]) != track.config:
+                                raise RemuxError("H.264 configuration changed mid-stream")
+                            continue
+                        if packet_type != 1 or size <= 5:
+                            continue
+                        cts = int.from_bytes(data[offset + 2:offset + 5], 'big')
+                        if cts & 0x800000:
+                            cts -= 1 << 24
+                        key = flags >> 4 == 1
+                        dts = self._dts(timestamp)
+                        if key and video.pending:
+                            self._flush(out_file, data, tracks, next_video_dts=dts)
+                            fragment_start = dts
+                        video.pending.append((offset + 5, size - 5, dts, cts, key))
+                    else:
+                        if flags >> 4 != SOUND_AAC:
+                            raise RemuxError("Audio codec changed mid-stream")
+                        if packet_type == 0:
+                            if bytes(data[offset + 2:offset + size]) != track.config:
+                                raise RemuxError("AAC configuration changed mid-stream")
+                            continue
+                        dts = self._dts(timestamp)
+                        audio.pending.append((offset + 2, size - 2, dts, 0, True))
+
+                    if fragment_start is None:
+                        fragment_start = dts
+                    elif video is None and dts - fragment_start >= MAX_FRAGMENT_MS:
+                        self._flush(out_file, data, tracks)
+                        fragment_start = dts
+
+                self._flush(out_file, data, tracks, final=True)
+
+        if not self.samples:
+            raise RemuxError("No audio or video samples")
@@ -0,0 +1,98 @@
+import os
+import time
+
+from .logger_manager import logger
+
+# Write backends for recording files
+BACKEND_DEFAULT = 'default'
+BACKEND_UNCACHED = 'uncached'
+
+# Seconds between flushes of an uncached file, and how far ahead of the
+# written data its extents are allocated
+DEFAULT_SYNC_SECONDS = 5
+PREALLOCATE_STEP = 16 * 1024 * 1024
+
+
+class UncachedFile:
+    """
+    Unbuffered output file that keeps a recording out of the page cache.
+
+    A recording is written once and read again only by the conversion,
+    after the live ends, so caching it just evicts the memory of everything
+    else. Every sync_seconds the written data is flushed with fdatasync
+    and its pages are dropped with POSIX_FADV_DONTNEED; only the data
+    since the last sync stays cached, whatever the number of recordings.
+
+    Extents are reserved PREALLOCATE_STEP bytes ahead with
+    posix_fallocate, so parallel recordings don't interleave their blocks
+    on disk. The file is truncated to the written size when closed.
+    """
+
+    def __init__(self, path, sync_seconds=DEFAULT_SYNC_SECONDS):
+        self.path = path
+        self.sync_seconds = sync_seconds
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.closed = False
+
+        self.size = 0
+        self._allocated = 0
+        self._synced = 0
+        self._last_sync = time.monotonic()
+        self._preallocate = True
+
+    def _reserve(self, end):
+        if not self._preallocate or end <= self._allocated:
+            return
+        length = max(end - self._allocated, PREALLOCATE_STEP)
+        try:
+            os.posix_fallocate(self.fd, self._allocated, length)
+            self._allocated += length
+        except OSError as ex:
+            # Not supported by every filesystem: write without it
+            logger.warning(f"Preallocation unavailable for {self.path}: {ex}")
+            self._preallocate = False
+
+    def write(self, data) -> int:
+        self._reserve(self.size + len(data))
+        written = os.write(self.fd, data)
+        self.size += written
+        if time.monotonic() - self._last_sync >= self.sync_seconds:
+            self.sync()
+        return written
+
+    def sync(self):
+        """
+        Flushes the data written since the last sync and drops it from
+        the page cache.
+        """
+        os.fdatasync(self.fd)
+        os.posix_fadvise(self.fd, self._synced, self.size - self._synced,
+                         os.POSIX_FADV_DONTNEED)
+        self._synced = self.size
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._allocated > self.size:
+                os.ftruncate(self.fd, self.size)
+            self.sync()
+        finally:
+            os.close(self.fd)
+
+
+def open_output_file(path, backend=BACKEND_DEFAULT, sync_seconds=DEFAULT_SYNC_SECONDS):
+    """
+    Opens a recording file for unbuffered writing with the given backend.
+    The uncached backend needs posix_fadvise and falls back to a plain
+    file where it is missing (Windows, macOS).
+    """
+    if backend == BACKEND_UNCACHED:
+        if hasattr(os, 'posix_fadvise'):
+            return UncachedFile(path, sync_seconds)
+        logger.warning("Uncached writes are not supported on this platform, using default")
+    elif backend != BACKEND_DEFAULT:
+        logger.warning(f"Unknown write backend '{backend}', using default")
+    return open(path, "wb", buffering=0)
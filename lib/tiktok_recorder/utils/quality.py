@@ -0,0 +1,176 @@
+import time
+
+from .logger_manager import logger
+
+# TikTok quality names (sdk_key), lowest first
+QUALITY_ORDER = ('ld', 'sd', 'hd', 'uhd', 'origin')
+
+# Seconds of stream per throughput measurement, and the share of real time
+# under which the stream is considered not sustained
+QUALITY_WINDOW = 20
+DOWNGRADE_RATIO = 0.9
+
+# Connection errors within one window that also trigger a downgrade
+DOWNGRADE_ERRORS = 2
+
+# Seconds of steady stream before trying the next quality up; doubled each
+# time the higher quality has to be left again, up to the maximum
+UPGRADE_AFTER = 300
+UPGRADE_AFTER_MAX = 3600
+
+
+def cap_variants(variants, max_quality=None) -> list:
+    """
+    Keeps the variants (best first) at or below max_quality: a sdk_key
+    (origin, uhd, hd, sd, ld) or a numeric level. When all of them are
+    above the cap, the lowest one is kept.
+    """
+    if not variants or not max_quality:
+        return variants
+
+    cap = str(max_quality).lower()
+    if cap.isdigit():
+        kept = [v for v in variants if v['level'] <= int(cap)]
+    elif any(v['sdk_key'] == cap for v in variants):
+        level = next(v['level'] for v in variants if v['sdk_key'] == cap)
+        kept = [v for v in variants if v['level'] <= level]
+    elif cap in QUALITY_ORDER:
+        rank = QUALITY_ORDER.index(cap)
+        kept = [v for v in variants if v['sdk_key'] in QUALITY_ORDER
+                and QUALITY_ORDER.index(v['sdk_key']) <= rank]
+    else:
+        logger.warning(f"Unknown quality '{max_quality}', not capping")
+        return variants
+
+    return kept or variants[-1:]
+
+
+class QualityController:
+    """
+    Picks the variant a recording reads and moves it down when the
+    connection cannot keep up, and back up once it has been steady.
+
+    The recorder reports every read with update(bytes, media_ms), where
+    media_ms is the timestamp reached in the stream. A live stream is
+    sustained when its media time advances as fast as the clock; over each
+    QUALITY_WINDOW the received bytes per second and the media time per
+    second are measured, and a window under DOWNGRADE_RATIO (or
+    DOWNGRADE_ERRORS connection errors) moves one variant down.
+
+    Spare bandwidth cannot be seen while a live is read at its own rate,
+    so after UPGRADE_AFTER steady seconds the next variant up is tried. If
+    it has to be left again, the wait doubles.
+    """
+
+    def __init__(self, variants, max_quality=None, adaptive=True):
+        self.variants = cap_variants(variants, max_quality)
+        self.adaptive = adaptive and len(self.variants) > 1
+        self.index = 0
+
+        self.upgrade_after = UPGRADE_AFTER
+        self._switched_at = time.monotonic()
+        self._upgraded = False
+        self._start_window(None)
+        self._errors = 0
+
+        # Last measurement, reported in the logs
+        self.bytes_per_second = 0.0
+        self.ratio = 1.0
+        self.switches = 0
+
+    @property
+    def current(self) -> dict:
+        return self.variants[self.index]
+
+    @property
+    def url(self) -> str:
+        return self.current['flv']
+
+    def refresh(self, variants):
+        """
+        Replaces the variants with a fresh list (new URLs), staying on the
+        same quality if it is still offered. An empty list is ignored.
+        """
+        if not variants:
+            return
+        variants = [v for v in variants if v['level'] <= self.variants[0]['level']] \
+            or variants[-1:]
+        key = self.current['sdk_key']
+        self.variants = variants
+        self.index = next(
+            (i for i, v in enumerate(variants) if v['sdk_key'] == key),
+            min(self.index, len(variants) - 1))
+
+    def _start_window(self, media_ms):
+        self._window_start = time.monotonic()
+        self._window_media = media_ms
+        self._window_bytes = 0
+
+    def connected(self):
+        """
+        Called for every new connection; the first window starts with the
+        first data.
+        """
+        self._window_media = None
+
+    def error(self) -> bool:
+        """
+        Counts a connection error. Returns True when the quality changed.
+        """
+        self._errors += 1
+        if self.adaptive and self._errors >= DOWNGRADE_ERRORS:
+            return self._switch(+1, f"{self._errors} connection errors")
+        return False
+
+    def update(self, nbytes, media_ms) -> bool:
+        """
+        Accounts one read. Returns True when the recording should switch
+        to self.url.
+        """
+        if self._window_media is None:
+            self._start_window(media_ms)
+            return False
+
+        self._window_bytes += nbytes
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < QUALITY_WINDOW:
+            return False
+
+        self.bytes_per_second = self._window_bytes / elapsed
+        self.ratio = (media_ms - self._window_media) / 1000 / elapsed
+        self._start_window(media_ms)
+        errors, self._errors = self._errors, 0
+        if not self.adaptive:
+            return False
+
+        if self.ratio < DOWNGRADE_RATIO:
+            return self._switch(
+                +1, f"{self.ratio:.0%} of real time at "
+                    f"{self.bytes_per_second * 8 / 1000:.0f} kbit/s")
+        if errors < DOWNGRADE_ERRORS and self.index > 0 \
+                and now - self._switched_at >= self.upgrade_after:
+            return self._switch(-1, f"steady for {now - self._switched_at:.0f}s")
+        return False
+
+    def _switch(self, step, reason) -> bool:
+        index = self.index + step
+        if not 0 <= index < len(self.variants):
+            return False
+
+        now = time.monotonic()
+        if step > 0 and self._upgraded and now - self._switched_at < 2 * QUALITY_WINDOW:
+            # The higher quality failed right away: wait longer next time
+            self.upgrade_after = min(self.upgrade_after * 2, UPGRADE_AFTER_MAX)
+        elif step > 0:
+            self.upgrade_after = UPGRADE_AFTER
+
+        logger.info(
+            f"📶 Quality {self.current['sdk_key']} -> {self.variants[index]['sdk_key']} "
+            f"({reason})")
+        self.index = index
+        self._upgraded = step < 0
+        self._switched_at = now
+        self._errors = 0
+        self.switches += 1
+        return True
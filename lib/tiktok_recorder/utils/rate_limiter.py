@@ -0,0 +1,222 @@
+import asyncio
+import os
+import struct
+import threading
+import time
+
+from .logger_manager import logger
+from .utils import locked_file
+
+DEFAULT_STATE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "cache", "ratelimit"
+)
+
+# Requests per second and burst size of each endpoint class, shared by all
+# processes on the host
+ENDPOINT_BUDGETS = {
+    'liveness': (2.0, 10),
+    'room_info': (2.0, 10),
+    'followers': (1.0, 3),
+    'stream': (5.0, 20),
+}
+
+# URL fragments that identify an endpoint class; anything else is not
+# limited unless the session has a default class
+ENDPOINT_PATTERNS = (
+    ('/webcast/room/check_alive/', 'liveness'),
+    ('/webcast/room/info/', 'room_info'),
+    ('/api-live/user/room', 'room_info'),
+    ('/api/user/list/', 'followers'),
+)
+
+# Endpoint class of requests that are never limited, for a request to pass
+# instead of the class of its URL or session (it has no budget)
+UNLIMITED = 'unlimited'
+
+# Waits longer than this are logged
+SLOW_WAIT = 1.0
+
+_STATE = struct.Struct('dd')  # tokens, last refill (wall clock)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate tokens per second, at most capacity
+    stored for bursts.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1) -> float:
+        """
+        Blocks until the tokens are available and returns the seconds
+        spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in a small file, so every process on
+    the host draws from the same budget. The file is locked while the
+    bucket is refilled and drawn from.
+    """
+
+    def __init__(self, path, rate, capacity):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def try_acquire(self, tokens=1) -> float:
+        """
+        Takes the tokens if available and returns 0, otherwise returns
+        the seconds to wait before trying again.
+        """
+        with locked_file(self.path) as fd:
+            os.lseek(fd, 0, os.SEEK_SET)
+            raw = os.read(fd, _STATE.size)
+            now = time.time()
+            if len(raw) == _STATE.size:
+                available, updated = _STATE.unpack(raw)
+                elapsed = max(0.0, now - updated)
+                available = min(self.capacity, available + elapsed * self.rate)
+            else:
+                available = float(self.capacity)
+
+            delay = 0.0
+            if available >= tokens:
+                available -= tokens
+            else:
+                delay = (tokens - available) / self.rate
+
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, _STATE.pack(available, now))
+
+        return delay
+
+
+class RateLimiter:
+    """
+    Per-endpoint-class request budgets shared by all recorder processes.
+
+    The time spent waiting for a budget is counted per class in
+    wait_seconds and waits, so it can be exported as a metric.
+    """
+
+    def __init__(self, budgets=None, state_dir=DEFAULT_STATE_DIR):
+        self.buckets = {
+            name: SharedTokenBucket(
+                os.path.join(state_dir, f"{name}.bucket"), rate, capacity)
+            for name, (rate, capacity) in (budgets or ENDPOINT_BUDGETS).items()
+        }
+        self.wait_seconds = dict.fromkeys(self.buckets, 0.0)
+        self.waits = dict.fromkeys(self.buckets, 0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def classify(url, default=None):
+        for pattern, endpoint in ENDPOINT_PATTERNS:
+            if pattern in url:
+                return endpoint
+        return default
+
+    def _record_wait(self, endpoint, waited):
+        if waited <= 0:
+            return
+        with self._lock:
+            self.wait_seconds[endpoint] += waited
+            self.waits[endpoint] += 1
+        if waited >= SLOW_WAIT:
+            logger.info(f"Rate limiter: waited {waited:.1f}s for {endpoint}")
+
+    def acquire(self, endpoint) -> float:
+        """
+        Blocks until a request of the endpoint class is allowed and
+        returns the seconds spent waiting.
+        """
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            try:
+                delay = bucket.try_acquire()
+            except OSError as ex:
+                logger.error(f"Rate limiter unavailable for {endpoint}: {ex}")
+                return waited
+            if delay <= 0:
+                break
+            time.sleep(delay)
+            waited += delay
+
+        self._record_wait(endpoint, waited)
+        return waited
+
+    async def acquire_async(self, endpoint) -> float:
+        """
+        asyncio version of acquire.
+        """
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            try:
+                delay = bucket.try_acquire()
+            except OSError as ex:
+                logger.error(f"Rate limiter unavailable for {endpoint}: {ex}")
+                return waited
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+            waited += delay
+
+        self._record_wait(endpoint, waited)
+        return waited
+
+    def stats(self) -> dict:
+        """
+        Returns {endpoint: (waits, wait_seconds)} for this process.
+        """
+        with self._lock:
+            return {
+                name: (self.waits[name], self.wait_seconds[name])
+                for name in self.buckets
+            }
+
+
+_shared_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the RateLimiter shared by every HTTP client of this process.
+    """
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = RateLimiter()
+    return _shared_limiter
@@ -0,0 +1,134 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .logger_manager import logger
+from .metrics import Histogram
+
+# Seconds between the requests that keep a spare connection to the stream
+# edges open, and the number of edges (current one first) kept warm
+WARM_INTERVAL = 30
+WARM_EDGES = 2
+
+# A connection that ends with less than this many bytes counts as short.
+# Short connections in a row are resumed after a delay that doubles from
+# RESUME_BACKOFF up to RESUME_BACKOFF_MAX seconds, and from
+# RESUME_SHORT_LIMIT on, only once the live is confirmed
+SHORT_CONNECTION_BYTES = 64 * 1024
+RESUME_BACKOFF = 0.5
+RESUME_BACKOFF_MAX = 10
+RESUME_SHORT_LIMIT = 3
+
+# Buckets (seconds) of the reconnect gap histogram
+GAP_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+class FastReconnect:
+    """
+    Shortens the gap between a dropped stream connection and the next one.
+
+    While the stream runs, a HEAD request every WARM_INTERVAL seconds
+    leaves an idle keep-alive connection to its edge (and the next backup
+    edge) in the stream session's pool, so a reconnect takes a ready
+    socket instead of a new DNS lookup, TCP and TLS handshake.
+
+    A connection is retried right away, and the live is checked at the
+    same time instead of before: check_live() starts the check in the
+    background, and is_live() is only asked for its result when the retry
+    brought no data. A connection that delivered data is resumed through
+    resume(), which stops when its check already says the live is over
+    and backs off when connections keep ending almost at once, as the
+    edge of an ended live may answer with a header and nothing else.
+
+    The time from each drop to the first data of the next connection goes
+    into the gaps histogram.
+    """
+
+    def __init__(self, tiktok, room_id):
+        self.tiktok = tiktok
+        self.room_id = room_id
+        self.gaps = Histogram(GAP_BUCKETS)
+
+        self._executor = ThreadPoolExecutor(2, thread_name_prefix="Reconnect")
+        self._warm = None
+        self._warmed_at = 0.0
+        self._dropped_at = None
+        self._short = 0
+
+    def check_live(self):
+        """
+        Starts a liveness check in the background and returns its future.
+        """
+        return self._executor.submit(self.tiktok.is_room_alive, self.room_id)
+
+    @staticmethod
+    def is_live(check) -> bool:
+        """
+        Result of a check_live() future; a failed check counts as live, so
+        the stream is tried again rather than dropped.
+        """
+        if check is None:
+            return True
+        try:
+            return check.result()
+        except Exception as ex:
+            logger.warning(f"Liveness check failed: {ex}")
+            return True
+
+    def resume(self, check, received):
+        """
+        Called when a connection that delivered received bytes ended, with
+        the check_live() future started for it. Returns the seconds to
+        wait before resuming the stream, or None when the live is over.
+        """
+        if received >= SHORT_CONNECTION_BYTES:
+            self._short = 0
+        else:
+            self._short += 1
+
+        if check is not None and (check.done() or self._short >= RESUME_SHORT_LIMIT):
+            if not self.is_live(check):
+                return None
+        if not self._short:
+            return 0
+        return min(RESUME_BACKOFF_MAX, RESUME_BACKOFF * 2 ** (self._short - 1))
+
+    def keep_warm(self, urls):
+        """
+        Refreshes the spare connections to the edges of urls when due.
+        """
+        now = time.monotonic()
+        if now - self._warmed_at < WARM_INTERVAL or \
+                (self._warm is not None and not self._warm.done()):
+            return
+        self._warmed_at = now
+        self._warm = self._executor.submit(self._warm_edges, urls[:WARM_EDGES])
+
+    def _warm_edges(self, urls):
+        for url in urls:
+            try:
+                self.tiktok.warm_stream_connection(url)
+            except Exception as ex:
+                logger.debug(f"Keep-alive request failed: {ex}")
+
+    def dropped(self):
+        """
+        Called when a connection that delivered data ends.
+        """
+        if self._dropped_at is None:
+            self._dropped_at = time.monotonic()
+
+    def connected(self):
+        """
+        Called on the first data of a connection.
+        """
+        if self._dropped_at is not None:
+            self.gaps.observe(time.monotonic() - self._dropped_at)
+            self._dropped_at = None
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def summary(self) -> str:
+        gaps = self.gaps
+        return (f"{gaps.count} reconnects, gap p50 <= {gaps.quantile(0.5) * 1000:.0f} ms, "
+                f"p90 <= {gaps.quantile(0.9) * 1000:.0f} ms, max {gaps.max * 1000:.0f} ms")
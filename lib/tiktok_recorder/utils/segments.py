@@ -0,0 +1,85 @@
+import os
+import queue
+import threading
+
+from .logger_manager import logger
+
+
+class SegmentManager:
+    """
+    Output files of a segmented recording.
+
+    opener(name) opens the segment called name (<base>_001, <base>_002,
+    ...) and returns (file, path). Each
+    closed segment goes to finish(path) on a background thread, in order,
+    while the next one is being recorded. finish converts (and uploads)
+    the segment and returns the final file. The final files are listed in
+    <base>_segments.txt, which ffmpeg's concat demuxer can read to join
+    them without re-encoding:
+
+        ffmpeg -f concat -safe 0 -i <base>_segments.txt -c copy joined.mp4
+    """
+
+    def __init__(self, base, finish, opener):
+        self.base = base
+        self.finish = finish
+        self.opener = opener
+        self.index = 0
+        self.current = None
+        self.list_path = f"{base}_segments.txt"
+
+        self._closed = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="SegmentFinisher", daemon=True)
+        self._thread.start()
+
+    def open_next(self):
+        """
+        Opens the next segment and returns its file.
+        """
+        self.index += 1
+        out_file, self.current = self.opener(f"{self.base}_{self.index:03d}")
+        return out_file
+
+    def rotate(self, out_file):
+        """
+        Closes the current segment, queues it for finishing and returns
+        the next one. Called by the StreamWriter thread.
+        """
+        out_file.close()
+        logger.info(f"✂️ Segment {self.index} closed: {self.current}")
+        self._finish_later(out_file)
+        return self.open_next()
+
+    def close(self, out_file):
+        """
+        Closes the last segment and waits until every segment is finished.
+        """
+        out_file.close()
+        self._finish_later(out_file)
+        self._closed.put(None)
+        self._thread.join()
+
+    def _finish_later(self, out_file):
+        self._closed.put(self.current)
+        # The rest of the segment, if ffmpeg exited during its live remux
+        fallback = getattr(out_file, 'fallback_path', None)
+        if fallback:
+            self._closed.put(fallback)
+
+    def _run(self):
+        while True:
+            path = self._closed.get()
+            if path is None:
+                return
+
+            try:
+                final = self.finish(path)
+            except Exception as ex:
+                logger.error(f"❌ Failed to finish segment {path}: {ex}")
+                continue
+
+            if final and os.path.exists(final):
+                with open(self.list_path, "a", encoding="utf-8") as f:
+                    name = os.path.basename(final).replace("'", "'\\''")
+                    f.write(f"file '{name}'\n")
@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+
+from .flv import SEGMENT_BREAK
+from .logger_manager import logger
+from .metrics import Histogram, WRITE_BUCKETS
+
+# Buffers in the pool and queued buffers at which a warning is logged
+DEFAULT_QUEUE_DEPTH = 32
+DEFAULT_HIGH_WATER = 24
+
+_CLOSE = object()
+
+
+class StreamWriter:
+    """
+    Writes a recording from a dedicated thread, so a slow disk does not
+    stop the socket from being read.
+
+    The reader takes an empty buffer from a fixed pool with acquire(),
+    fills it and hands it over with submit(), along with the pieces to
+    write (slices of the buffer, or small bytes objects). The writer
+    thread writes the pieces and puts the buffer back in the pool. The
+    queue can hold up to depth buffers (depth * buffer_size bytes of
+    stream). Only when all of them are waiting for the disk does acquire()
+    block.
+
+    A SEGMENT_BREAK among the pieces calls rotate(out_file), from the
+    writer thread, and the following pieces go to the file it returns.
+    """
+
+    def __init__(self, out_file, buffer_size, depth=DEFAULT_QUEUE_DEPTH,
+                 high_water=DEFAULT_HIGH_WATER, rotate=None):
+        self.out_file = out_file
+        self.rotate = rotate
+        self.depth = depth
+        self.high_water = min(high_water, depth)
+
+        self._free = queue.Queue()
+        for _ in range(depth):
+            self._free.put(memoryview(bytearray(buffer_size)))
+        self._filled = queue.Queue()
+        self._error = None
+
+        # Reported by stats()
+        self.bytes_written = 0
+        self.peak_depth = 0
+        self.high_water_hits = 0
+        self.blocked_seconds = 0.0
+        self.max_write_seconds = 0.0
+        self.write_seconds = Histogram(WRITE_BUCKETS)
+        self._above_high_water = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="StreamWriter", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def write_all(out_file, view):
+        """
+        Writes a memoryview to an unbuffered file, which may accept only
+        part of it per call.
+        """
+        while view:
+            written = out_file.write(view)
+            view = view[written:]
+
+    def _run(self):
+        while True:
+            item = self._filled.get()
+            if item is _CLOSE:
+                return
+
+            buffer, pieces = item
+            if self._error is None:
+                started = time.perf_counter()
+                try:
+                    for piece in pieces:
+                        if piece is SEGMENT_BREAK:
+                            if self.rotate:
+                                self.out_file = self.rotate(self.out_file)
+                            continue
+                        self.write_all(self.out_file, memoryview(piece))
+                        self.bytes_written += len(piece)
+                except Exception as ex:
+                    self._error = ex
+                elapsed = time.perf_counter() - started
+                self.max_write_seconds = max(self.max_write_seconds, elapsed)
+                self.write_seconds.observe(elapsed)
+            self._free.put(buffer)
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def acquire(self) -> memoryview:
+        """
+        Returns an empty buffer, waiting for the writer if every buffer is
+        queued.
+        """
+        self._check_error()
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+
+        logger.warning(
+            f"Write queue full ({self.depth} buffers), reading paused")
+        started = time.perf_counter()
+        buffer = self._free.get()
+        self.blocked_seconds += time.perf_counter() - started
+        return buffer
+
+    def release(self, buffer):
+        """
+        Returns an unused buffer to the pool.
+        """
+        self._free.put(buffer)
+
+    def submit(self, buffer, pieces):
+        """
+        Queues pieces for writing and buffer for reuse once they are
+        written.
+        """
+        self._check_error()
+        self._filled.put((buffer, pieces))
+
+        queued = self._filled.qsize()
+        self.peak_depth = max(self.peak_depth, queued)
+        if queued >= self.high_water:
+            if not self._above_high_water:
+                self._above_high_water = True
+                self.high_water_hits += 1
+                logger.warning(
+                    f"Write queue at {queued}/{self.depth} buffers, "
+                    f"disk is falling behind the stream")
+        elif queued <= self.high_water // 2:
+            self._above_high_water = False
+
+    def close(self):
+        """
+        Writes everything still queued, stops the thread and raises the
+        write error, if any.
+        """
+        self._filled.put(_CLOSE)
+        self._thread.join()
+        self._check_error()
+
+    def stats(self) -> dict:
+        return {
+            'bytes_written': self.bytes_written,
+            'queue_depth': self._filled.qsize(),
+            'queue_capacity': self.depth,
+            'high_water': self.high_water,
+            'peak_depth': self.peak_depth,
+            'high_water_hits': self.high_water_hits,
+            'blocked_seconds': self.blocked_seconds,
+            'max_write_seconds': self.max_write_seconds,
+            'write_seconds': self.write_seconds.to_dict(),
+        }
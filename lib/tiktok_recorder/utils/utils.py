@@ -1,5 +1,6 @@
 import json
 import os
+from contextlib import contextmanager
 
 from .enums import Info
 
@@ -60,3 +61,30 @@ def is_linux() -> bool:
     """
     import platform
     return platform.system().lower() == "linux"
+
+
+@contextmanager
+def locked_file(path):
+    """
+    Opens path for update and holds an exclusive lock on it.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield fd
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield fd
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -1,9 +1,19 @@
 import os
+import subprocess
 import time
 
 import ffmpeg
 
+from .custom_exceptions import RemuxError
+from .flv import FILE_HEADER_SIZE, TAG_HEADER_SIZE, TAG_SCRIPT, is_sequence_header
 from .logger_manager import logger
+from .mp4_remuxer import FlvToMp4Remuxer
+
+# Suffixes of recordings that still have to be converted to MP4
+RAW_SUFFIXES = ('_flv.mp4', '_ts.mp4')
+
+# Seconds ffmpeg gets to write the last fragment once its input is closed
+REMUX_CLOSE_TIMEOUT = 30
 
 
 class VideoManagement:
@@ -25,23 +35,225 @@ class VideoManagement:
     @staticmethod
     def convert_flv_to_mp4(file):
         """
-        Convert the video from flv format to mp4 format
+        Convert the video from flv (or ts) format to mp4 format.
+
+        H.264/AAC recordings are remuxed natively; ffmpeg is only used for
+        the streams the native remuxer does not handle. Returns the path
+        of the MP4, or of the recording if it could not be converted.
         """
         logger.info("Converting {} to MP4 format...".format(file))
 
         if not VideoManagement.wait_for_file_release(file):
             logger.error(f"File {file} is still locked after waiting. Skipping conversion.")
-            return
+            return file
+
+        for suffix in RAW_SUFFIXES:
+            if file.endswith(suffix):
+                output = file[:-len(suffix)] + '.mp4'
+                break
+        else:
+            output = os.path.splitext(file)[0] + '_converted.mp4'
+
+        try:
+            FlvToMp4Remuxer(file, output).remux()
+        except RemuxError as ex:
+            logger.info(f"Native remux not possible ({ex}), using ffmpeg")
+            if not VideoManagement._convert_with_ffmpeg(file, output):
+                if os.path.exists(output):
+                    os.remove(output)
+                return file
+
+        os.remove(file)
 
+        logger.info("Finished converting {}\n".format(file))
+        return output
+
+    @staticmethod
+    def _convert_with_ffmpeg(file, output) -> bool:
         try:
             ffmpeg.input(file).output(
-                file.replace('_flv.mp4', '.mp4'),
+                output,
                 c='copy',
                 y='-y',
             ).run(quiet=True)
+            return True
         except ffmpeg.Error as e:
             logger.error(f"ffmpeg error: {e.stderr.decode() if hasattr(e, 'stderr') else str(e)}")
+        except FileNotFoundError:
+            logger.error(f"FFmpeg binary is not installed, keeping {file} unconverted")
+        return False
 
-        os.remove(file)
 
-        logger.info("Finished converting {}\n".format(file))
+class LiveRemuxer:
+    """
+    File-like sink that pipes an FLV stream into a long-running ffmpeg,
+    which copies it into a fragmented MP4 while the live is recorded.
+
+    Each fragment is complete on disk as soon as it is written, so the
+    MP4 is ready when the live ends, without a second pass over the file.
+    Raises OSError if ffmpeg cannot be started.
+
+    If ffmpeg exits during the recording, the stream continues in a raw
+    FLV file opened with open_fallback(fallback_path), and fallback_path
+    is set so the caller converts it too. To make that file decodable on
+    its own, the remuxer follows the FLV tags it is given: the file
+    header, the metadata and the codec sequence headers are copied to the
+    new file first, and the stream resumes there with the first complete
+    tag after the failed write. Without a fallback_path the write error
+    is raised.
+    """
+
+    def __init__(self, path, fallback_path=None, open_fallback=None):
+        self.path = path
+        self.fallback_path = None
+        self._fallback_path = fallback_path
+        self._open_fallback = open_fallback or (lambda name: open(name, 'wb'))
+        self._fallback = None
+        self._resync = False
+
+        # FLV structure of the bytes written so far
+        self._tracking = True
+        self._header = bytearray()
+        self._need = 0
+        self._capture = None
+        self._file_header = None
+        self._metadata = None
+        self._sequence_headers = {}
+
+        self.process = (
+            ffmpeg
+            .input('pipe:', format='flv')
+            .output(
+                path,
+                c='copy',
+                f='mp4',
+                movflags='+frag_keyframe+empty_moov+default_base_moof',
+            )
+            .global_args('-hide_banner', '-loglevel', 'error', '-nostats')
+            .overwrite_output()
+            .run_async(pipe_stdin=True)
+        )
+
+    def _track(self, data):
+        """
+        Follows the FLV units (file header, tags) in data and keeps the
+        ones a new file starts with. Returns the offset in data of the
+        first unit that starts in it, or None.
+        """
+        boundary = None
+        pos, end = 0, len(data)
+        while pos < end and self._tracking:
+            if self._need:
+                take = min(self._need, end - pos)
+                if self._capture is not None:
+                    self._capture += data[pos:pos + take]
+                    self._check_capture()
+                self._need -= take
+                pos += take
+                if not self._need and self._capture is not None:
+                    self._keep(bytes(self._capture))
+                continue
+
+            if not self._header and boundary is None:
+                boundary = pos
+            size = TAG_HEADER_SIZE if self._file_header is not None else FILE_HEADER_SIZE
+            take = min(size - len(self._header), end - pos)
+            self._header += data[pos:pos + take]
+            pos += take
+            if len(self._header) < size:
+                continue
+
+            header, self._header = bytes(self._header), bytearray()
+            if self._file_header is None:
+                if header[:3] == b'FLV':
+                    self._file_header = header
+                else:
+                    self._tracking = False
+                continue
+            self._need = ((header[1] << 16) | (header[2] << 8) | header[3]) + 4
+            self._capture = bytearray(header)
+        return boundary
+
+    def _check_capture(self):
+        """
+        Stops copying an audio/video tag once its first body bytes show
+        it is not a sequence header.
+        """
+        tag_type = self._capture[0] & 0x1F
+        body = self._capture[TAG_HEADER_SIZE:TAG_HEADER_SIZE + 2]
+        if tag_type != TAG_SCRIPT and len(body) == 2 and not is_sequence_header(tag_type, body):
+            self._capture = None
+
+    def _keep(self, tag):
+        self._capture = None
+        tag_type = tag[0] & 0x1F
+        if tag_type == TAG_SCRIPT:
+            self._metadata = tag
+        else:
+            self._sequence_headers[tag_type] = tag
+
+    def _fail_over(self, ex):
+        """
+        Moves the stream to the fallback file after ffmpeg stopped taking
+        it.
+        """
+        code = self.process.poll()
+        if not self._fallback_path or self._file_header is None:
+            raise ex
+        logger.error(
+            f"ffmpeg exited with code {code} while remuxing {self.path} ({ex!r}), "
+            f"continuing in {self._fallback_path}")
+        self._fallback = self._open_fallback(self._fallback_path)
+        self.fallback_path = self._fallback_path
+        prologue = [self._file_header, self._metadata] + list(self._sequence_headers.values())
+        self._write_fallback(b''.join(tag for tag in prologue if tag))
+        self._resync = True
+
+    def _write_fallback(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[self._fallback.write(view):]
+
+    def write(self, data):
+        size = len(data)
+        if self._fallback is None:
+            try:
+                written = self.process.stdin.write(data)
+                self._track(data)
+                return written
+            except (BrokenPipeError, ValueError, OSError) as ex:
+                self._fail_over(ex)
+
+        boundary = self._track(data)
+        if self._resync:
+            # Drop the rest of the tag ffmpeg did not take
+            if boundary is None:
+                return size
+            self._resync = False
+            data = data[boundary:]
+        self._write_fallback(data)
+        return size
+
+    def close(self):
+        """
+        Closes ffmpeg's input and waits for it to finish the file.
+        """
+        if self._fallback is not None:
+            self._fallback.close()
+        if self.process.stdin.closed:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        try:
+            code = self.process.wait(timeout=REMUX_CLOSE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.error(f"ffmpeg did not finish {self.path}, killing it")
+            self.process.kill()
+            self.process.wait()
+            return
+
+        if code != 0:
+            logger.error(f"ffmpeg exited with code {code} while remuxing {self.path}")
@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+from .enums import TimeOut
+from .logger_manager import logger
+from .utils import locked_file
+
+DEFAULT_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "cache", "waf_cookies.json"
+)
+
+
+class WAFCookieStore:
+    """
+    WAF cookies solved by any recorder process on the host.
+
+    Every entry is {"value", "solved_at", "expires"}. Solving happens under
+    an exclusive lock on a sibling .lock file, so when many processes hit
+    the challenge at once only the first one solves it and the others pick
+    up its cookie. The JSON file is replaced atomically, so it can be read
+    without the lock.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl=TimeOut.WAF_COOKIE * TimeOut.ONE_MINUTE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.ttl = ttl
+        self._mtime = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            logger.error(f"Failed to read WAF cookie cache {self.path}: {ex}")
+            return {}
+
+    def _write(self, entries):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def cookies(self) -> dict:
+        """
+        Returns the {name: value} cookies that have not expired yet.
+        """
+        now = time.time()
+        return {
+            name: entry["value"] for name, entry in self._read().items()
+            if entry.get("expires", 0) > now
+        }
+
+    def changed_cookies(self):
+        """
+        Returns cookies() if the store was written since the last call,
+        otherwise None. Costs a stat() when nothing changed.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+        if mtime == self._mtime:
+            return None
+        self._mtime = mtime
+        return self.cookies()
+
+    def solve_once(self, html_content, requested_at, solve) -> dict:
+        """
+        Returns the cookie for the challenge in html_content.
+
+        If another process stored a cookie after requested_at (the time the
+        challenged request was sent), that cookie is used as is. Otherwise
+        solve(html_content) is called, under the lock, and its result
+        stored for everyone.
+        """
+        with locked_file(self.lock_path):
+            now = time.time()
+            entries = self._read()
+            fresh = {
+                name: entry["value"] for name, entry in entries.items()
+                if entry.get("solved_at", 0) >= requested_at
+                and entry.get("expires", 0) > now
+            }
+            if fresh:
+                return fresh
+
+            started = time.perf_counter()
+            cookie = solve(html_content)
+            logger.info(
+                f"Solved WAF challenge in {time.perf_counter() - started:.2f}s")
+
+            now = time.time()
+            entries = {
+                name: entry for name, entry in entries.items()
+                if entry.get("expires", 0) > now
+            }
+            for name, value in cookie.items():
+                entries[name] = {
+                    "value": value,
+                    "solved_at": now,
+                    "expires": now + self.ttl,
+                }
+            try:
+                self._write(entries)
+            except OSError as ex:
+                logger.error(f"Failed to write WAF cookie cache {self.path}: {ex}")
+
+            return cookie
@@ -0,0 +1,116 @@
+import socket
+import threading
+import time
+
+from .logger_manager import logger
+
+# Seconds to connect to a stream edge and to wait for each read of the
+# socket, and without any stream data before the connection is dropped
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_STALL_SECONDS = 15
+
+# Seconds between two checks of the watchdog, which bounds how long a
+# graceful stop waits for a connection that delivers nothing
+WATCHDOG_INTERVAL = 0.5
+
+STALLED = 'stalled'
+STOPPED = 'stopped'
+
+
+def _stream_socket(response):
+    """
+    Socket a streamed requests response is read from (through
+    http.client), or None.
+    """
+    fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+    return getattr(getattr(fp, 'raw', None), '_sock', None)
+
+
+class StallWatchdog:
+    """
+    Ends a stream connection that no longer delivers data.
+
+    The socket read timeout only catches a silent socket: a connection
+    that trickles a few bytes now and then, or a read waiting for a full
+    buffer, can still hold the recording for good, and the stop event is
+    only seen between two reads. While a response is watched, a thread
+    checks every WATCHDOG_INTERVAL seconds whether data came within
+    deadline seconds and whether should_stop() is set, and if not, shuts
+    the socket down so the blocked read returns at once. tripped then
+    tells why (STALLED or STOPPED); a stalled connection is retried like
+    a dropped one, which fails over to another edge if it stalls again.
+    """
+
+    def __init__(self, deadline=DEFAULT_STALL_SECONDS, should_stop=None,
+                 interval=WATCHDOG_INTERVAL):
+        self.deadline = deadline
+        self.should_stop = should_stop or (lambda: False)
+        self.interval = interval
+        self.tripped = None
+
+        self._lock = threading.Lock()
+        self._response = None
+        self._last_data = 0.0
+        self._closed = threading.Event()
+        self._thread = None
+
+        # Reported after the recording
+        self.stalls = 0
+
+    def watch(self, response):
+        """
+        Starts watching response, a requests response read with stream=True.
+        """
+        with self._lock:
+            self._response = response
+            self._last_data = time.monotonic()
+            self.tripped = None
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="StallWatchdog", daemon=True)
+            self._thread.start()
+
+    def fed(self):
+        """
+        Called for every read that returned data.
+        """
+        self._last_data = time.monotonic()
+
+    def unwatch(self):
+        with self._lock:
+            self._response = None
+
+    def _run(self):
+        while not self._closed.wait(self.interval):
+            with self._lock:
+                response = self._response
+                if response is None:
+                    continue
+                if self.should_stop():
+                    self.tripped = STOPPED
+                else:
+                    silent = time.monotonic() - self._last_data
+                    if not self.deadline or silent < self.deadline:
+                        continue
+                    self.tripped = STALLED
+                    self.stalls += 1
+                    logger.warning(f"⏰ No stream data for {silent:.0f}s, reconnecting")
+                self._response = None
+            self._abort(response)
+
+    @staticmethod
+    def _abort(response):
+        sock = _stream_socket(response)
+        try:
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+            else:
+                response.close()
+        except Exception as ex:
+            logger.debug(f"Failed to abort the stream connection: {ex}")
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -13,15 +13,17 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from bot.client import client
 from bot import events, commands
 from config import settings
-from modules import recorder
+from modules import metrics, recorder, scheduler
 
 def signal_handler(signum: int, frame) -> NoReturn:
     """Handle shutdown signals gracefully."""
     print(f"\n🛑 [SHUTDOWN] Received signal {signum}")
     print("⏳ [SHUTDOWN] Gracefully shutting down all recordings...")
     
-    # Shutdown all recordings gracefully
+    # Stop polling, then shutdown all recordings gracefully
+    scheduler.stop_scheduler()
     recorder.shutdown_all_recordings()
+    metrics.stop_metrics_server()
     
     print("✅ [SHUTDOWN] Bot shutdown complete.")
     sys.exit(0)
@@ -32,6 +34,7 @@ async def main():
         print("🚀 Starting TikCord bot...")
         print(f"📡 Monitoring {len(settings.MONITORED_CHANNELS)} channels")
         print(f"🎬 Recording enabled: {settings.RECORDER_ENABLED}")
+        metrics.start_metrics_server()
         
         async with client:
             await client.start(settings.TOKEN)
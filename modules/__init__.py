@@ -2,4 +2,5 @@
 # Tambahkan import jika ingin forwarder dan recorder bisa diakses langsung dari modules
 
 from .forwarder import *
-from .recorder import *
\ No newline at end of file
+from .recorder import *
+from .scheduler import *
\ No newline at end of file
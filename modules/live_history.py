@@ -0,0 +1,148 @@
+# File: modules/live_history.py
+# Live history per user and the adaptive probe schedule learned from it.
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'live_history.json')
+
+# Sessions kept per user to learn their usual start time
+MAX_SESSIONS = 50
+
+# A user is "hot" from HOT_BEFORE minutes before to HOT_AFTER minutes after
+# a time of day at which they went live before
+HOT_BEFORE = 15
+HOT_AFTER = 45
+
+class LiveHistory:
+    """
+    Persisted live start/end times per user.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = os.path.abspath(path)
+        self.sessions: Dict[str, List[List[Optional[float]]]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.sessions = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"   - ⚠️ LiveHistory: Failed to read {self.path}: {e}")
+            self.sessions = {}
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.sessions, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"   - ⚠️ LiveHistory: Failed to write {self.path}: {e}")
+
+    def record_start(self, username: str, when: Optional[float] = None) -> None:
+        """Record that a user went live."""
+        sessions = self.sessions.setdefault(username, [])
+        sessions.append([when or time.time(), None])
+        del sessions[:-MAX_SESSIONS]
+        self.save()
+
+    def record_end(self, username: str, when: Optional[float] = None) -> None:
+        """Record that the last live of a user ended."""
+        sessions = self.sessions.get(username)
+        if sessions and sessions[-1][1] is None:
+            sessions[-1][1] = when or time.time()
+            self.save()
+
+    def is_hot(self, username: str, now: Optional[float] = None) -> bool:
+        """
+        Check whether the current time of day is close to one at which the
+        user went live before.
+        """
+        now_minute = _minute_of_day(now or time.time())
+        for start, _ in self.sessions.get(username, []):
+            # Minutes from that start time to now, wrapped around midnight
+            delta = (now_minute - _minute_of_day(start) + 720) % 1440 - 720
+            if -HOT_BEFORE <= delta <= HOT_AFTER:
+                return True
+        return False
+
+class PollPlanner:
+    """
+    Decides which watched users are probed on each scheduler tick.
+
+    Hot users are probed every hot_interval seconds. Everybody else starts
+    at base_interval and backs off exponentially with every probe that
+    finds them offline, up to max_interval. All probes share a global
+    budget of budget_per_minute, refilled continuously.
+    """
+
+    def __init__(self, history: LiveHistory, base_interval: int, hot_interval: int,
+                 max_interval: int, budget_per_minute: int):
+        self.history = history
+        self.base_interval = base_interval
+        self.hot_interval = hot_interval
+        self.max_interval = max(max_interval, base_interval)
+        self.budget_per_minute = budget_per_minute
+
+        self.misses: Dict[str, int] = {}  # consecutive offline probes
+        self.last_probe: Dict[str, float] = {}
+        self._tokens = float(budget_per_minute)
+        self._refilled_at = time.monotonic()
+
+    def interval(self, username: str, now: Optional[float] = None) -> float:
+        """Seconds between two probes of a user right now."""
+        if self.history.is_hot(username, now):
+            return self.hot_interval
+        backoff = self.base_interval * 2 ** min(self.misses.get(username, 0), 16)
+        return min(backoff, self.max_interval)
+
+    def due_users(self, usernames: List[str]) -> List[str]:
+        """
+        Pick the users to probe now, most overdue first, within the budget.
+        """
+        now = time.time()
+        overdue = []
+        for username in usernames:
+            last = self.last_probe.get(username)
+            if last is None:
+                overdue.append((float('inf'), username))
+                continue
+            lateness = (now - last) / self.interval(username, now)
+            if lateness >= 1:
+                overdue.append((lateness, username))
+
+        overdue.sort(reverse=True)
+        allowed = int(self._take_tokens(len(overdue)))
+        return [username for _, username in overdue[:allowed]]
+
+    def record_probe(self, username: str, live: bool) -> None:
+        """Remember a probe result to plan the next one."""
+        self.last_probe[username] = time.time()
+        if live:
+            self.misses[username] = 0
+        else:
+            self.misses[username] = self.misses.get(username, 0) + 1
+
+    def forget(self, username: str) -> None:
+        self.misses.pop(username, None)
+        self.last_probe.pop(username, None)
+
+    def _take_tokens(self, wanted: int) -> float:
+        now = time.monotonic()
+        refill = (now - self._refilled_at) * self.budget_per_minute / 60
+        self._tokens = min(float(self.budget_per_minute), self._tokens + refill)
+        self._refilled_at = now
+
+        taken = min(float(wanted), self._tokens // 1)
+        self._tokens -= taken
+        return taken
+
+def _minute_of_day(timestamp: float) -> int:
+    local = time.localtime(timestamp)
+    return local.tm_hour * 60 + local.tm_min
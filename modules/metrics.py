@@ -0,0 +1,182 @@
+# File: modules/metrics.py
+# Prometheus endpoint for the recordings: every worker process reports the
+# metrics snapshots of its recordings to the bot, which serves the latest
+# one per user, plus the rate limiter waits of each process, on /metrics.
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from config import settings
+from modules import recorder
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_server: Optional[ThreadingHTTPServer] = None
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _bound(value: float) -> str:
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+class _Family:
+    """Samples of one metric, written with its HELP and TYPE lines."""
+
+    def __init__(self, name: str, kind: str, help_text: str):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.lines: List[str] = []
+
+    def add(self, value: float, **labels) -> None:
+        self.lines.append(f"{self.name}{_labels(**labels)} {float(value)!r}")
+
+    def add_histogram(self, histogram: dict, **labels) -> None:
+        """Adds a Histogram.to_dict() as cumulative buckets, sum and count."""
+        cumulative = 0
+        bounds = list(histogram['bounds']) + [float('inf')]
+        for bound, count in zip(bounds, histogram['counts']):
+            cumulative += count
+            self.lines.append(
+                f"{self.name}_bucket{_labels(**labels, le=_bound(bound))} {cumulative}")
+        self.lines.append(f"{self.name}_sum{_labels(**labels)} {float(histogram['sum'])!r}")
+        self.lines.append(f"{self.name}_count{_labels(**labels)} {histogram['count']}")
+
+    def render(self) -> str:
+        header = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        return '\n'.join(header + self.lines)
+
+def render_metrics() -> str:
+    """Prometheus text exposition of every recording reported so far."""
+    snapshots = recorder.collect_metrics()
+
+    active = _Family('tikcord_recording_active', 'gauge',
+                     'Whether the recording of the user is running.')
+    last_report = _Family('tikcord_recording_last_report_timestamp_seconds', 'gauge',
+                          'Time the recording last reported its metrics.')
+    received = _Family('tikcord_recording_received_bytes_total', 'counter',
+                       'Bytes received from the live stream.')
+    bitrate = _Family('tikcord_recording_bitrate_bits_per_second', 'gauge',
+                      'Stream bitrate since the previous report.')
+    reconnects = _Family('tikcord_recording_reconnects_total', 'counter',
+                         'Stream connections after the first one.')
+    stalls = _Family('tikcord_recording_stall_seconds_total', 'counter',
+                     'Seconds without stream data (gaps over one second).')
+    first_byte = _Family('tikcord_recording_first_byte_seconds', 'histogram',
+                         'Time to first byte of each stream connection.')
+    write = _Family('tikcord_recording_write_seconds', 'histogram',
+                    'Latency of the disk writes of the recording.')
+    queue_depth = _Family('tikcord_recording_write_queue_depth', 'gauge',
+                          'Read buffers waiting for the disk writer.')
+    blocked = _Family('tikcord_recording_write_blocked_seconds_total', 'counter',
+                      'Seconds the stream reader waited for the disk writer.')
+    high_water = _Family('tikcord_recording_write_high_water_hits_total', 'counter',
+                         'Times the write queue reached its high-water mark.')
+    conversion = _Family('tikcord_recording_conversion_seconds', 'histogram',
+                         'Duration of the conversions to MP4.')
+    upload = _Family('tikcord_recording_upload_seconds', 'histogram',
+                     'Duration of the uploads of finished files.')
+    limiter_waits = _Family('tikcord_rate_limit_waits_total', 'counter',
+                            'Requests delayed by the shared rate limiter.')
+    limiter_seconds = _Family('tikcord_rate_limit_wait_seconds_total', 'counter',
+                              'Seconds requests waited for the shared rate limiter.')
+
+    # The rate limiter is per process: keep the latest stats of each one
+    limiters: Dict[int, dict] = {}
+    for user, snapshot in sorted(snapshots.items()):
+        active.add(0 if snapshot['final'] else 1, user=user)
+        last_report.add(snapshot['reported_at'], user=user)
+        received.add(snapshot['bytes_received'], user=user)
+        bitrate.add(snapshot['bitrate'], user=user)
+        reconnects.add(snapshot['reconnects'], user=user)
+        stalls.add(snapshot['stall_seconds'], user=user)
+        first_byte.add_histogram(snapshot['first_byte'], user=user)
+        conversion.add_histogram(snapshot['conversion_seconds'], user=user)
+        upload.add_histogram(snapshot['upload_seconds'], user=user)
+
+        writer = snapshot['writer']
+        if writer:
+            write.add_histogram(writer['write_seconds'], user=user)
+            queue_depth.add(writer['queue_depth'], user=user)
+            blocked.add(writer['blocked_seconds'], user=user)
+            high_water.add(writer['high_water_hits'], user=user)
+
+        previous = limiters.get(snapshot['pid'])
+        if previous is None or previous['reported_at'] < snapshot['reported_at']:
+            limiters[snapshot['pid']] = snapshot
+
+    try:
+        from lib.tiktok_recorder.utils.rate_limiter import get_rate_limiter
+        process_limiters = {os.getpid(): get_rate_limiter().stats()}
+    except ImportError:
+        process_limiters = {}
+    for pid, snapshot in limiters.items():
+        process_limiters.setdefault(pid, snapshot['rate_limiter'])
+
+    for pid, stats in sorted(process_limiters.items()):
+        for endpoint, (waits, seconds) in sorted(stats.items()):
+            limiter_waits.add(waits, pid=pid, endpoint=endpoint)
+            limiter_seconds.add(seconds, pid=pid, endpoint=endpoint)
+
+    families = (active, last_report, received, bitrate, reconnects, stalls, first_byte,
+                write, queue_depth, blocked, high_water, conversion, upload,
+                limiter_waits, limiter_seconds)
+    return '\n'.join(family.render() for family in families) + '\n'
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        try:
+            body = render_metrics().encode('utf-8')
+        except Exception as e:
+            print(f"   - ❌ Metrics ERROR: Failed to render metrics: {e}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Scrapes are too frequent to print
+        pass
+
+def start_metrics_server(host: str = settings.METRICS_HOST,
+                         port: int = settings.METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics on host:port from a daemon thread.
+
+    Returns:
+        The server, or None if disabled (port 0) or it could not be started
+    """
+    global _server
+    if _server is not None or not port:
+        return _server
+
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"   - ❌ Metrics ERROR: Cannot listen on {host}:{port}: {e}")
+        return None
+    _server.daemon_threads = True
+
+    threading.Thread(target=_server.serve_forever, name="MetricsServer", daemon=True).start()
+    print(f"   - 📈 Metrics: Serving http://{host}:{port}/metrics")
+    return _server
+
+def stop_metrics_server() -> None:
+    """Stop the /metrics server, if running."""
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -1,21 +1,307 @@
-import multiprocessing  
+import os
+import shutil
+import threading
 import time
-from multiprocessing.synchronize import Event  
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Set
+
+from config import settings
 
 # Centralized state management - single source of truth
-active_recordings: Dict[str, multiprocessing.Process] = {}
-stop_events: Dict[str, Event] = {}
+# Recordings run as threads inside worker processes; each worker hosts up
+# to RECORDINGS_PER_WORKER of them. Handles behave like Process objects.
+active_recordings: Dict[str, "RecordingHandle"] = {}
+workers: List["RecordingWorker"] = []
+_worker_count = 0
+# Workers without recordings -> time they became idle; they are kept for
+# WORKER_IDLE_SECONDS (and down to MIN_WORKERS) so the next live reuses a
+# process with the libraries already loaded
+_idle_since: Dict["RecordingWorker", float] = {}
+
+# Latest metrics snapshot per user, reported by the workers and kept after
+# the recording ends (its last snapshot is marked final)
+recording_metrics: Dict[str, dict] = {}
+
+# Recordings are written to downloads/<user>/ (see bridge.prepare_output_dir)
+DOWNLOADS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'downloads'))
+
+# Disk-space admission control: recordings refused for lack of space,
+# started as soon as it frees up (username -> room_id), recordings stopped
+# to free space that are still finishing, users stopped for disk space
+# waiting in the queue to resume, the room of each running recording and
+# the last bitrate (bytes/s) seen per user
+queued_recordings: Dict[str, Optional[str]] = {}
+_disk_stopping: Set[str] = set()
+_disk_stopped: Set[str] = set()
+_room_ids: Dict[str, Optional[str]] = {}
+_observed_bitrates: Dict[str, float] = {}
+
+# A recording stopped for disk space resumes only once this many times its
+# estimated need is free, so it does not stop and start over and over
+DISK_RESUME_FACTOR = 1.5
+
+def recording_options(username: str) -> dict:
+    """Recorder tuning settings passed to the recording of username."""
+    return {
+        'read_size': settings.STREAM_READ_SIZE_KB * 1024,
+        'write_queue_depth': settings.WRITE_QUEUE_DEPTH,
+        'write_high_water': settings.WRITE_QUEUE_HIGH_WATER,
+        'segment_minutes': settings.SEGMENT_MINUTES,
+        'segment_mb': settings.SEGMENT_MB,
+        'live_remux': settings.LIVE_REMUX,
+        'write_backend': settings.WRITE_BACKEND,
+        'write_sync_seconds': settings.WRITE_SYNC_SECONDS,
+        'max_quality': settings.USER_MAX_QUALITY.get(username, settings.MAX_QUALITY),
+        'adaptive_quality': settings.ADAPTIVE_QUALITY,
+        'stream_format': settings.STREAM_FORMAT,
+        'metrics_interval': settings.METRICS_INTERVAL,
+        'connect_timeout': settings.STREAM_CONNECT_TIMEOUT,
+        'read_timeout': settings.STREAM_READ_TIMEOUT,
+        'stall_seconds': settings.STREAM_STALL_SECONDS,
+        'cache_ttl': settings.LOOKUP_CACHE_TTL,
+    }
+
+def _get_worker() -> "RecordingWorker":
+    """
+    Return a running worker with a free slot, starting a new one if all
+    of them are full.
+    """
+    global _worker_count
+    from lib.tiktok_recorder.bridge import RecordingWorker
+
+    _retire_idle_workers()
+    for worker in workers:
+        if worker.is_alive() and worker.load() < settings.RECORDINGS_PER_WORKER:
+            return worker
+
+    _worker_count += 1
+    worker = RecordingWorker(f"RecorderWorker-{_worker_count}", recording_metrics)
+    workers.append(worker)
+    print(f"   - 🧵 Recorder: Started worker {worker.name} (PID: {worker.pid}), "
+          f"{len(workers)} worker(s) running.")
+    return worker
+
+def _shutdown_worker(worker: "RecordingWorker") -> None:
+    """Stop a worker, force terminating it if it hangs (blocking)."""
+    worker.shutdown(timeout=10)
+    if worker.is_alive():
+        worker.terminate()
+
+def _retire_idle_workers() -> None:
+    """
+    Shut down workers that have hosted no recording for WORKER_IDLE_SECONDS,
+    keeping at least MIN_WORKERS. Does not block: the shutdown and join run
+    on a background thread.
+    """
+    now = time.monotonic()
+    for worker in list(workers):
+        if not worker.is_alive():
+            workers.remove(worker)
+            _idle_since.pop(worker, None)
+        elif worker.load():
+            _idle_since.pop(worker, None)
+        else:
+            _idle_since.setdefault(worker, now)
+
+    for worker in list(_idle_since):
+        if len(workers) <= settings.MIN_WORKERS:
+            break
+        if now - _idle_since[worker] < settings.WORKER_IDLE_SECONDS:
+            continue
+        print(f"   - 🧹 Recorder: Retiring idle worker {worker.name} (PID: {worker.pid}).")
+        workers.remove(worker)
+        del _idle_since[worker]
+        threading.Thread(
+            target=_shutdown_worker, args=(worker,),
+            name=f"Retire-{worker.name}", daemon=True
+        ).start()
+
+def _priority(username: str) -> int:
+    return settings.RECORDING_PRIORITY.get(username, 0)
+
+def _free_disk_bytes() -> int:
+    """Free bytes on the volume of the downloads folder."""
+    path = DOWNLOADS_DIR
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+def _bitrate(username: str) -> float:
+    """Observed bitrate (bytes/s) of the user's recordings, or the default."""
+    snapshot = recording_metrics.get(username)
+    if snapshot and not snapshot['final'] and snapshot['bitrate'] > 0:
+        _observed_bitrates[username] = snapshot['bitrate'] / 8
+    return _observed_bitrates.get(username, settings.DISK_DEFAULT_BITRATE_KBPS * 1000 / 8)
+
+def estimate_disk_need(username: str, stopping: bool = False) -> int:
+    """
+    Estimate the disk space a recording may still take.
+
+    That is the stream of the next DISK_FORECAST_MINUTES at the observed
+    bitrate (none once it is stopping), plus the MP4 written next to the
+    raw file while converting: as large as the whole recording, or as one
+    segment when segmenting, and nothing when remuxing live.
+
+    Args:
+        username: TikTok username of the recording
+        stopping: The recording was asked to stop and only has to finish
+
+    Returns:
+        Estimated bytes
+    """
+    rate = _bitrate(username)
+    snapshot = recording_metrics.get(username)
+    written = snapshot['bytes_received'] if snapshot and not snapshot['final'] else 0
+    upcoming = 0 if stopping else rate * settings.DISK_FORECAST_MINUTES * 60
+    if settings.LIVE_REMUX:
+        return int(upcoming)
+
+    converted = written + upcoming
+    segment_sizes = []
+    if settings.SEGMENT_MB:
+        segment_sizes.append(settings.SEGMENT_MB * 1024 * 1024)
+    if settings.SEGMENT_MINUTES:
+        segment_sizes.append(rate * settings.SEGMENT_MINUTES * 60)
+    if segment_sizes:
+        converted = min(converted, min(segment_sizes))
+    return int(upcoming + converted)
+
+def _disk_budget() -> float:
+    """
+    Free bytes above DISK_RESERVE_GB left once the running recordings got
+    the space they are expected to need; negative when they won't fit.
+    """
+    collect_metrics()
+    budget = _free_disk_bytes() - settings.DISK_RESERVE_GB * 1024 ** 3
+    for username in active_recordings:
+        budget -= estimate_disk_need(username, username in _disk_stopping)
+    return budget
+
+def _stop_for_disk(username: str) -> None:
+    """
+    Ask a recording to stop to free disk space, without waiting for it.
+    The user stays queued to resume once there is room again.
+    """
+    process = active_recordings.get(username)
+    if process is None or username in _disk_stopping:
+        return
+    print(f"   - 💽 Recorder: Stopping '{username}' (priority {_priority(username)}) "
+          f"to keep {settings.DISK_RESERVE_GB} GB of disk space free, queued to resume.")
+    _disk_stopping.add(username)
+    _disk_stopped.add(username)
+    queued_recordings[username] = _room_ids.get(username)
+    process.stop()
+
+def is_disk_stopped(username: str) -> bool:
+    """Whether the user's recording was stopped for disk space and waits to resume."""
+    return username in _disk_stopped
+
+def _admit(username: str, room_id: Optional[str]) -> bool:
+    """
+    Disk-space admission control for a new recording.
+
+    The recording is admitted when its estimated need fits in the free
+    space above the reserve (DISK_RESUME_FACTOR times it for a recording
+    stopped for disk space). Otherwise lower-priority recordings are
+    stopped to make room, lowest first, if that is enough; if not, the
+    recording is queued until enforce_disk_budget() finds room for it.
+
+    Returns:
+        True if the recording may start
+    """
+    if not settings.DISK_FORECAST_MINUTES:
+        return True
+    try:
+        budget = _disk_budget()
+    except OSError as e:
+        print(f"   - ⚠️ Recorder: Cannot check free disk space: {e}")
+        return True
+
+    need = estimate_disk_need(username)
+    if username in _disk_stopped:
+        need *= DISK_RESUME_FACTOR
+    victims = []
+    for other in sorted(active_recordings, key=_priority):
+        if budget >= need or _priority(other) >= _priority(username):
+            break
+        if other not in _disk_stopping:
+            victims.append(other)
+            budget += estimate_disk_need(other) - estimate_disk_need(other, stopping=True)
+
+    if budget >= need:
+        for other in victims:
+            _stop_for_disk(other)
+        queued_recordings.pop(username, None)
+        _disk_stopped.discard(username)
+        return True
+
+    if username not in queued_recordings:
+        print(f"   - 💽 Recorder: Not enough disk space for '{username}' "
+              f"(needs ~{need / 1024 ** 3:.1f} GB, {max(budget, 0) / 1024 ** 3:.1f} GB available "
+              f"above the {settings.DISK_RESERVE_GB} GB reserve), queued.")
+    queued_recordings[username] = room_id
+    return False
+
+def enforce_disk_budget(start: Optional[Callable[[str, Optional[str]], object]] = None) -> None:
+    """
+    Keep the running recordings within the free disk space.
+
+    While their projected needs exceed the space above the reserve, the
+    lowest-priority recordings are stopped (the highest-priority one keeps
+    running) and queued to resume. Queued recordings are then started,
+    highest priority first, as far as there is room. Called on every
+    scheduler tick.
+
+    Args:
+        start: Called as start(username, room_id) to start a queued
+            recording, so the caller can note the start of the live;
+            start_new_recording by default
+    """
+    start = start or start_new_recording
+    if not settings.DISK_FORECAST_MINUTES:
+        return
+    get_active_recordings()
+    try:
+        budget = _disk_budget()
+    except OSError as e:
+        print(f"   - ⚠️ Recorder: Cannot check free disk space: {e}")
+        return
+
+    running = [u for u in sorted(active_recordings, key=_priority) if u not in _disk_stopping]
+    while budget < 0 and len(running) > 1:
+        victim = running.pop(0)
+        budget += estimate_disk_need(victim) - estimate_disk_need(victim, stopping=True)
+        _stop_for_disk(victim)
+
+    for username, room_id in sorted(queued_recordings.items(), key=lambda item: -_priority(item[0])):
+        # A recording stopped for disk space may still be finishing
+        if username not in active_recordings:
+            start(username, room_id)
 
-def start_new_recording(username: str) -> Optional[multiprocessing.Process]:
+def dequeue_recording(username: str) -> bool:
     """
-    Start new recording process for a TikTok user.
+    Drop a recording waiting for disk space.
+
+    Returns:
+        True if the user was queued
+    """
+    _disk_stopped.discard(username)
+    if username not in queued_recordings:
+        return False
+    del queued_recordings[username]
+    print(f"   - 💽 Recorder: '{username}' removed from the disk space queue.")
+    return True
+
+def start_new_recording(username: str, room_id: Optional[str] = None) -> Optional["RecordingHandle"]:
+    """
+    Start new recording for a TikTok user in a worker process.
     
     Args:
         username: TikTok username to record
+        room_id: Live room found by the scheduler, if already known
         
     Returns:
-        Process object if successful, None if already recording or failed
+        RecordingHandle if successful, None if already recording, queued
+        for disk space or failed
     """
     # Check if already recording
     if username in active_recordings:
@@ -24,19 +310,19 @@ def start_new_recording(username: str) -> Optional[multiprocessing.Process]:
             print(f"   - Recorder: Recording for '{username}' is already running (PID: {process.pid}).")
             return None
         else:
-            # Clean up dead process
+            # Clean up dead recording
             print(f"   - Recorder: Cleaning up dead process for '{username}'.")
             _cleanup_recording(username)
     
-    print(f"   - Recorder: Starting new recording process for '{username}'...")
-      
-    # Create stop event for graceful shutdown communication
-    stop_event = multiprocessing.Event()
+    if not _admit(username, room_id):
+        return None
+
+    print(f"   - Recorder: Starting new recording for '{username}'...")
       
-    # Import and start recording with stop event support
+    # Import and start recording in a worker
     try:
-        from lib.tiktok_recorder.bridge import start_recording  
-        process = start_recording(username, stop_event)  
+        worker = _get_worker()
+        process = worker.start_recording(username, room_id, recording_options(username))
     except ImportError as e:
         print(f"   - ❌ Recorder ERROR: Failed to import recording module: {e}")
         return None
@@ -46,19 +332,20 @@ def start_new_recording(username: str) -> Optional[multiprocessing.Process]:
       
     if process and process.is_alive():  
         active_recordings[username] = process  
-        stop_events[username] = stop_event  
-        print(f"   - ✅ Recorder: Recording started for '{username}' (PID: {process.pid}).")  
+        _room_ids[username] = room_id
+        print(f"   - ✅ Recorder: Recording started for '{username}' "
+              f"(worker PID: {process.pid}, {worker.load()}/{settings.RECORDINGS_PER_WORKER} slots).")  
         return process  
     else:  
-        print(f"   - ❌ Recorder ERROR: Process for '{username}' failed to start.")  
+        print(f"   - ❌ Recorder ERROR: Recording for '{username}' failed to start.")  
         return None  
 
-def stop_a_recording(username: str) -> Optional[multiprocessing.Process]:
+def stop_a_recording(username: str) -> Optional["RecordingHandle"]:
     """
-    Gracefully stop a recording process.
+    Gracefully stop a recording.
     
     This function:
-    1. Sends a graceful stop signal via Event
+    1. Sends a graceful stop command to the recording's worker
     2. Waits for the process to finish naturally (including file conversion)
     3. Only uses terminate() as last resort after timeout
     
@@ -66,13 +353,13 @@ def stop_a_recording(username: str) -> Optional[multiprocessing.Process]:
         username: TikTok username to stop recording for
         
     Returns:
-        Process object that was stopped, or None if not found
+        Recording handle that was stopped, or None if not found
     """
     process = active_recordings.get(username)
-    stop_event = stop_events.get(username)
       
     if not process:
-        print(f"   - ℹ️ Recorder: No active recording found for '{username}'.")
+        if not dequeue_recording(username):
+            print(f"   - ℹ️ Recorder: No active recording found for '{username}'.")
         return None
         
     if not process.is_alive():
@@ -80,16 +367,10 @@ def stop_a_recording(username: str) -> Optional[multiprocessing.Process]:
         _cleanup_recording(username)
         return None
     
-    if not stop_event:
-        print(f"   - ⚠️ Recorder: No stop event found for '{username}', using terminate.")
-        process.terminate()
-        _cleanup_recording(username)
-        return process
-        
     print(f"   - 🛑 Recorder: Sending graceful stop signal to '{username}' (PID: {process.pid})")
     
     # Step 1: Send graceful stop signal
-    stop_event.set()
+    process.stop()
     
     # Step 2: Wait for graceful shutdown (allow time for file conversion)
     # This is critical - recorder needs time to finish current segment and convert to mp4
@@ -115,7 +396,7 @@ def stop_a_recording(username: str) -> Optional[multiprocessing.Process]:
     _cleanup_recording(username)
     return process
 
-def get_active_recordings() -> Dict[str, multiprocessing.Process]:
+def get_active_recordings() -> Dict[str, "RecordingHandle"]:
     """
     Get current active recordings.
     
@@ -132,8 +413,19 @@ def get_active_recordings() -> Dict[str, multiprocessing.Process]:
         print(f"   - 🧹 Recorder: Cleaning up dead process for '{username}'.")
         _cleanup_recording(username)
     
+    _retire_idle_workers()
+    
     return active_recordings.copy()
 
+def collect_metrics() -> Dict[str, dict]:
+    """
+    Apply the pending worker events and return the latest metrics snapshot
+    of every user recorded so far.
+    """
+    for worker in list(workers):
+        worker.poll()
+    return dict(recording_metrics)
+
 def _cleanup_recording(username: str) -> None:
     """
     Clean up recording state for a user.
@@ -143,37 +435,43 @@ def _cleanup_recording(username: str) -> None:
     """
     if username in active_recordings:
         del active_recordings[username]
-    if username in stop_events:
-        del stop_events[username]
+    _disk_stopping.discard(username)
+    _room_ids.pop(username, None)
 
 def shutdown_all_recordings() -> None:
     """
-    Gracefully shutdown all active recordings.
+    Gracefully shutdown all active recordings and their workers.
     This should be called during bot shutdown.
     """
     if not active_recordings:
         print("   - 🔹 Recorder: No active recordings to shutdown.")
-        return
-    
-    print(f"   - 🛑 Recorder: Shutting down {len(active_recordings)} active recordings...")
+    else:
+        print(f"   - 🛑 Recorder: Shutting down {len(active_recordings)} active recordings...")
     
-    # Send graceful stop to all
-    for username, stop_event in stop_events.items():
-        print(f"     • Stopping '{username}'...")
-        stop_event.set()
+        # Send graceful stop to all
+        for username, process in active_recordings.items():
+            print(f"     • Stopping '{username}'...")
+            process.stop()
     
-    # Wait for all to finish
-    for username, process in list(active_recordings.items()):
-        if process.is_alive():
-            print(f"     • Waiting for '{username}' to finish...")
-            process.join(timeout=30)  # Reasonable timeout during shutdown
-            
+        # Wait for all to finish
+        for username, process in list(active_recordings.items()):
             if process.is_alive():
-                print(f"     • Force terminating '{username}'...")
-                process.terminate()
-                process.join(timeout=5)
+                print(f"     • Waiting for '{username}' to finish...")
+                process.join(timeout=30)  # Reasonable timeout during shutdown
+    
+    # Stop the workers, force terminating the ones that still hang
+    for worker in workers:
+        worker.shutdown(timeout=5)
+        if worker.is_alive():
+            print(f"     • Force terminating worker {worker.name}...")
+            worker.terminate()
     
     # Clear all state
     active_recordings.clear()
-    stop_events.clear()
-    print("   - ✅ Recorder: All recordings shutdown complete.")
\ No newline at end of file
+    workers.clear()
+    _idle_since.clear()
+    queued_recordings.clear()
+    _disk_stopping.clear()
+    _disk_stopped.clear()
+    _room_ids.clear()
+    print("   - ✅ Recorder: All recordings shutdown complete.")
@@ -0,0 +1,192 @@
+# File: modules/scheduler.py
+# Central live-status poller: one asyncio task checks every watched user and
+# only spawns a recording process once a room actually goes live. How often
+# each user is checked is learned from their live history.
+
+import asyncio
+from typing import Dict, List, Optional, Set
+
+from config import settings
+from modules import recorder
+from modules.live_history import LiveHistory, PollPlanner
+
+# Seconds between two scheduler ticks; each tick only probes the users due
+POLL_TICK = 5
+
+# Watched users - username -> last known room_id (None until resolved)
+watched_users: Dict[str, Optional[str]] = {}
+
+history = LiveHistory()
+planner = PollPlanner(
+    history,
+    base_interval=settings.LIVE_POLL_INTERVAL,
+    hot_interval=settings.LIVE_POLL_HOT_INTERVAL,
+    max_interval=settings.LIVE_POLL_MAX_INTERVAL,
+    budget_per_minute=settings.LIVE_POLL_BUDGET,
+)
+
+# Users whose recording was started here, to notice when the live ends
+_recording_users: Set[str] = set()
+
+_poll_task: Optional[asyncio.Task] = None
+_api = None
+
+def _get_api():
+    """Create the shared asyncio TikTok API client on first use."""
+    global _api
+    if _api is None:
+        try:
+            from lib.tiktok_recorder.bridge import load_cookies
+            from lib.tiktok_recorder.core.tiktok_api_async import AsyncTikTokAPI
+            _api = AsyncTikTokAPI(
+                proxy=None,
+                cookies=load_cookies(),
+                cache_ttl=settings.LOOKUP_CACHE_TTL
+            )
+        except ImportError as e:
+            print(f"   - ❌ Scheduler ERROR: Failed to import TikTok API: {e}")
+            return None
+    return _api
+
+async def poll_once(usernames: Optional[List[str]] = None) -> List[str]:
+    """
+    Check watched users once and start recordings for those who are live.
+
+    Args:
+        usernames: Subset of watched users to check, all of them if omitted
+
+    Returns:
+        List of usernames whose recording was started
+    """
+    api = _get_api()
+    if api is None:
+        return []
+
+    active = recorder.get_active_recordings()
+    candidates = usernames if usernames is not None else list(watched_users)
+    candidates = [u for u in candidates if u in watched_users and u not in active]
+    if not candidates:
+        return []
+
+    # All room ids are resolved concurrently, then checked in batches
+    rooms = {}  # room_id -> username
+    for username, room_id in (await api.get_room_ids(candidates)).items():
+        watched_users[username] = str(room_id)
+        rooms[str(room_id)] = username
+
+    alive = await api.check_alive_many(rooms) if rooms else {}
+
+    live_users = {rooms[room_id] for room_id, is_alive in alive.items() if is_alive}
+    for username in candidates:
+        planner.record_probe(username, username in live_users)
+        if username not in live_users:
+            # The live ended while waiting for disk space
+            recorder.dequeue_recording(username)
+
+    started = []
+    for room_id, username in rooms.items():
+        if not alive.get(room_id) or username not in watched_users:
+            continue
+        print(f"   - 📡 Scheduler: '{username}' is live (room {room_id}).")
+        if _start_recording(username, room_id):
+            started.append(username)
+    return started
+
+def _start_recording(username: str, room_id: Optional[str]) -> Optional["RecordingHandle"]:
+    """
+    Start the recording of a live user and note the start of the live,
+    once per live (a recording resumed after a disk-space stop is the same
+    live). Also used by the recorder to start queued recordings.
+    """
+    process = recorder.start_new_recording(username, room_id)
+    if process and username not in _recording_users:
+        history.record_start(username)
+        _recording_users.add(username)
+    return process
+
+def _track_finished_recordings() -> None:
+    """Record the end of lives whose recording process has exited."""
+    active = recorder.get_active_recordings()
+    for username in list(_recording_users):
+        # A recording stopped for disk space waits to resume the same live
+        if username not in active and not recorder.is_disk_stopped(username):
+            history.record_end(username)
+            _recording_users.discard(username)
+
+async def watch_user(username: str) -> Optional["RecordingHandle"]:
+    """
+    Add a user to the watch list and check them right away.
+
+    Args:
+        username: TikTok username to watch
+
+    Returns:
+        Recording handle if the user is live now, None otherwise
+    """
+    if username not in watched_users:
+        print(f"   - 👀 Scheduler: Watching '{username}'.")
+        watched_users[username] = None
+
+    try:
+        await poll_once([username])
+    except Exception as e:
+        print(f"   - ⚠️ Scheduler: Initial check for '{username}' failed: {e}")
+
+    return recorder.get_active_recordings().get(username)
+
+def unwatch_user(username: str) -> bool:
+    """
+    Remove a user from the watch list.
+
+    Returns:
+        True if the user was being watched
+    """
+    recorder.dequeue_recording(username)
+    if username in watched_users:
+        del watched_users[username]
+        planner.forget(username)
+        print(f"   - 🙈 Scheduler: Stopped watching '{username}'.")
+        return True
+    return False
+
+def get_watched_users() -> Dict[str, Optional[str]]:
+    """
+    Get the current watch list.
+
+    Returns:
+        Dictionary of username -> last known room_id
+    """
+    return watched_users.copy()
+
+async def _poll_loop() -> None:
+    """Probe the users that are due every POLL_TICK seconds."""
+    while True:
+        try:
+            _track_finished_recordings()
+            recorder.enforce_disk_budget(_start_recording)
+            active = recorder.get_active_recordings()
+            due = planner.due_users([u for u in watched_users if u not in active])
+            if due:
+                await poll_once(due)
+        except Exception as e:
+            print(f"   - ❌ Scheduler ERROR: Poll failed: {e}")
+
+        await asyncio.sleep(POLL_TICK)
+
+def start_scheduler() -> None:
+    """Start the poll loop on the running event loop (idempotent)."""
+    global _poll_task
+    if _poll_task and not _poll_task.done():
+        return
+
+    _poll_task = asyncio.get_running_loop().create_task(_poll_loop())
+    print(f"   - ✅ Scheduler: Polling watched users every {settings.LIVE_POLL_HOT_INTERVAL}-"
+          f"{settings.LIVE_POLL_MAX_INTERVAL}s, at most {settings.LIVE_POLL_BUDGET} probes/min.")
+
+def stop_scheduler() -> None:
+    """Stop the poll loop. Running recordings are not touched."""
+    global _poll_task
+    if _poll_task and not _poll_task.done():
+        _poll_task.cancel()
+        print("   - 🛑 Scheduler: Poll loop stopped.")
+    _poll_task = None